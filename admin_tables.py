@@ -0,0 +1,198 @@
+import threading
+import time
+
+import database
+import service_tags
+
+ADMIN_PAGE_SIZE = 50
+COUNT_CACHE_SECONDS = 30
+
+
+def _customer_filters(search=None):
+    clauses, params = [], []
+    tag = service_tags.normalize_service_tag(search)
+    if tag:
+        # Tags are stored normalized, so a prefix range on the normalized search walks the service_tag index
+        clauses.append("(c.service_tag >= ? AND c.service_tag < ? OR c.customer_name LIKE ?)")
+        params += [tag, tag + "\uffff", search.strip() + "%"]
+    return clauses, params
+
+
+def _technician_filters(search=None, specialization=None):
+    clauses, params = [], []
+    if search:
+        clauses.append("t.name LIKE ?")
+        params.append(search + "%")
+    if specialization:
+        clauses.append("t.specialization = ?")
+        params.append(specialization)
+    return clauses, params
+
+
+def _appointment_filters(search=None, status=None, date_from=None, date_to=None):
+    clauses, params = [], []
+    tag = service_tags.normalize_service_tag(search)
+    if tag:
+        if tag.isdigit():
+            clauses.append("(a.id = ? OR a.service_tag >= ? AND a.service_tag < ?)")
+            params += [int(tag), tag, tag + "\uffff"]
+        else:
+            # Match names through a subquery so both sides of the OR stay on appointments indexes
+            clauses.append('''(a.service_tag >= ? AND a.service_tag < ?
+                               OR a.customer_id IN (SELECT id FROM customers WHERE customer_name LIKE ?))''')
+            params += [tag, tag + "\uffff", search.strip() + "%"]
+    if status:
+        clauses.append("a.status = ?")
+        params.append(status)
+    if date_from:
+        clauses.append("a.appointment_date >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        clauses.append("a.appointment_date <= ?")
+        params.append(date_to.isoformat())
+    return clauses, params
+
+
+# Each admin table: the base query, the filters it accepts, its id column and
+# the columns it may be sorted by (name -> SQL expression). Sort keys are
+# indexed columns where the table is large enough to need it, so every page is
+# an index range scan. A NULL sort key would compare as unknown in the keyset
+# clause and end pagination early, so a nullable column is sorted through
+# COALESCE with a value below any it can hold (indexed as that expression).
+TABLES = {
+    "customers": {
+        "select": '''SELECT c.id, c.service_tag, c.customer_name, c.customer_email, c.customer_phone,
+                            c.customer_address, c.laptop_model, c.purchase_date, c.warranty_end_date,
+                            c.warranty_valid
+                     FROM customers c''',
+        "count": "SELECT COUNT(*) FROM customers c",
+        "filters": _customer_filters,
+        "id": "c.id",
+        "sort_columns": {
+            "id": "c.id",
+            "service_tag": "c.service_tag",
+            "customer_name": "COALESCE(c.customer_name, '') COLLATE NOCASE",
+            "warranty_end_date": "COALESCE(c.warranty_end_date, '')",
+        },
+    },
+    "technicians": {
+        "select": '''SELECT t.id, t.name, t.specialization, t.location, t.rating, t.available
+                     FROM technicians t''',
+        "count": "SELECT COUNT(*) FROM technicians t",
+        "filters": _technician_filters,
+        "id": "t.id",
+        "sort_columns": {
+            "id": "t.id",
+            "name": "t.name COLLATE NOCASE",
+            "rating": "COALESCE(t.rating, -1)",
+        },
+    },
+    "appointments": {
+        "select": '''SELECT a.id, c.customer_name, t.name as technician, a.service_tag,
+                            a.appointment_date, a.appointment_time, a.status
+                     FROM appointments a
+                     JOIN customers c ON a.customer_id = c.id
+                     JOIN technicians t ON a.technician_id = t.id''',
+        "count": '''SELECT COUNT(*) FROM appointments a
+                    JOIN customers c ON a.customer_id = c.id
+                    JOIN technicians t ON a.technician_id = t.id''',
+        "filters": _appointment_filters,
+        "id": "a.id",
+        "sort_columns": {
+            "appointment_date": "a.appointment_date",
+            "id": "a.id",
+            "status": "a.status",
+        },
+    },
+}
+
+
+def _where(clauses):
+    return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+
+def fetch_page(table, filters=None, sort="id", descending=False, cursor=None, limit=ADMIN_PAGE_SIZE):
+    """Return one keyset-paginated page of an admin table
+
+    Returns ``(columns, rows, next_cursor)``; pass ``next_cursor`` back to get
+    the following page. It is None on the last page.
+    """
+    spec = TABLES[table]
+    clauses, params = spec["filters"](**(filters or {}))
+    sort_expr = spec["sort_columns"][sort]
+    direction = "DESC" if descending else "ASC"
+
+    if cursor is not None:
+        # The bound on the sort key alone lets SQLite seek an expression index, which the row value does not
+        clauses.append(f"{sort_expr} {'<=' if descending else '>='} ? AND "
+                       f"({sort_expr}, {spec['id']}) {'<' if descending else '>'} (?, ?)")
+        params += [cursor[0], *cursor]
+
+    # Prepend the sort key so the last row yields the next cursor: (sort key, id)
+    query = (f"{spec['select'].replace('SELECT ', f'SELECT {sort_expr} AS _sort_key, ', 1)}"
+             f"{_where(clauses)} ORDER BY {sort_expr} {direction}, {spec['id']} {direction} LIMIT ?")
+    with database.connection() as conn:
+        c = conn.execute(query, params + [limit + 1])
+        columns = [d[0] for d in c.description][1:]
+        rows = c.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][0], rows[-1][1])
+    return columns, [row[1:] for row in rows], next_cursor
+
+
+def iter_pages(table, filters=None, sort="id", descending=False, page_size=ADMIN_PAGE_SIZE):
+    """Yield ``(columns, rows)`` for every page of an admin table in order, one short read per page
+
+    An empty table still yields one empty page, so callers always learn the columns.
+    """
+    cursor = None
+    while True:
+        columns, rows, cursor = fetch_page(table, filters, sort, descending, cursor, page_size)
+        yield columns, rows
+        if cursor is None:
+            return
+
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def count_rows(table, filters=None):
+    """Count the rows matching a filter, cached briefly per (table, filter)"""
+    filters = filters or {}
+    key = (table, tuple(sorted(filters.items())))
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    spec = TABLES[table]
+    clauses, params = spec["filters"](**filters)
+    with database.connection() as conn:
+        total = conn.execute(spec["count"] + _where(clauses), params).fetchone()[0]
+
+    with _count_cache_lock:
+        _count_cache[key] = (total, now + COUNT_CACHE_SECONDS)
+    return total
+
+
+def invalidate_counts(table=None):
+    """Forget cached counts after rows are inserted, deleted or change status"""
+    with _count_cache_lock:
+        for key in list(_count_cache):
+            if table is None or key[0] == table:
+                del _count_cache[key]
+
+
+def search_appointments(search, limit=20):
+    """Return (id, label) pairs for appointments matching an id, service tag or customer name"""
+    columns, rows, _ = fetch_page("appointments", {"search": search}, sort="id", descending=True, limit=limit)
+    index = {name: i for i, name in enumerate(columns)}
+    return [(row[index["id"]],
+             f"#{row[index['id']]} · {row[index['customer_name']]} · {row[index['service_tag']]} · "
+             f"{row[index['appointment_date']]} ({row[index['status']]})")
+            for row in rows]
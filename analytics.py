@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database
+import scheduling
+
+OPEN_STATUSES = ("Scheduled", "In Progress")
+SEVERITY_ORDER = ["Low", "Medium", "High", "Unknown"]
+
+
+def _read(conn, query, params=()):
+    cursor = conn.execute(query, params)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+
+
+def _month_start(day, later=False):
+    """First day of the month containing ``day``, or of the next month when ``later`` and day is mid-month"""
+    first = day.replace(day=1)
+    if later and first != day:
+        first = (first + timedelta(days=32)).replace(day=1)
+    return first
+
+
+def _technician_totals(conn, start, end):
+    """Sum the technician rollups over [start, end): whole months from the monthly table, the edges from the daily one"""
+    columns = '''technician_id, SUM(booked) AS booked, SUM(completed) AS completed,
+                 SUM(completion_seconds) AS completion_seconds, SUM(completions_timed) AS completions_timed'''
+    first_month, last_month = _month_start(start, later=True), _month_start(end)
+    if first_month >= last_month:
+        return _read(conn, f'''SELECT {columns} FROM rollup_technician_daily
+                               WHERE day >= ? AND day < ? GROUP BY technician_id''',
+                     (start.isoformat(), end.isoformat()))
+    return _read(conn, f'''SELECT {columns} FROM (
+                               SELECT technician_id, booked, completed, completion_seconds, completions_timed
+                               FROM rollup_technician_monthly WHERE month >= ? AND month < ?
+                               UNION ALL
+                               SELECT technician_id, booked, completed, completion_seconds, completions_timed
+                               FROM rollup_technician_daily WHERE day >= ? AND day < ?
+                               UNION ALL
+                               SELECT technician_id, booked, completed, completion_seconds, completions_timed
+                               FROM rollup_technician_daily WHERE day >= ? AND day < ?)
+                           GROUP BY technician_id''',
+                 (first_month.strftime("%Y-%m"), last_month.strftime("%Y-%m"),
+                  start.isoformat(), first_month.isoformat(), last_month.isoformat(), end.isoformat()))
+
+
+def technician_utilization(start, end):
+    """Return one row per technician with bookings, completions, utilization and mean hours to complete
+
+    ``start`` and ``end`` bound appointment dates, end exclusive. Utilization
+    is booked slots over the slots the technician's working days could hold.
+    """
+    with database.connection() as conn:
+        technicians = _read(conn, '''SELECT id AS technician_id, name, specialization AS brand, location
+                                     FROM technicians''')
+        totals = _technician_totals(conn, start, end)
+
+    frame = technicians.merge(totals, on="technician_id", how="left")
+    counts = ["booked", "completed", "completion_seconds", "completions_timed"]
+    frame[counts] = frame[counts].fillna(0)
+    slots_per_day = ((scheduling.to_minutes(scheduling.WORKDAY_END) - scheduling.to_minutes(scheduling.WORKDAY_START))
+                     // scheduling.SLOT_MINUTES)
+    frame["utilization"] = frame["booked"] / max(slots_per_day * (end - start).days, 1)
+    frame["mean_hours_to_complete"] = np.where(frame["completions_timed"] > 0,
+                                               frame["completion_seconds"] / frame["completions_timed"].clip(lower=1)
+                                               / 3600, np.nan)
+    return frame.sort_values("utilization", ascending=False, ignore_index=True)
+
+
+def completion_summary(utilization):
+    """Overall figures for a frame returned by technician_utilization"""
+    timed = utilization["completions_timed"].sum()
+    return {
+        "booked": int(utilization["booked"].sum()),
+        "completed": int(utilization["completed"].sum()),
+        "mean_utilization": float(utilization["utilization"].mean()) if len(utilization) else 0.0,
+        "mean_hours_to_complete": float(utilization["completion_seconds"].sum() / timed / 3600) if timed else None,
+    }
+
+
+def backlog_by_area():
+    """Return open appointments as a brand x location table"""
+    with database.connection() as conn:
+        frame = _read(conn, f'''SELECT brand, location, SUM(appointments) AS appointments
+                                FROM rollup_status_by_area
+                                WHERE status IN ({", ".join("?" * len(OPEN_STATUSES))})
+                                GROUP BY brand, location HAVING SUM(appointments) > 0''', OPEN_STATUSES)
+    if frame.empty:
+        return frame
+    return frame.pivot_table(index="brand", columns="location", values="appointments",
+                             aggfunc="sum", fill_value=0)
+
+
+def defect_distribution(start, end):
+    """Return appointment counts as a defect type x severity table for appointment dates in [start, end)"""
+    with database.connection() as conn:
+        frame = _read(conn, '''SELECT defect_type, severity, SUM(appointments) AS appointments
+                               FROM rollup_defects_daily
+                               WHERE day >= ? AND day < ? GROUP BY defect_type, severity
+                               HAVING SUM(appointments) > 0''', (start.isoformat(), end.isoformat()))
+    if frame.empty:
+        return frame
+    table = frame.pivot_table(index="defect_type", columns="severity", values="appointments",
+                              aggfunc="sum", fill_value=0)
+    table = table.reindex(columns=[s for s in SEVERITY_ORDER if s in table.columns]
+                          + [s for s in table.columns if s not in SEVERITY_ORDER])
+    table["Total"] = table.sum(axis=1)
+    return table.sort_values("Total", ascending=False)
+
+
+def warranty_cohorts(months_back=12, months_ahead=12, today=None):
+    """Return customers per warranty end month, from months_back before today to months_ahead after"""
+    today = today or date.today()
+    first = date(today.year, today.month, 1)
+    start = (first - timedelta(days=31 * months_back)).replace(day=1)
+    end = (first + timedelta(days=31 * (months_ahead + 1))).replace(day=1)
+    with database.connection() as conn:
+        frame = _read(conn, '''SELECT month, customers FROM rollup_warranty_monthly
+                               WHERE month >= ? AND month < ? AND customers > 0 ORDER BY month''',
+                      (start.strftime("%Y-%m"), end.strftime("%Y-%m")))
+    frame["expired"] = frame["month"] < today.strftime("%Y-%m")
+    return frame
+
+
+def rebuild_rollups():
+    """Recompute the rollups from scratch, e.g. after editing appointments outside the app"""
+    with database.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        database.rebuild_appointment_rollups(conn)
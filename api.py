@@ -0,0 +1,256 @@
+import hmac
+import io
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+from PIL import UnidentifiedImageError
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+load_dotenv()
+
+# Local modules read their settings from the environment at import time
+import bulk_io
+import defect_analysis
+import metrics
+import readcache
+import scheduling
+import service
+import service_centers
+
+# Requests must send this in an X-API-Key header when it is set
+API_KEY = os.getenv("API_KEY")
+API_MAX_UPLOAD_BYTES = int(os.getenv("API_MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+API_MAX_IMPORT_BYTES = int(os.getenv("API_MAX_IMPORT_BYTES", 512 * 1024 * 1024))
+EXPORT_READ_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when a request body is larger than its endpoint accepts"""
+
+
+def error(status_code, message):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+async def receive_upload(request, sink, limit, too_large):
+    """Write the request body to ``sink`` as it arrives and return its size in bytes
+
+    Raises UploadTooLarge with the ``too_large`` message once the body passes
+    ``limit`` bytes. Content-Length is checked first, but a chunked upload
+    has none, so the bytes are counted too.
+    """
+    if int(request.headers.get("content-length", 0)) > limit:
+        raise UploadTooLarge(too_large)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise UploadTooLarge(too_large)
+        sink.write(chunk)
+    return size
+
+
+def authorized(request):
+    return not API_KEY or hmac.compare_digest(request.headers.get("x-api-key", ""), API_KEY)
+
+
+def endpoint(handler):
+    """Wrap a handler with API key checks, a request span and the mapping from service errors to HTTP statuses"""
+    async def wrapped(request):
+        if not authorized(request):
+            return error(401, "Missing or invalid API key.")
+        with metrics.span("http", handler.__name__):
+            try:
+                return await handler(request)
+            except (KeyError, ValueError, TypeError) as e:
+                return error(400, f"Invalid request: {str(e)}")
+            except UnidentifiedImageError:
+                return error(400, "The request body is not a supported image.")
+            except UploadTooLarge as e:
+                return error(413, str(e))
+            except service.NotFoundError as e:
+                return error(404, str(e))
+            except scheduling.SlotUnavailableError as e:
+                return error(409, str(e))
+            except bulk_io.ImportFormatError as e:
+                return error(400, str(e))
+            except (defect_analysis.AnalysisError, service_centers.ServiceCenterLookupError) as e:
+                return error(502, str(e))
+    return wrapped
+
+
+def slot_json(slot):
+    technician = slot["technician"]
+    return {"technician_id": technician["id"], "technician": technician["name"], "location": technician["location"],
+            "rating": technician["rating"], "start": slot["start"].isoformat(timespec="minutes"),
+            "score": slot["score"]}
+
+
+# Handlers; every blocking service call runs in the thread pool so the event loop stays free
+@endpoint
+async def health(request):
+    return JSONResponse({"status": "ok"})
+
+
+@endpoint
+async def cache_stats(request):
+    return JSONResponse(readcache.cache_stats())
+
+
+@endpoint
+async def inference_health(request):
+    return JSONResponse(await run_in_threadpool(service.get_inference_health))
+
+
+@endpoint
+async def prometheus_metrics(request):
+    return Response(metrics.render_prometheus(), media_type=metrics.CONTENT_TYPE)
+
+
+@endpoint
+async def get_customer(request):
+    customer = await run_in_threadpool(service.get_customer_by_service_tag, request.path_params["service_tag"])
+    if customer is None:
+        raise service.NotFoundError("Service tag not found.")
+    return JSONResponse(customer)
+
+
+@endpoint
+async def list_technicians(request):
+    return JSONResponse(await run_in_threadpool(service.list_technicians, request.query_params["brand"]))
+
+
+@endpoint
+async def find_slots(request):
+    params = request.query_params
+    earliest = datetime.fromisoformat(params["earliest"]) if "earliest" in params else None
+    slots = await run_in_threadpool(service.find_appointment_slots, params["brand"], params.get("address", ""),
+                                    earliest, int(params.get("limit", 5)))
+    return JSONResponse([slot_json(slot) for slot in slots])
+
+
+@endpoint
+async def book_appointment(request):
+    body = await request.json()
+    appointment_id = await run_in_threadpool(service.schedule_appointment, int(body["customer_id"]),
+                                             int(body["technician_id"]), body["service_tag"],
+                                             body.get("issue_description", ""),
+                                             datetime.fromisoformat(body["start"]),
+                                             request.headers.get("idempotency-key"),
+                                             {"defect_type": body.get("defect_type"), "severity": body.get("severity")},
+                                             int(body["defect_report_id"]) if body.get("defect_report_id") else None)
+    return JSONResponse({"id": appointment_id}, status_code=201)
+
+
+@endpoint
+async def technician_schedule(request):
+    params = request.query_params
+    return JSONResponse(await run_in_threadpool(service.get_technician_schedule, request.path_params["technician_id"],
+                                                params.get("window", "Upcoming"), int(params.get("offset", 0))))
+
+
+@endpoint
+async def update_statuses(request):
+    body = await request.json()
+    changed = await run_in_threadpool(service.update_appointment_statuses, body["ids"], body["status"],
+                                      body.get("technician_id"), bool(body.get("notify", False)))
+    return JSONResponse({"changed": changed})
+
+
+@endpoint
+async def complete_appointment(request):
+    await run_in_threadpool(service.complete_appointment, request.path_params["appointment_id"])
+    return JSONResponse({"id": request.path_params["appointment_id"], "status": "Completed"})
+
+
+@endpoint
+async def find_service_centers(request):
+    params = request.query_params
+    return JSONResponse(await run_in_threadpool(service.find_service_centers, params["brand"], params["location"]))
+
+
+@endpoint
+async def analyze(request):
+    upload = io.BytesIO()
+    if not await receive_upload(request, upload, API_MAX_UPLOAD_BYTES, "Photo is too large."):
+        return error(400, "Send the photo as the request body.")
+    return JSONResponse(await run_in_threadpool(service.analyze_photo, upload.getvalue()))
+
+
+@endpoint
+async def defect_reports(request):
+    params = request.query_params
+    return JSONResponse(await run_in_threadpool(service.search_defect_reports, params.get("severity"),
+                                                params.get("component"), params.get("service_tag"),
+                                                int(params.get("limit", 50))))
+
+
+@endpoint
+async def import_records(request):
+    fmt = request.query_params.get("format", "csv")
+    # Spool the upload as it arrives instead of holding the whole feed in memory
+    upload = tempfile.SpooledTemporaryFile(max_size=bulk_io.SPOOL_MAX_BYTES)
+    try:
+        await receive_upload(request, upload, API_MAX_IMPORT_BYTES, "Import file is too large.")
+        upload.seek(0)
+        summary = await run_in_threadpool(service.import_records, request.path_params["table"], upload, fmt)
+    finally:
+        upload.close()
+    return JSONResponse(summary)
+
+
+@endpoint
+async def export_records(request):
+    params = dict(request.query_params)
+    table = request.path_params["table"]
+    fmt = params.pop("format", "csv")
+    sort = params.pop("sort", "id")
+    descending = params.pop("descending", "false").lower() in ("1", "true")
+    for name in ("date_from", "date_to"):
+        if name in params:
+            params[name] = date.fromisoformat(params[name])
+    if fmt == "csv":
+        # Starlette pulls the generator on a worker thread, one page at a time
+        return StreamingResponse(service.iter_export_csv(table, params, sort, descending), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="{table}.csv"'})
+    export = await run_in_threadpool(service.export_records, table, fmt, params, sort, descending)
+    return StreamingResponse(iter(lambda: export.read(EXPORT_READ_BYTES), b""), media_type="application/octet-stream",
+                             headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
+                             background=BackgroundTask(export.close))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_in_threadpool(service.bootstrap)
+    yield
+
+
+routes = [
+    Route("/health", health),
+    Route("/cache-stats", cache_stats),
+    Route("/inference-health", inference_health),
+    Route("/metrics", prometheus_metrics),
+    Route("/customers/{service_tag}", get_customer),
+    Route("/technicians", list_technicians),
+    Route("/slots", find_slots),
+    Route("/appointments", book_appointment, methods=["POST"]),
+    Route("/technicians/{technician_id:int}/schedule", technician_schedule),
+    Route("/appointments/status", update_statuses, methods=["POST"]),
+    Route("/appointments/{appointment_id:int}/complete", complete_appointment, methods=["POST"]),
+    Route("/service-centers", find_service_centers),
+    Route("/analyze", analyze, methods=["POST"]),
+    Route("/defect-reports", defect_reports),
+    Route("/import/{table}", import_records, methods=["POST"]),
+    Route("/export/{table}", export_records),
+]
+
+# Run with e.g. `uvicorn api:app --workers 4`; each worker process keeps its own
+# connection pool and background workers, coordinated through the database
+app = Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,46 @@
+import argparse
+import json
+import sys
+
+from dotenv import load_dotenv
+
+# Load environment variables before the local modules read their settings
+load_dotenv()
+
+import database
+import defect_analysis
+
+
+def _read_images(paths):
+    for path in defect_analysis.iter_image_files(paths):
+        with open(path, 'rb') as f:
+            yield path, f.read(), None
+
+
+def main(argv=None):
+    """Command line entry point: analyze images and stream JSON Lines results"""
+    parser = argparse.ArgumentParser(description="Batch hardware defect analysis")
+    parser.add_argument("paths", nargs="+", help="image files or directories of images")
+    parser.add_argument("--workers", type=int, default=defect_analysis.BATCH_MAX_WORKERS,
+                        help="number of concurrent vision calls")
+    parser.add_argument("--output", help="write JSON Lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    database.migrate()
+    output = open(args.output, 'w') if args.output else sys.stdout
+    failures = 0
+    try:
+        for record in defect_analysis.analyze_batch(_read_images(args.paths), max_workers=args.workers):
+            failures += record["error"] is not None
+            if record["result"] is not None:
+                record["result"] = record["result"].to_dict()
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    finally:
+        if args.output:
+            output.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import contextlib
+import csv
+import io
+import itertools
+import os
+import re
+import tempfile
+import time
+from datetime import date
+
+import admin_tables
+import catalog
+import database
+import service_tags
+import warranty
+
+# Rows validated and written per write transaction; other writers wait at most one chunk
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", 20000))
+EXPORT_PAGE_ROWS = int(os.getenv("EXPORT_PAGE_ROWS", 5000))
+# Files up to this size are spooled in memory, larger ones on disk
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", 16 * 1024 * 1024))
+REJECT_SAMPLE_SIZE = 100
+FORMATS = ("csv", "parquet")
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n")
+
+
+class ImportFormatError(Exception):
+    """Raised when an import file cannot be read or lacks required columns"""
+
+
+class RowError(ValueError):
+    """Raised by a row validator with the reason the row is rejected"""
+
+
+def _text(row, column):
+    value = row.get(column)
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def _date(row, column):
+    value = row.get(column)
+    if isinstance(value, date):
+        return value.isoformat()
+    value = _text(row, column)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise RowError(f"{column} must be a YYYY-MM-DD date")
+
+
+def _customer_row(row, context):
+    service_tag = service_tags.normalize_service_tag(_text(row, "service_tag"))
+    name = _text(row, "customer_name")
+    if not service_tag:
+        raise RowError("service_tag is required")
+    if not name:
+        raise RowError("customer_name is required")
+    email = _text(row, "customer_email")
+    if email and not EMAIL_PATTERN.fullmatch(email):
+        raise RowError("customer_email is not an email address")
+    purchase_date = _date(row, "purchase_date")
+    warranty_end_date = _date(row, "warranty_end_date")
+    if not warranty_end_date:
+        raise RowError("warranty_end_date is required")
+    if purchase_date and warranty_end_date < purchase_date:
+        raise RowError("warranty_end_date is before purchase_date")
+    return (service_tag, name, email, _text(row, "customer_phone"), _text(row, "customer_address"),
+            _text(row, "laptop_model"), purchase_date, warranty_end_date,
+            int(warranty.is_warranty_valid(warranty_end_date, context["today"])))
+
+
+def _technician_row(row, context):
+    technician_id = _text(row, "id")
+    if technician_id is not None and not technician_id.isdigit():
+        raise RowError("id must be a whole number")
+    name = _text(row, "name")
+    if not name:
+        raise RowError("name is required")
+    specialization = context["brands"].get((_text(row, "specialization") or "").lower())
+    if specialization is None:
+        raise RowError("specialization must be a brand in the catalog")
+    email = _text(row, "email")
+    if email and not EMAIL_PATTERN.fullmatch(email):
+        raise RowError("email is not an email address")
+    rating = _text(row, "rating")
+    try:
+        rating = float(rating) if rating is not None else None
+    except ValueError:
+        raise RowError("rating must be a number")
+    if rating is not None and not 0 <= rating <= 5:
+        raise RowError("rating must be between 0 and 5")
+    available = (_text(row, "available") or "1").lower()
+    if available not in TRUE_VALUES + FALSE_VALUES:
+        raise RowError("available must be yes or no")
+    password = _text(row, "password")
+    # A row inserts unless its id names a technician already stored or added earlier in the file
+    if not password and (technician_id is None or int(technician_id) not in context["technician_ids"]):
+        raise RowError("password is required for a new technician")
+    if technician_id is not None:
+        context["technician_ids"].add(int(technician_id))
+    return (int(technician_id) if technician_id else None, name, email, _text(row, "phone"), specialization,
+            _text(row, "location"), rating, int(available in TRUE_VALUES), password)
+
+
+def _technician_context():
+    with database.connection() as conn:
+        return {"technician_ids": {row[0] for row in conn.execute("SELECT id FROM technicians")}}
+
+
+# Each importable table: the columns a file must have, a validator turning one
+# row into upsert parameters, what else the validator needs to know, and the
+# upsert. Optional columns left empty keep the value already stored, so a
+# partial feed never blanks existing details.
+IMPORTS = {
+    "customers": {
+        "required": ["service_tag", "customer_name", "warranty_end_date"],
+        "validate": _customer_row,
+        # Stamps end date changes for the incremental warranty refresh (see warranty.refresh_warranty_status)
+        "upsert": f'''INSERT INTO customers
+                     (service_tag, customer_name, customer_email, customer_phone, customer_address,
+                      laptop_model, purchase_date, warranty_end_date, warranty_valid, warranty_changed_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {database.UNIX_NOW})
+                     ON CONFLICT (service_tag) DO UPDATE SET
+                         customer_name = excluded.customer_name,
+                         customer_email = COALESCE(excluded.customer_email, customer_email),
+                         customer_phone = COALESCE(excluded.customer_phone, customer_phone),
+                         customer_address = COALESCE(excluded.customer_address, customer_address),
+                         laptop_model = COALESCE(excluded.laptop_model, laptop_model),
+                         purchase_date = COALESCE(excluded.purchase_date, purchase_date),
+                         warranty_end_date = excluded.warranty_end_date,
+                         warranty_valid = excluded.warranty_valid,
+                         warranty_changed_at = CASE WHEN excluded.warranty_end_date IS NOT warranty_end_date
+                                                    THEN excluded.warranty_changed_at
+                                                    ELSE warranty_changed_at END''',
+    },
+    # Rows with the id of a stored technician update it; other rows add a technician
+    "technicians": {
+        "required": ["name", "specialization"],
+        "validate": _technician_row,
+        "context": _technician_context,
+        "upsert": '''INSERT INTO technicians
+                     (id, name, email, phone, specialization, location, rating, available, password)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT (id) DO UPDATE SET
+                         name = excluded.name,
+                         email = COALESCE(excluded.email, email),
+                         phone = COALESCE(excluded.phone, phone),
+                         specialization = excluded.specialization,
+                         location = COALESCE(excluded.location, location),
+                         rating = COALESCE(excluded.rating, rating),
+                         available = excluded.available,
+                         password = COALESCE(excluded.password, password)''',
+    },
+}
+
+
+def _open(source):
+    return open(source, "rb") if isinstance(source, (str, os.PathLike)) else contextlib.nullcontext(source)
+
+
+def read_chunks(source, fmt="csv", chunk_rows=IMPORT_CHUNK_ROWS):
+    """Stream a CSV or Parquet file as ``(columns, [(row_number, row_dict), ...])`` chunks
+
+    ``source`` is a path or a binary file object. Row numbers count from 1 at
+    the first data row, so they match a spreadsheet's row number minus one.
+    """
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unsupported format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    with _open(source) as binary:
+        if fmt == "csv":
+            text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+            reader = csv.DictReader(text)
+            columns = reader.fieldnames or []
+            rows = enumerate(reader, start=1)
+            while chunk := list(itertools.islice(rows, chunk_rows)):
+                yield columns, chunk
+            # Hand the binary file back unclosed; whoever opened it closes it
+            text.detach()
+        else:
+            import pyarrow.parquet as pq
+
+            try:
+                parquet = pq.ParquetFile(binary)
+            except Exception as e:
+                raise ImportFormatError(f"Not a readable Parquet file: {str(e)}")
+            columns = parquet.schema_arrow.names
+            number = 1
+            for batch in parquet.iter_batches(batch_size=chunk_rows):
+                chunk = list(enumerate(batch.to_pylist(), start=number))
+                number += len(chunk)
+                yield columns, chunk
+
+
+def import_file(table, source, fmt="csv", rejects=None, chunk_rows=IMPORT_CHUNK_ROWS, on_commit=None):
+    """Validate and upsert every row of a file into ``table`` in batched write transactions
+
+    Invalid rows are skipped and written to ``rejects``, a text file, as CSV
+    with the row number and reason. Each chunk commits on its own, so an error
+    part way through keeps the chunks already written; ``on_commit`` is
+    called with no arguments after each one so callers can drop cached
+    copies of the rows it changed. Returns counts, timing
+    and the first rejects. Raises ImportFormatError for an unreadable file or
+    missing columns.
+    """
+    spec = IMPORTS[table]
+    context = {"today": date.today(), "brands": {brand.lower(): brand for brand in catalog.brand_names()}}
+    if "context" in spec:
+        context.update(spec["context"]())
+    started = time.perf_counter()
+    summary = {"table": table, "rows": 0, "imported": 0, "rejected": 0, "sample_rejects": []}
+    reject_writer = csv.writer(rejects) if rejects is not None else None
+    if reject_writer:
+        reject_writer.writerow(["row", "reason"])
+
+    try:
+        for columns, chunk in read_chunks(source, fmt, chunk_rows):
+            missing = [column for column in spec["required"] if column not in columns]
+            if missing:
+                raise ImportFormatError(f"The file has no {', '.join(missing)} column.")
+            valid = []
+            # Validate before taking the write lock so other writers only wait for the insert
+            for number, row in chunk:
+                try:
+                    valid.append(spec["validate"](row, context))
+                except RowError as e:
+                    summary["rejected"] += 1
+                    if len(summary["sample_rejects"]) < REJECT_SAMPLE_SIZE:
+                        summary["sample_rejects"].append({"row": number, "reason": str(e)})
+                    if reject_writer:
+                        reject_writer.writerow([number, str(e)])
+            with database.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(spec["upsert"], valid)
+            if on_commit is not None:
+                on_commit()
+            summary["rows"] += len(chunk)
+            summary["imported"] += len(valid)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"Not a readable CSV file: {str(e)}")
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["rows_per_second"] = round(summary["rows"] / summary["seconds"]) if summary["seconds"] else None
+    return summary
+
+
+def iter_csv(table, filters=None, sort="id", descending=False, page_rows=EXPORT_PAGE_ROWS):
+    """Return an iterator over an admin table as UTF-8 CSV, one chunk of bytes per page, in the admin sort order
+
+    An unknown table, filter or sort column raises here rather than part way
+    through a streamed response.
+    """
+    spec = admin_tables.TABLES[table]
+    spec["filters"](**(filters or {}))
+    spec["sort_columns"][sort]
+    return _csv_chunks(table, filters, sort, descending, page_rows)
+
+
+def _csv_chunks(table, filters, sort, descending, page_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for number, (columns, rows) in enumerate(admin_tables.iter_pages(table, filters, sort, descending, page_rows)):
+        if number == 0:
+            writer.writerow(columns)
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _arrow_type(pa, declared):
+    # SQLite's affinity rules: a declared type containing INT is integer, REAL/FLOA/DOUB is real
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _declared_types(table):
+    """Return the declared SQLite type of each column an admin table's query selects, in order
+
+    A page can hold nothing but NULLs in a column, so the types come from the
+    schema rather than from the values.
+    """
+    with database.connection() as conn:
+        conn.execute("DROP VIEW IF EXISTS temp._export_columns")
+        conn.execute(f"CREATE TEMP VIEW _export_columns AS {admin_tables.TABLES[table]['select']}")
+        try:
+            return [row[2] for row in conn.execute("PRAGMA temp.table_info(_export_columns)")]
+        finally:
+            conn.execute("DROP VIEW temp._export_columns")
+
+
+def write_parquet(table, sink, filters=None, sort="id", descending=False, page_rows=EXPORT_PAGE_ROWS):
+    """Write an admin table to ``sink`` as Parquet, one row group per page"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = [_arrow_type(pa, declared) for declared in _declared_types(table)]
+    writer = None
+    try:
+        for columns, rows in admin_tables.iter_pages(table, filters, sort, descending, page_rows):
+            values = list(zip(*rows)) if rows else [()] * len(columns)
+            if writer is None:
+                schema = pa.schema(list(zip(columns, types)))
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(pa.Table.from_arrays([pa.array(column_values, type=field.type)
+                                                     for column_values, field in zip(values, schema)], schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_file(table, fmt="csv", filters=None, sort="id", descending=False):
+    """Export an admin table to a spooled temporary file, rewound for reading"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    if fmt == "csv":
+        for chunk in iter_csv(table, filters, sort, descending):
+            spool.write(chunk)
+    elif fmt == "parquet":
+        write_parquet(table, spool, filters, sort, descending)
+    else:
+        raise ImportFormatError(f"Unsupported format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    spool.seek(0)
+    return spool
@@ -0,0 +1,107 @@
+import argparse
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+# Runs against a scratch database; set before database is imported so the real one is never touched
+SCRATCH_DIR = tempfile.mkdtemp(prefix="bulk-io-bench-")
+os.environ["HARDWARE_DB_PATH"] = os.path.join(SCRATCH_DIR, "bench.db")
+
+import bulk_io  # noqa: E402
+import service  # noqa: E402
+
+MODELS = ["Dell XPS 13", "HP Envy 14", "Lenovo ThinkPad T14", "Asus ZenBook 14", "Acer Swift 3"]
+COLUMNS = ["service_tag", "customer_name", "customer_email", "customer_phone", "customer_address",
+           "laptop_model", "purchase_date", "warranty_end_date"]
+
+
+def synthetic_customers(count, reject_fraction, rng):
+    """Customer rows as a CRM feed would send them, with a share of rows the validator rejects"""
+    for number in range(count):
+        year, month, day = rng.randint(2019, 2025), rng.randint(1, 12), rng.randint(1, 28)
+        row = [f"SVC{number:07d}", f"Customer {number}", f"c{number}@example.com", f"555-{number % 10000:04d}",
+               f"{number} Main St, Springfield", rng.choice(MODELS), f"{year}-{month:02d}-{day:02d}",
+               f"{year + rng.randint(1, 3)}-{month:02d}-{day:02d}"]
+        if rng.random() < reject_fraction:
+            # A day-first date, a malformed email or a missing name, in equal shares
+            broken = rng.choice((7, 2, 1))
+            row[broken] = {7: f"{day:02d}/{month:02d}/{year + 1}", 2: "not-an-email", 1: ""}[broken]
+        yield row
+
+
+def write_files(count, reject_fraction, formats, seed):
+    rng = random.Random(seed)
+    paths = {}
+    csv_path = os.path.join(SCRATCH_DIR, "customers.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(synthetic_customers(count, reject_fraction, rng))
+    paths["csv"] = csv_path
+    if "parquet" in formats:
+        import pyarrow.csv as pv
+        import pyarrow.parquet as pq
+
+        paths["parquet"] = os.path.join(SCRATCH_DIR, "customers.parquet")
+        # Read every column as text so the file holds what the CSV holds
+        table = pv.read_csv(csv_path, convert_options=pv.ConvertOptions(column_types={c: "string" for c in COLUMNS}))
+        pq.write_table(table, paths["parquet"])
+    return paths
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def one_at_a_time(count):
+    """Rows per second through add_customer, as the admin form adds them, for comparison"""
+    started = time.perf_counter()
+    for number in range(count):
+        service.add_customer(f"ONE{number:06d}", f"Single {number}", None, None, None, "Dell XPS 13",
+                             "2024-01-01", "2027-01-01")
+    return count / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bulk customer import and export on a scratch database.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--reject-fraction", type=float, default=0.01, help="share of rows with a validation error")
+    parser.add_argument("--formats", nargs="+", choices=bulk_io.FORMATS, default=["csv"])
+    parser.add_argument("--chunk-rows", type=int, default=bulk_io.IMPORT_CHUNK_ROWS)
+    parser.add_argument("--single-rows", type=int, default=1000, help="rows added one at a time for comparison")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    paths = write_files(args.rows, args.reject_fraction, args.formats, args.seed)
+    print(f"{args.rows} rows written to {', '.join(args.formats)} in {time.perf_counter() - started:.1f} s")
+    service.init_db()
+
+    failed = False
+    for fmt in args.formats:
+        # Each format imports into the same table; the second pass updates every row instead of inserting
+        with open(os.devnull, "w", newline="") as rejects:
+            summary = bulk_io.import_file("customers", paths[fmt], fmt, rejects, args.chunk_rows)
+        print(f"import {fmt:<8} {summary['seconds']:7.1f} s  {summary['rows_per_second']:>9} rows/s  "
+              f"{summary['imported']} imported, {summary['rejected']} rejected  peak RSS {peak_rss_mb():.0f} MB")
+        failed |= summary["rows"] != args.rows
+
+    for fmt in args.formats:
+        started = time.perf_counter()
+        spool = service.export_records("customers", fmt)
+        seconds = time.perf_counter() - started
+        size = spool.seek(0, os.SEEK_END)
+        spool.close()
+        print(f"export {fmt:<8} {seconds:7.1f} s  {size / 1e6:9.1f} MB  peak RSS {peak_rss_mb():.0f} MB")
+
+    if args.single_rows:
+        print(f"add_customer one row at a time: {one_at_a_time(args.single_rows):.0f} rows/s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
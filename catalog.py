@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import threading
+import time
+
+import database
+
+# How often a process checks whether the catalog changed in the database
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", 30))
+
+# Initial catalog contents; afterwards the brands and brand_aliases tables are
+# the source of truth and can be edited without restarting the app
+BRAND_CATALOG = {
+    "Dell": {
+        "aliases": ["dell", "xps", "inspiron", "latitude", "vostro", "precision", "alienware"],
+        "renewal": {
+            "steps": [
+                "Visit Dell's warranty extension website",
+                "Enter your service tag to check eligibility",
+                "Select your preferred extension period (1-3 years)",
+                "Make payment online",
+                "Receive confirmation email with updated warranty details"
+            ],
+            "link": "https://www.dell.com/support/contractservices/en-in",
+            "pricing": "Starting at $99/year for basic coverage"
+        },
+    },
+    "HP": {
+        "aliases": ["hp", "hewlett packard", "spectre", "envy", "pavilion", "elitebook", "probook", "zbook",
+                    "omen", "victus", "dragonfly"],
+        "renewal": {
+            "steps": [
+                "Go to HP Care Pack purchase page",
+                "Enter your product number or select your model",
+                "Choose your Care Pack option",
+                "Complete the purchase",
+                "Your warranty will be automatically updated"
+            ],
+            "link": "https://www.hp.com/in-en/shop/carepack/warranty.html",
+            "pricing": "Starting at $129/year for basic coverage"
+        },
+    },
+    "Lenovo": {
+        "aliases": ["lenovo", "thinkpad", "thinkbook", "ideapad", "yoga", "legion"],
+        "renewal": {
+            "steps": [
+                "Visit Lenovo's warranty upgrade site",
+                "Enter your serial number",
+                "Select your upgrade options",
+                "Proceed to checkout",
+                "Your warranty status will update within 24 hours"
+            ],
+            "link": "https://pcsupport.lenovo.com/in/en/warranty-lookup#/",
+            "pricing": "Starting at $89/year for basic coverage"
+        },
+    },
+    "Apple": {"aliases": ["apple", "macbook"]},
+    "Asus": {"aliases": ["asus", "zenbook", "vivobook", "rog", "tuf gaming", "expertbook"]},
+    "Acer": {"aliases": ["acer", "aspire", "predator", "swift", "nitro", "travelmate", "chromebook spin"]},
+    "Microsoft": {"aliases": ["microsoft", "surface"]},
+    "Samsung": {"aliases": ["samsung", "galaxy"]},
+    "MSI": {"aliases": ["msi", "katana", "raider", "prestige", "modern 14", "modern 15"]},
+    "Razer": {"aliases": ["razer", "razer blade"]},
+    "LG": {"aliases": ["lg", "lg gram"]},
+    "Huawei": {"aliases": ["huawei", "matebook"]},
+    "Xiaomi": {"aliases": ["xiaomi", "redmibook", "mi notebook"]},
+    "Toshiba": {"aliases": ["toshiba", "dynabook", "satellite", "portege", "tecra"]},
+    "Fujitsu": {"aliases": ["fujitsu", "lifebook"]},
+    "Gigabyte": {"aliases": ["gigabyte", "aorus"]},
+    "VAIO": {"aliases": ["vaio", "sony vaio"]},
+    "Google": {"aliases": ["pixelbook"]},
+}
+
+
+def tokenize(text):
+    """Split a model name into lowercase alphanumeric words"""
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def normalize_alias(alias):
+    """Normalize an alias to the form stored in brand_aliases"""
+    return " ".join(tokenize(alias))
+
+
+class Catalog:
+    """Immutable snapshot of the brand catalog indexed for constant-time lookups"""
+
+    def __init__(self, version, brands, aliases):
+        self.version = version
+        # Brand name -> renewal info ({} when the catalog has none for the brand)
+        self.brands = brands
+        # Aliases are keyed by their word tuple so matches respect word boundaries
+        self.aliases = {tuple(alias.split()): brand for alias, brand in aliases.items()}
+        self.max_alias_words = max(map(len, self.aliases), default=0)
+
+    def detect_brand(self, laptop_model):
+        """Return the brand of a model name, preferring the earliest and then the longest alias"""
+        words = tokenize(laptop_model)
+        for start in range(len(words)):
+            for length in range(min(self.max_alias_words, len(words) - start), 0, -1):
+                brand = self.aliases.get(tuple(words[start:start + length]))
+                if brand:
+                    return brand
+        return None
+
+
+def load_catalog(conn):
+    """Read a consistent snapshot of the catalog tables"""
+    conn.execute("BEGIN")
+    version = conn.execute("SELECT value FROM job_state WHERE name='catalog_version'").fetchone()[0]
+    brands = {}
+    for name, steps, link, pricing in conn.execute(
+            "SELECT name, renewal_steps, renewal_link, renewal_pricing FROM brands"):
+        brands[name] = {"steps": json.loads(steps), "link": link, "pricing": pricing} if steps else {}
+    aliases = dict(conn.execute('''SELECT a.alias, b.name FROM brand_aliases a
+                                   JOIN brands b ON a.brand_id = b.id''').fetchall())
+    conn.commit()
+    return Catalog(version, brands, aliases)
+
+
+def seed_catalog(conn):
+    """Load BRAND_CATALOG into an empty catalog"""
+    if conn.execute("SELECT COUNT(*) FROM brands").fetchone()[0]:
+        return
+    for name, entry in BRAND_CATALOG.items():
+        renewal = entry.get("renewal")
+        brand_id = conn.execute('''INSERT INTO brands (name, renewal_steps, renewal_link, renewal_pricing)
+                                   VALUES (?, ?, ?, ?)''',
+                                (name, json.dumps(renewal["steps"]) if renewal else None,
+                                 renewal["link"] if renewal else None,
+                                 renewal["pricing"] if renewal else None)).lastrowid
+        conn.executemany("INSERT OR IGNORE INTO brand_aliases (alias, brand_id) VALUES (?, ?)",
+                         [(normalize_alias(alias), brand_id) for alias in entry["aliases"]])
+
+
+_catalog = None
+_checked_at = 0.0
+# Set by reload_catalog(); the clock behind time.monotonic() may have started less than
+# CATALOG_CHECK_SECONDS ago, so an old check time cannot stand for "check now"
+_check_due = False
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the in-memory catalog, reloading it if the database copy changed"""
+    global _catalog, _checked_at, _check_due
+    if _catalog is not None and not _check_due and time.monotonic() - _checked_at < CATALOG_CHECK_SECONDS:
+        return _catalog
+
+    with _catalog_lock:
+        if _catalog is None or _check_due or time.monotonic() - _checked_at >= CATALOG_CHECK_SECONDS:
+            _check_due = False
+            with database.connection() as conn:
+                version = conn.execute("SELECT value FROM job_state WHERE name='catalog_version'").fetchone()[0]
+                if _catalog is None or _catalog.version != version:
+                    _catalog = load_catalog(conn)
+            _checked_at = time.monotonic()
+    return _catalog
+
+
+def reload_catalog():
+    """Check for catalog changes on the next lookup instead of waiting for CATALOG_CHECK_SECONDS"""
+    global _check_due
+    _check_due = True
+
+
+def detect_brand(laptop_model):
+    """Return the catalog brand for a laptop model string, or None"""
+    return get_catalog().detect_brand(laptop_model)
+
+
+def get_renewal_info(brand):
+    """Return the warranty renewal steps, link and pricing for a brand, or {}"""
+    return get_catalog().brands.get(brand, {})
+
+
+def brand_names():
+    """Return every brand in the catalog, sorted by name"""
+    return sorted(get_catalog().brands)
+
+
+def add_alias(alias, brand):
+    """Map another model-name fragment to a brand; running processes pick it up on their next check"""
+    with database.connection() as conn:
+        conn.execute('''INSERT OR REPLACE INTO brand_aliases (alias, brand_id)
+                        SELECT ?, id FROM brands WHERE name=?''', (normalize_alias(alias), brand))
+    reload_catalog()
@@ -0,0 +1,597 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import metrics
+
+DB_PATH = os.getenv("HARDWARE_DB_PATH", "hardware_support.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16000))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", 256))
+
+
+class ConnectionPool:
+    """Thread-safe pool of tuned SQLite connections shared by every Streamlit session
+
+    This module is imported once per process, so the pool survives Streamlit
+    reruns. Connections keep their compiled statements between checkouts.
+    """
+
+    def __init__(self, path=DB_PATH, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path,
+                               timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE)
+        # WAL lets readers run alongside a writer instead of failing with "database is locked"
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self):
+        """Check out an idle connection, opening a new one while under the pool size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any unfinished transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self, operation="unnamed"):
+        """Borrow a connection for one unit of work, committing on success
+
+        The whole unit, including the wait for a free connection, is timed as a
+        "db" span labelled with ``operation``.
+        """
+        with metrics.span("db", operation):
+            conn = self.acquire()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self.release(conn)
+
+    def close(self):
+        """Close every idle connection; connections still checked out are left alone"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def connection():
+    """Context manager yielding a pooled connection to the support database
+
+    Spans are labelled with the calling function's name, so every data access
+    function is instrumented without decorating each one.
+    """
+    return get_pool().connection(sys._getframe(1).f_code.co_name)
+
+
+# Unix time with millisecond precision, as time.time() would store it. Taken when the statement runs,
+# so a write stamped with it inside a transaction is stamped no earlier than it holds the write lock
+UNIX_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+# Rollups read by the analytics dashboard instead of scanning appointments and customers.
+# Triggers apply every insert, status change and delete to them as it happens.
+_COMPLETION_TIMED = "({row}.status = 'Completed' AND {row}.completed_at IS NOT NULL AND {row}.created_at IS NOT NULL)"
+_ROLLUP_KEYS = {
+    "technician_id": "COALESCE({row}.technician_id, 0)",
+    "status": "COALESCE({row}.status, 'Unknown')",
+    "brand": "COALESCE((SELECT specialization FROM technicians WHERE id = {row}.technician_id), '')",
+    "location": "COALESCE((SELECT location FROM technicians WHERE id = {row}.technician_id), '')",
+    "defect_type": "COALESCE(NULLIF(LOWER(TRIM({row}.defect_type)), ''), 'unspecified')",
+    "severity": "COALESCE(NULLIF(TRIM({row}.severity), ''), 'Unknown')",
+}
+
+
+# Technician totals are kept per day and per month so long windows read whole months
+_TECHNICIAN_ROLLUPS = {"rollup_technician_daily": ("day", "{row}.appointment_date"),
+                       "rollup_technician_monthly": ("month", "substr({row}.appointment_date, 1, 7)")}
+
+
+def _apply_to_rollups(row, sign):
+    """Trigger statements adding (sign 1) or removing (sign -1) the NEW or OLD appointment row"""
+    keys = {name: expression.format(row=row) for name, expression in _ROLLUP_KEYS.items()}
+    timed = _COMPLETION_TIMED.format(row=row)
+    technician_statements = "".join(f'''
+        INSERT INTO {table} ({period}, technician_id, booked, completed, completion_seconds, completions_timed)
+        VALUES ({period_key.format(row=row)}, {keys["technician_id"]}, {sign} * ({row}.status != 'Cancelled'),
+                {sign} * ({row}.status = 'Completed'),
+                {sign} * (CASE WHEN {timed} THEN {row}.completed_at - {row}.created_at ELSE 0 END), {sign} * {timed})
+        ON CONFLICT ({period}, technician_id) DO UPDATE SET
+            booked = booked + excluded.booked, completed = completed + excluded.completed,
+            completion_seconds = completion_seconds + excluded.completion_seconds,
+            completions_timed = completions_timed + excluded.completions_timed;'''
+        for table, (period, period_key) in _TECHNICIAN_ROLLUPS.items())
+    return technician_statements + f'''
+        INSERT INTO rollup_status_by_area (brand, location, status, appointments)
+        VALUES ({keys["brand"]}, {keys["location"]}, {keys["status"]}, {sign})
+        ON CONFLICT (brand, location, status) DO UPDATE SET appointments = appointments + excluded.appointments;
+        INSERT INTO rollup_defects_daily (day, defect_type, severity, appointments)
+        VALUES ({row}.appointment_date, {keys["defect_type"]}, {keys["severity"]}, {sign})
+        ON CONFLICT (day, defect_type, severity) DO UPDATE SET appointments = appointments + excluded.appointments;'''
+
+
+def _move_technician_area(old, new):
+    """Trigger statements moving a technician's appointments between the brand and location keys of the area rollup
+
+    The area of an appointment is read from its technician, so editing or
+    deleting the technician moves every one of their appointments. ``old``
+    and ``new`` are (brand, location) SQL expressions.
+    """
+    return "".join(f'''
+        INSERT INTO rollup_status_by_area (brand, location, status, appointments)
+        SELECT COALESCE({brand}, ''), COALESCE({location}, ''), COALESCE(status, 'Unknown'), {sign} * COUNT(*)
+        FROM appointments WHERE technician_id = OLD.id GROUP BY 3
+        ON CONFLICT (brand, location, status) DO UPDATE SET appointments = appointments + excluded.appointments;'''
+        for (brand, location), sign in ((old, -1), (new, 1)))
+
+
+def _apply_to_warranty_rollup(row, sign):
+    return f'''
+        INSERT INTO rollup_warranty_monthly (month, customers)
+        VALUES (COALESCE(substr({row}.warranty_end_date, 1, 7), ''), {sign})
+        ON CONFLICT (month) DO UPDATE SET customers = customers + excluded.customers;'''
+
+
+def rebuild_appointment_rollups(conn):
+    """Recompute every analytics rollup from the appointments and customers tables"""
+    keys = {name: expression.format(row="a") for name, expression in _ROLLUP_KEYS.items()}
+    timed = _COMPLETION_TIMED.format(row="a")
+    for table in (*_TECHNICIAN_ROLLUPS, "rollup_status_by_area", "rollup_defects_daily", "rollup_warranty_monthly"):
+        conn.execute(f"DELETE FROM {table}")
+    for table, (period, period_key) in _TECHNICIAN_ROLLUPS.items():
+        conn.execute(f'''INSERT INTO {table}
+                        ({period}, technician_id, booked, completed, completion_seconds, completions_timed)
+                        SELECT {period_key.format(row="a")}, {keys["technician_id"]}, SUM(a.status != 'Cancelled'),
+                               SUM(a.status = 'Completed'),
+                               SUM(CASE WHEN {timed} THEN a.completed_at - a.created_at ELSE 0 END), SUM({timed})
+                        FROM appointments a GROUP BY 1, 2''')
+    conn.execute(f'''INSERT INTO rollup_status_by_area (brand, location, status, appointments)
+                    SELECT COALESCE(t.specialization, ''), COALESCE(t.location, ''), {keys["status"]}, COUNT(*)
+                    FROM appointments a LEFT JOIN technicians t ON t.id = a.technician_id GROUP BY 1, 2, 3''')
+    conn.execute(f'''INSERT INTO rollup_defects_daily (day, defect_type, severity, appointments)
+                    SELECT a.appointment_date, {keys["defect_type"]}, {keys["severity"]}, COUNT(*)
+                    FROM appointments a GROUP BY 1, 2, 3''')
+    conn.execute('''INSERT INTO rollup_warranty_monthly (month, customers)
+                    SELECT COALESCE(substr(warranty_end_date, 1, 7), ''), COUNT(*) FROM customers GROUP BY 1''')
+
+
+def _merge_case_duplicate_customers(conn):
+    """Fold customers whose service tags differ only in case or spacing into one row per device
+
+    The row already stored in normal form, which imports kept updating,
+    survives; otherwise the oldest does. Appointments move to the survivor.
+    """
+    rows = conn.execute('''SELECT id, UPPER(TRIM(service_tag)) FROM customers
+                            WHERE UPPER(TRIM(service_tag)) IN (SELECT UPPER(TRIM(service_tag)) FROM customers
+                                                               WHERE service_tag != UPPER(TRIM(service_tag)))
+                            ORDER BY service_tag != UPPER(TRIM(service_tag)), id''').fetchall()
+    survivors = {}
+    for customer_id, service_tag in rows:
+        survivor = survivors.setdefault(service_tag, customer_id)
+        if survivor != customer_id:
+            conn.execute("UPDATE appointments SET customer_id=? WHERE customer_id=?", (survivor, customer_id))
+            conn.execute("DELETE FROM customers WHERE id=?", (customer_id,))
+
+
+# Schema migrations, applied in order at startup. Each step is a
+# (version, description, statements) tuple; never edit a released step,
+# append a new one instead.
+MIGRATIONS = [
+    (1, "Create customers, technicians and appointments tables", [
+        '''CREATE TABLE IF NOT EXISTS customers
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            service_tag TEXT UNIQUE,
+            customer_name TEXT,
+            customer_email TEXT,
+            customer_phone TEXT,
+            customer_address TEXT,
+            laptop_model TEXT,
+            purchase_date TEXT,
+            warranty_end_date TEXT,
+            warranty_valid INTEGER)''',
+        '''CREATE TABLE IF NOT EXISTS technicians
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT,
+            phone TEXT,
+            specialization TEXT,
+            location TEXT,
+            rating REAL,
+            available INTEGER,
+            password TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS appointments
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            technician_id INTEGER,
+            service_tag TEXT,
+            issue_description TEXT,
+            appointment_date TEXT,
+            appointment_time TEXT,
+            status TEXT,
+            FOREIGN KEY (customer_id) REFERENCES customers (id),
+            FOREIGN KEY (technician_id) REFERENCES technicians (id))''',
+    ]),
+    (2, "Create defect analysis cache tables", [
+        '''CREATE TABLE IF NOT EXISTS analysis_cache
+           (cache_key TEXT PRIMARY KEY,
+            model_version TEXT,
+            result TEXT,
+            created_at REAL,
+            last_accessed REAL,
+            hit_count INTEGER DEFAULT 0)''',
+        "CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_accessed ON analysis_cache (last_accessed)",
+        '''CREATE TABLE IF NOT EXISTS analysis_cache_stats
+           (name TEXT PRIMARY KEY,
+            value INTEGER)''',
+        "INSERT OR IGNORE INTO analysis_cache_stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0)",
+    ]),
+    (3, "Index technician lookups and appointment schedules", [
+        "CREATE INDEX IF NOT EXISTS idx_technicians_specialization_available ON technicians (specialization, available)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_technician_date ON appointments (technician_id, appointment_date)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_customer ON appointments (customer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (appointment_date)",
+        "ANALYZE",
+    ]),
+    (4, "Create outbound email outbox", [
+        '''CREATE TABLE IF NOT EXISTS email_outbox
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT,
+            subject TEXT,
+            body TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL,
+            last_error TEXT,
+            created_at REAL,
+            sent_at REAL)''',
+        "CREATE INDEX IF NOT EXISTS idx_email_outbox_status_next ON email_outbox (status, next_attempt_at)",
+    ]),
+    (5, "Create service center lookup cache", [
+        '''CREATE TABLE IF NOT EXISTS service_center_cache
+           (query_key TEXT PRIMARY KEY,
+            brand TEXT,
+            location TEXT,
+            results TEXT,
+            fetched_at REAL)''',
+    ]),
+    (6, "Record defect analysis latency per request", [
+        '''CREATE TABLE IF NOT EXISTS analysis_timings
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL,
+            cache_hit INTEGER,
+            queue_wait_ms REAL,
+            upstream_ms REAL,
+            parse_ms REAL,
+            total_ms REAL,
+            payload_bytes INTEGER,
+            error TEXT)''',
+        "CREATE INDEX IF NOT EXISTS idx_analysis_timings_created ON analysis_timings (created_at)",
+    ]),
+    (7, "Index warranty end dates and track background job state", [
+        "CREATE INDEX IF NOT EXISTS idx_customers_warranty_end ON customers (warranty_end_date)",
+        '''CREATE TABLE IF NOT EXISTS job_state
+           (name TEXT PRIMARY KEY,
+            value TEXT)''',
+    ]),
+    (8, "Index the admin dashboard search and filter columns", [
+        "CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (customer_name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_technicians_name ON technicians (name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_service_tag ON appointments (service_tag)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_status_date ON appointments (status, appointment_date)",
+        "ANALYZE",
+    ]),
+    (9, "Add idempotency keys to appointments", [
+        "ALTER TABLE appointments ADD COLUMN idempotency_key TEXT",
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_idempotency_key
+           ON appointments (idempotency_key) WHERE idempotency_key IS NOT NULL''',
+    ]),
+    (10, "Create the brand and model catalog", [
+        '''CREATE TABLE IF NOT EXISTS brands
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            renewal_steps TEXT,
+            renewal_link TEXT,
+            renewal_pricing TEXT)''',
+        # Aliases are normalized model-name fragments: a brand, series or full model name
+        '''CREATE TABLE IF NOT EXISTS brand_aliases
+           (alias TEXT PRIMARY KEY,
+            brand_id INTEGER NOT NULL REFERENCES brands (id))''',
+        "INSERT OR IGNORE INTO job_state (name, value) VALUES ('catalog_version', '0')",
+        # Any edit to the catalog bumps its version so running processes reload it
+        *[f'''CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bumps_catalog AFTER {event} ON {table}
+              BEGIN
+                  UPDATE job_state SET value = CAST(value AS INTEGER) + 1 WHERE name = 'catalog_version';
+              END'''
+          for table in ("brands", "brand_aliases") for event in ("INSERT", "UPDATE", "DELETE")],
+    ]),
+    (11, "Record appointment timestamps and defects and maintain analytics rollups", [
+        # Unix timestamps of the booking and of the move to Completed
+        "ALTER TABLE appointments ADD COLUMN created_at REAL",
+        "ALTER TABLE appointments ADD COLUMN completed_at REAL",
+        "ALTER TABLE appointments ADD COLUMN defect_type TEXT",
+        "ALTER TABLE appointments ADD COLUMN severity TEXT",
+        '''CREATE TABLE IF NOT EXISTS rollup_technician_daily
+           (day TEXT NOT NULL,
+            technician_id INTEGER NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            completion_seconds REAL NOT NULL DEFAULT 0,
+            completions_timed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, technician_id)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS rollup_technician_monthly
+           (month TEXT NOT NULL,
+            technician_id INTEGER NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            completion_seconds REAL NOT NULL DEFAULT 0,
+            completions_timed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, technician_id)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS rollup_status_by_area
+           (brand TEXT NOT NULL,
+            location TEXT NOT NULL,
+            status TEXT NOT NULL,
+            appointments INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (brand, location, status)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS rollup_defects_daily
+           (day TEXT NOT NULL,
+            defect_type TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            appointments INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, defect_type, severity)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS rollup_warranty_monthly
+           (month TEXT PRIMARY KEY,
+            customers INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''',
+        f'''CREATE TRIGGER IF NOT EXISTS appointments_insert_rollups AFTER INSERT ON appointments
+            BEGIN {_apply_to_rollups("NEW", 1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS appointments_delete_rollups AFTER DELETE ON appointments
+            BEGIN {_apply_to_rollups("OLD", -1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS appointments_update_rollups
+            AFTER UPDATE OF technician_id, appointment_date, status, created_at, completed_at, defect_type, severity
+            ON appointments
+            BEGIN {_apply_to_rollups("OLD", -1)} {_apply_to_rollups("NEW", 1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customers_insert_rollups AFTER INSERT ON customers
+            BEGIN {_apply_to_warranty_rollup("NEW", 1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customers_delete_rollups AFTER DELETE ON customers
+            BEGIN {_apply_to_warranty_rollup("OLD", -1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customers_update_rollups AFTER UPDATE OF warranty_end_date ON customers
+            BEGIN {_apply_to_warranty_rollup("OLD", -1)} {_apply_to_warranty_rollup("NEW", 1)}
+            END''',
+        rebuild_appointment_rollups,
+    ]),
+    (12, "Persist defect analysis reports", [
+        # appointment_id and service_tag stay NULL until the analysis is used for a booking
+        '''CREATE TABLE IF NOT EXISTS defect_reports
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            appointment_id INTEGER REFERENCES appointments (id),
+            service_tag TEXT,
+            created_at REAL,
+            model TEXT,
+            model_version TEXT,
+            defect_detected INTEGER,
+            defect_type TEXT,
+            severity TEXT,
+            affected_components TEXT,
+            images_analyzed INTEGER,
+            latency_ms REAL)''',
+        "CREATE INDEX IF NOT EXISTS idx_defect_reports_appointment ON defect_reports (appointment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_defect_reports_service_tag ON defect_reports (service_tag)",
+        "CREATE INDEX IF NOT EXISTS idx_defect_reports_severity ON defect_reports (severity)",
+        # One row per normalized component name, so component searches use the primary key
+        '''CREATE TABLE IF NOT EXISTS defect_report_components
+           (component TEXT NOT NULL,
+            report_id INTEGER NOT NULL REFERENCES defect_reports (id),
+            PRIMARY KEY (component, report_id)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS defect_report_images
+           (report_id INTEGER NOT NULL REFERENCES defect_reports (id),
+            position INTEGER NOT NULL,
+            image_hash TEXT NOT NULL,
+            model_version TEXT,
+            result TEXT,
+            error TEXT,
+            latency_ms REAL,
+            PRIMARY KEY (report_id, position)) WITHOUT ROWID''',
+        "CREATE INDEX IF NOT EXISTS idx_defect_report_images_hash ON defect_report_images (image_hash, model_version)",
+        # Thumbnails are stored once per distinct photo, however many reports include it
+        '''CREATE TABLE IF NOT EXISTS defect_thumbnails
+           (image_hash TEXT PRIMARY KEY,
+            thumbnail BLOB NOT NULL,
+            created_at REAL)''',
+    ]),
+    (13, "Track when appointments change for incremental schedule refresh", [
+        "ALTER TABLE appointments ADD COLUMN updated_at REAL",
+        f"UPDATE appointments SET updated_at = {UNIX_NOW}",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_technician_updated ON appointments (technician_id, updated_at)",
+        # Writers may set updated_at themselves; any change that leaves it untouched stamps it here
+        f'''CREATE TRIGGER IF NOT EXISTS appointments_insert_touch AFTER INSERT ON appointments
+            WHEN NEW.updated_at IS NULL
+            BEGIN
+                UPDATE appointments SET updated_at = {UNIX_NOW} WHERE id = NEW.id;
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS appointments_update_touch AFTER UPDATE ON appointments
+            WHEN NEW.updated_at IS OLD.updated_at
+            BEGIN
+                UPDATE appointments SET updated_at = {UNIX_NOW} WHERE id = NEW.id;
+            END''',
+        # Schedules show the customer's contact details, so editing them changes the customer's upcoming visits
+        f'''CREATE TRIGGER IF NOT EXISTS customers_update_touch_appointments
+            AFTER UPDATE OF customer_name, customer_email, customer_phone, customer_address ON customers
+            WHEN NEW.customer_name IS NOT OLD.customer_name OR NEW.customer_email IS NOT OLD.customer_email
+                 OR NEW.customer_phone IS NOT OLD.customer_phone OR NEW.customer_address IS NOT OLD.customer_address
+            BEGIN
+                UPDATE appointments SET updated_at = {UNIX_NOW}
+                WHERE customer_id = NEW.id AND appointment_date >= date('now', '-1 day');
+            END''',
+    ]),
+    (14, "Record which inference backend answered each analysis", [
+        "ALTER TABLE analysis_timings ADD COLUMN backend TEXT",
+    ]),
+    (15, "Record how malformed analysis answers were recovered", [
+        # NULL for a clean answer, 'repaired' for near-JSON fixed locally, 'reasked' when fields were asked for again
+        "ALTER TABLE analysis_timings ADD COLUMN recovery TEXT",
+    ]),
+    (16, "Keep a geocoded directory of service centers", [
+        # One row per center a search has returned; centers without coordinates are only matched by text
+        '''CREATE TABLE IF NOT EXISTS service_centers
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            brand TEXT NOT NULL COLLATE NOCASE,
+            name TEXT NOT NULL COLLATE NOCASE,
+            address TEXT NOT NULL COLLATE NOCASE,
+            phone TEXT,
+            link TEXT,
+            city TEXT,
+            latitude REAL,
+            longitude REAL,
+            geocoded_by TEXT,
+            first_seen REAL,
+            last_seen REAL,
+            UNIQUE (brand, name, address))''',
+        "CREATE INDEX IF NOT EXISTS idx_service_centers_last_seen ON service_centers (last_seen)",
+        "ALTER TABLE service_center_cache ADD COLUMN requested_at REAL",
+        "CREATE INDEX IF NOT EXISTS idx_service_center_cache_fetched ON service_center_cache (fetched_at)",
+        # Cached searches were cut to three centers with placeholder phone numbers; search again to fill the directory
+        "DELETE FROM service_center_cache",
+    ]),
+    (17, "Store service tags upper-case", [
+        # Tags typed in the admin form kept their case while imports upper-cased them, so one device could have two rows
+        _merge_case_duplicate_customers,
+        "UPDATE customers SET service_tag = UPPER(TRIM(service_tag)) WHERE service_tag != UPPER(TRIM(service_tag))",
+        "UPDATE appointments SET service_tag = UPPER(TRIM(service_tag)) WHERE service_tag != UPPER(TRIM(service_tag))",
+        "UPDATE defect_reports SET service_tag = UPPER(TRIM(service_tag)) WHERE service_tag != UPPER(TRIM(service_tag))",
+    ]),
+    (18, "Track when warranty end dates change for the incremental warranty refresh", [
+        # Existing rows were reconciled by earlier refreshes, so only later changes are stamped
+        "ALTER TABLE customers ADD COLUMN warranty_changed_at REAL",
+        "CREATE INDEX IF NOT EXISTS idx_customers_warranty_changed ON customers (warranty_changed_at)",
+        f'''CREATE TRIGGER IF NOT EXISTS customers_insert_touch_warranty AFTER INSERT ON customers
+            WHEN NEW.warranty_changed_at IS NULL
+            BEGIN
+                UPDATE customers SET warranty_changed_at = {UNIX_NOW} WHERE id = NEW.id;
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS customers_update_touch_warranty AFTER UPDATE OF warranty_end_date ON customers
+            WHEN NEW.warranty_end_date IS NOT OLD.warranty_end_date
+            BEGIN
+                UPDATE customers SET warranty_changed_at = {UNIX_NOW} WHERE id = NEW.id;
+            END''',
+    ]),
+    (19, "Move appointments between areas in the analytics rollup when their technician changes", [
+        f'''CREATE TRIGGER IF NOT EXISTS technicians_update_rollups
+            AFTER UPDATE OF specialization, location ON technicians
+            WHEN NEW.specialization IS NOT OLD.specialization OR NEW.location IS NOT OLD.location
+            BEGIN
+                {_move_technician_area(("OLD.specialization", "OLD.location"), ("NEW.specialization", "NEW.location"))}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS technicians_delete_rollups AFTER DELETE ON technicians
+            BEGIN {_move_technician_area(("OLD.specialization", "OLD.location"), ("NULL", "NULL"))}
+            END''',
+        # Counts kept before the triggers existed may have drifted after technician edits
+        rebuild_appointment_rollups,
+    ]),
+    (20, "Index the customer sort keys with NULLs folded to empty text", [
+        # Admin pages sort customers through COALESCE so a NULL key cannot end keyset pagination early
+        "CREATE INDEX IF NOT EXISTS idx_customers_name_sort ON customers (COALESCE(customer_name, '') COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_customers_warranty_end_sort ON customers (COALESCE(warranty_end_date, ''))",
+    ]),
+    (21, "Stamp warranty changes in the write paths instead of per-row triggers", [
+        # Each trigger ran a second UPDATE per inserted or changed customer, a quarter of bulk import throughput
+        "DROP TRIGGER IF EXISTS customers_insert_touch_warranty",
+        "DROP TRIGGER IF EXISTS customers_update_touch_warranty",
+    ]),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest migration version applied to the database"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                     description TEXT,
+                     applied_at TEXT)''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate():
+    """Apply every pending migration, each in its own write-locked transaction"""
+    with connection() as conn:
+        current = get_schema_version(conn)
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process may have migrated while we waited for the lock
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (version, description, datetime.now().isoformat(timespec="seconds")))
+            conn.commit()
+            current = version
+    return current
@@ -0,0 +1,434 @@
+import base64
+import functools
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+
+import database
+import defect_result
+import inference
+from ratelimit import TokenBucket
+from defect_result import DefectResult
+
+# Defect analysis settings
+ANALYSIS_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+ANALYSIS_PROMPT = """Analyze this image of a computer/laptop hardware component. 
+                        Identify any visible defects such as cracks, burns, liquid damage, or other physical issues.
+                        Provide a concise report with:
+                        1. Defect detected (Yes/No)
+                        2. Type of defect if present
+                        3. Severity (Low/Medium/High)
+                        4. Likely affected components
+                        Respond in JSON format with these keys: defect_detected, defect_type, severity, affected_components"""
+ANALYSIS_TEMPERATURE = 0.3
+ANALYSIS_MAX_TOKENS = 1024
+# Uploads are downsized and re-encoded before being sent to the vision model
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", 1024))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 85))
+# Cached results are only valid for the exact prompt/model combination that produced them
+ANALYSIS_MODEL_VERSION = hashlib.sha256(
+    f"{ANALYSIS_MODEL}|{ANALYSIS_TEMPERATURE}|{ANALYSIS_MAX_TOKENS}|{ANALYSIS_PROMPT}|"
+    f"{IMAGE_MAX_EDGE}|{IMAGE_FORMAT}|{IMAGE_QUALITY}|{inference.INFERENCE_BACKENDS}".encode('utf-8')
+).hexdigest()[:16]
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 5000))
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# Vision calls share one rate limit across every session and batch worker in the process
+ANALYSIS_RATE_PER_SECOND = float(os.getenv("ANALYSIS_RATE_PER_SECOND", 2))
+ANALYSIS_BURST = int(os.getenv("ANALYSIS_BURST", 5))
+ANALYSIS_RATE_WAIT_SECONDS = float(os.getenv("ANALYSIS_RATE_WAIT_SECONDS", 60))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 4))
+# Requests from the UI run on a shared executor so the Streamlit script thread never waits on the model
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", 8))
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", 45))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+SEVERITY_LEVELS = defect_result.SEVERITY_LEVELS
+# A re-ask only names the fields an answer lacked, so it needs far fewer tokens than the first answer
+REASK_MAX_TOKENS = int(os.getenv("REASK_MAX_TOKENS", 256))
+
+
+class AnalysisError(Exception):
+    """Raised when an image cannot be analyzed"""
+
+
+_router = None
+_router_lock = threading.Lock()
+_rate_limiter = TokenBucket(ANALYSIS_RATE_PER_SECOND, ANALYSIS_BURST)
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="defect-analysis")
+
+
+def get_router():
+    """Return the shared inference router over the configured backends, creating it on first use"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = inference.InferenceRouter(inference.build_backends(default_model=ANALYSIS_MODEL))
+    return _router
+
+
+def get_backend_health():
+    """Return the circuit breaker state and statistics of every inference backend"""
+    return get_router().health_snapshot()
+
+
+# Image preprocessing functions
+def prepare_image(image_bytes, max_edge=IMAGE_MAX_EDGE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """Decode an upload once, auto-orient it, strip metadata, downsize and re-encode it
+
+    Returns the decoded image for display together with the encoded bytes and
+    MIME type to send for inference.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder scale down while decoding instead of inflating the full photo
+    image.draft("RGB", (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    # Saving without exif/icc arguments drops the original metadata
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality)
+    return image, output.getvalue(), f"image/{image_format.lower()}"
+
+
+# Defect analysis cache functions
+def image_digest(image_bytes):
+    """Identify a prepared image independently of the prompt and model"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def image_cache_key(image_bytes):
+    """Build a cache key from the normalized image bytes plus the prompt/model version"""
+    digest = hashlib.sha256(image_bytes)
+    digest.update(ANALYSIS_MODEL_VERSION.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _bump_cache_stat(c, name, amount=1):
+    c.execute("UPDATE analysis_cache_stats SET value = value + ? WHERE name=?", (amount, name))
+
+
+def get_cached_analysis(cache_key):
+    """Return a cached analysis result, or None on a miss or expired entry"""
+    now = time.time()
+    with database.connection() as conn:
+        c = conn.cursor()
+        row = c.execute("SELECT result, created_at FROM analysis_cache WHERE cache_key=? AND model_version=?",
+                        (cache_key, ANALYSIS_MODEL_VERSION)).fetchone()
+
+        if row and now - row[1] <= ANALYSIS_CACHE_TTL_SECONDS:
+            c.execute("UPDATE analysis_cache SET last_accessed=?, hit_count = hit_count + 1 WHERE cache_key=?",
+                      (now, cache_key))
+            _bump_cache_stat(c, "hits")
+            return json.loads(row[0])
+
+        if row:
+            c.execute("DELETE FROM analysis_cache WHERE cache_key=?", (cache_key,))
+            _bump_cache_stat(c, "evictions")
+        _bump_cache_stat(c, "misses")
+    return None
+
+
+def store_cached_analysis(cache_key, result):
+    """Store an analysis result and evict expired and least recently used entries"""
+    now = time.time()
+    with database.connection() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO analysis_cache
+                     (cache_key, model_version, result, created_at, last_accessed, hit_count)
+                     VALUES (?, ?, ?, ?, ?, 0)''',
+                  (cache_key, ANALYSIS_MODEL_VERSION, json.dumps(result), now, now))
+
+        evicted = c.execute("DELETE FROM analysis_cache WHERE created_at < ?",
+                            (now - ANALYSIS_CACHE_TTL_SECONDS,)).rowcount
+        evicted += c.execute('''DELETE FROM analysis_cache WHERE cache_key IN
+                                (SELECT cache_key FROM analysis_cache
+                                 ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)''',
+                             (ANALYSIS_CACHE_MAX_ENTRIES,)).rowcount
+        if evicted:
+            _bump_cache_stat(c, "evictions", evicted)
+
+
+def purge_stale_cache():
+    """Drop cached analyses produced by a different prompt or model"""
+    with database.connection() as conn:
+        conn.execute("DELETE FROM analysis_cache WHERE model_version != ?", (ANALYSIS_MODEL_VERSION,))
+
+
+def get_analysis_cache_stats():
+    """Return hit/miss/eviction counters and the current size of the analysis cache"""
+    with database.connection() as conn:
+        stats = dict(conn.execute("SELECT name, value FROM analysis_cache_stats").fetchall())
+        stats["entries"] = conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else 0.0
+    return stats
+
+
+def get_reported_analysis(image_hash):
+    """Return the analysis saved with an earlier defect report of the same image and model version, if any"""
+    with database.connection() as conn:
+        row = conn.execute('''SELECT result FROM defect_report_images
+                              WHERE image_hash=? AND model_version=? AND result IS NOT NULL
+                              ORDER BY report_id DESC LIMIT 1''', (image_hash, ANALYSIS_MODEL_VERSION)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def record_timings(timings):
+    """Persist the latency breakdown of one analysis request"""
+    with database.connection() as conn:
+        conn.execute('''INSERT INTO analysis_timings
+                        (created_at, cache_hit, queue_wait_ms, upstream_ms, parse_ms, total_ms, payload_bytes, error,
+                         backend, recovery)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (time.time(), int(timings.get("cache_hit", False)), timings.get("queue_wait_ms"),
+                      timings.get("upstream_ms"), timings.get("parse_ms"), timings.get("total_ms"),
+                      timings.get("payload_bytes"), timings.get("error"), timings.get("backend"),
+                      timings.get("recovery")))
+
+
+# Core analysis functions
+def build_messages(image_bytes, mime_type="image/jpeg", prompt=ANALYSIS_PROMPT):
+    """Build the chat messages asking the vision model to analyze one prepared image"""
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime_type};base64,{base64_image}"
+                    }
+                }
+            ]
+        }
+    ]
+
+
+def analyze_image(image_bytes, mime_type="image/jpeg", timings=None):
+    """Analyze a prepared image for hardware defects using LLaMA Vision; raises on failure
+
+    Returns a DefectResult. The request goes through the inference router,
+    which falls back to (or hedges with) the other configured backends. A
+    near-JSON answer is repaired; one that lacks some fields gets a single
+    follow-up asking for just those, instead of a new analysis. Pass a dict
+    as ``timings`` to receive the answering backend, the upstream and parse
+    latency in milliseconds and how the answer was recovered.
+    """
+    if timings is None:
+        timings = {}
+    timings["payload_bytes"] = len(image_bytes)
+    cache_key = image_cache_key(image_bytes)
+    cached = get_cached_analysis(cache_key)
+    if cached is None:
+        # Saved reports outlive the bounded cache, so a photo seen before is never re-analyzed
+        cached = get_reported_analysis(image_digest(image_bytes))
+        if cached is not None:
+            store_cached_analysis(cache_key, cached)
+    if cached is not None:
+        try:
+            result = DefectResult.from_dict(cached)
+            timings["cache_hit"] = True
+            return result
+        except ValueError:
+            # Stored before results were validated; analyze the photo again
+            pass
+
+    if not _rate_limiter.acquire(ANALYSIS_RATE_WAIT_SECONDS):
+        raise AnalysisError("Too many analysis requests, please try again shortly.")
+
+    messages = build_messages(image_bytes, mime_type)
+    try:
+        (answer, repaired), info = get_router().complete(messages, ANALYSIS_TEMPERATURE, ANALYSIS_MAX_TOKENS,
+                                                         ANALYSIS_TIMEOUT_SECONDS, parse=defect_result.decode,
+                                                         size=len(image_bytes))
+        timings["backend"] = info["backend"]
+        timings["upstream_ms"] = info["upstream_ms"]
+        timings["parse_ms"] = info["parse_ms"]
+        timings["recovery"] = "repaired" if repaired else None
+        answer = defect_result.normalize_keys(answer)
+        _, missing = defect_result.check(answer)
+        if missing:
+            # Continue the conversation for just the missing fields rather than analyzing the photo again
+            followup = messages + [{"role": "assistant", "content": json.dumps(answer)},
+                                   {"role": "user", "content": defect_result.reask_prompt(missing)}]
+            (extra, _), info = get_router().complete(followup, ANALYSIS_TEMPERATURE, REASK_MAX_TOKENS,
+                                                     ANALYSIS_TIMEOUT_SECONDS, parse=defect_result.decode,
+                                                     size=len(image_bytes))
+            answer.update((field, value) for field, value in defect_result.normalize_keys(extra).items()
+                          if field in missing)
+            timings["upstream_ms"] += info["upstream_ms"]
+            timings["recovery"] = "reasked"
+        result = DefectResult.from_dict(answer)
+    except inference.InferenceError as e:
+        raise AnalysisError(str(e))
+    except defect_result.IncompleteResult as e:
+        raise AnalysisError(f"{str(e)} even after asking again. Please try again.")
+    store_cached_analysis(cache_key, result.to_dict())
+    return result
+
+
+def _analyze_item(image_bytes, mime_type, submitted_at=None, cancelled=None):
+    started = time.perf_counter()
+    timings = {"queue_wait_ms": (started - submitted_at) * 1000 if submitted_at else 0.0}
+    try:
+        if cancelled is not None and cancelled.is_set():
+            raise AnalysisError("Analysis cancelled")
+        if mime_type is None:
+            _, image_bytes, mime_type = prepare_image(image_bytes)
+        return analyze_image(image_bytes, mime_type, timings)
+    except Exception as e:
+        timings["error"] = str(e)
+        raise
+    finally:
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        try:
+            record_timings(timings)
+        except Exception:
+            logging.getLogger(__name__).exception("Could not record analysis timings")
+
+
+class AnalysisJob:
+    """A set of images being analyzed on the shared executor, polled by the UI for progress"""
+
+    def __init__(self, images):
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self.submitted_at = time.perf_counter()
+        self.latency_ms = {}
+        self.futures = [(name, _executor.submit(_analyze_item, image_bytes, mime_type, self.submitted_at,
+                                                self.cancelled))
+                        for name, image_bytes, mime_type in images]
+        for name, future in self.futures:
+            future.add_done_callback(functools.partial(self._finished, name))
+
+    def _finished(self, name, future):
+        self.latency_ms[name] = (time.perf_counter() - self.submitted_at) * 1000
+
+    @property
+    def total(self):
+        return len(self.futures)
+
+    @property
+    def completed(self):
+        return sum(future.done() for _, future in self.futures)
+
+    def done(self):
+        return self.completed == self.total
+
+    def timed_out(self):
+        return not self.done() and time.monotonic() - self.started > ANALYSIS_TIMEOUT_SECONDS
+
+    def cancel(self):
+        """Drop queued requests and ignore any still in flight"""
+        self.cancelled.set()
+        for _, future in self.futures:
+            future.cancel()
+
+    def results(self):
+        """Return one record per image, in submission order, once the job is done"""
+        records = []
+        for name, future in self.futures:
+            record = {"image": name, "result": None, "error": None, "latency_ms": self.latency_ms.get(name)}
+            if future.cancelled():
+                record["error"] = "Analysis cancelled"
+            else:
+                try:
+                    record["result"] = future.result(timeout=0)
+                except Exception as e:
+                    record["error"] = str(e)
+            records.append(record)
+        return records
+
+
+def analyze_upload(image_bytes, mime_type=None, timeout=ANALYSIS_TIMEOUT_SECONDS):
+    """Analyze one uploaded photo on the shared executor, waiting at most ``timeout`` seconds
+
+    A mime_type of None marks raw bytes that still need prepare_image.
+    """
+    future = _executor.submit(_analyze_item, image_bytes, mime_type, time.perf_counter())
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        raise AnalysisError("The analysis took too long to complete. Please try again.")
+
+
+def analyze_batch(images, max_workers=BATCH_MAX_WORKERS):
+    """Analyze many images concurrently, yielding one record per image as it completes
+
+    ``images`` is an iterable of ``(name, image_bytes, mime_type)`` tuples; a
+    mime_type of None marks raw bytes that still need prepare_image. At most
+    twice ``max_workers`` items are pulled from the iterable at a time, so a
+    lazy generator keeps memory bounded for large batches.
+    """
+    items = iter(images)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="defect-analysis") as pool:
+        pending = {}
+
+        def submit(count):
+            for name, image_bytes, mime_type in itertools.islice(items, count):
+                submitted_at = time.perf_counter()
+                pending[pool.submit(_analyze_item, image_bytes, mime_type, submitted_at)] = (name, submitted_at)
+
+        submit(max_workers * 2)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = pending.pop(future)
+                record = {"image": name, "result": None, "error": None}
+                try:
+                    record["result"] = future.result()
+                except Exception as e:
+                    record["error"] = str(e)
+                record["seconds"] = round(time.perf_counter() - started, 3)
+                submit(1)
+                yield record
+
+
+def merge_defect_reports(reports):
+    """Combine per-photo analyses of one device into a single DefectResult"""
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+
+    defective = [report for report in reports if report.defect_detected]
+    if not defective:
+        return DefectResult(False, images_analyzed=len(reports))
+
+    defect_types, components = [], []
+    for report in defective:
+        if report.defect_type not in defect_types:
+            defect_types.append(report.defect_type)
+        components += [component for component in report.affected_components if component not in components]
+    return DefectResult(True, "; ".join(defect_types),
+                        max((report.severity for report in defective), key=SEVERITY_LEVELS.index),
+                        tuple(components), len(reports))
+
+
+def iter_image_files(paths):
+    """Expand files and directories into a sorted stream of image file paths"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for filename in sorted(files):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, filename)
+        else:
+            yield path
@@ -0,0 +1,140 @@
+import io
+import json
+import os
+import time
+
+import database
+import defect_analysis
+import defect_result
+
+# Thumbnails are small JPEGs kept so technicians can see the photo without the original upload
+THUMBNAIL_EDGE = int(os.getenv("THUMBNAIL_EDGE", 160))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 60))
+DEVICE_HISTORY_LIMIT = int(os.getenv("DEVICE_HISTORY_LIMIT", 10))
+
+REPORT_COLUMNS = ['id', 'appointment_id', 'service_tag', 'created_at', 'model', 'model_version', 'defect_detected',
+                  'defect_type', 'severity', 'affected_components', 'images_analyzed', 'latency_ms']
+
+
+def make_thumbnail(image):
+    """Encode a small JPEG preview of a decoded image"""
+    from PIL import Image
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_EDGE, THUMBNAIL_EDGE), Image.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def save_report(report, images):
+    """Persist a finished analysis, a DefectResult, and return the new report id
+
+    ``images`` holds one ``(image, image_bytes, result, error, latency_ms)``
+    tuple per photo in the order analyzed: the decoded image (or None to skip
+    its thumbnail), the prepared bytes sent for inference and that photo's own
+    DefectResult or error. The report's latency is that of its slowest photo.
+    """
+    now = time.time()
+    latencies = [latency_ms for *_, latency_ms in images if latency_ms is not None]
+    # Encode thumbnails before taking the write lock
+    rows = [(defect_analysis.image_digest(image_bytes), image, result, error, latency_ms)
+            for image, image_bytes, result, error, latency_ms in images]
+    thumbnails = [(image_hash, make_thumbnail(image), now) for image_hash, image, *_ in rows if image is not None]
+
+    with database.connection() as conn:
+        report_id = conn.execute('''INSERT INTO defect_reports
+                                    (created_at, model, model_version, defect_detected, defect_type, severity,
+                                     affected_components, images_analyzed, latency_ms)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                 (now, defect_analysis.ANALYSIS_MODEL, defect_analysis.ANALYSIS_MODEL_VERSION,
+                                  int(report.defect_detected), report.defect_type, report.severity,
+                                  json.dumps(list(report.affected_components)), report.images_analyzed,
+                                  max(latencies) if latencies else None)).lastrowid
+        conn.executemany("INSERT INTO defect_report_components (component, report_id) VALUES (?, ?)",
+                         [(component, report_id) for component in report.affected_components])
+        conn.executemany('''INSERT INTO defect_report_images
+                            (report_id, position, image_hash, model_version, result, error, latency_ms)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         [(report_id, position, image_hash, defect_analysis.ANALYSIS_MODEL_VERSION,
+                           json.dumps(result.to_dict()) if result is not None else None, error, latency_ms)
+                          for position, (image_hash, _, result, error, latency_ms) in enumerate(rows)])
+        conn.executemany("INSERT OR IGNORE INTO defect_thumbnails (image_hash, thumbnail, created_at) VALUES (?, ?, ?)",
+                         thumbnails)
+    return report_id
+
+
+def link_report(conn, report_id, appointment_id, service_tag):
+    """Attach a saved report to the appointment booked from it, inside the caller's transaction"""
+    conn.execute("UPDATE defect_reports SET appointment_id=?, service_tag=? WHERE id=?",
+                 (appointment_id, service_tag, report_id))
+
+
+def _report(row):
+    report = dict(zip(REPORT_COLUMNS, row))
+    report['defect_detected'] = bool(report['defect_detected'])
+    report['affected_components'] = json.loads(report['affected_components'] or "[]")
+    return report
+
+
+def search_reports(severity=None, component=None, service_tag=None, limit=50):
+    """Return the newest reports matching every given filter
+
+    Each filter is answered from an index: severity from
+    idx_defect_reports_severity, component from the primary key of
+    defect_report_components and service_tag from idx_defect_reports_service_tag.
+    """
+    columns = ", ".join(f"r.{column}" for column in REPORT_COLUMNS)
+    joins, clauses, params, order = "", [], [], "r.id"
+    if component:
+        joins = "JOIN defect_report_components c ON c.report_id = r.id AND c.component = ?"
+        params.append(" ".join(component.split()).lower())
+        # Same order, but lets SQLite walk the component's primary key range backwards instead of sorting
+        order = "c.report_id"
+    if severity:
+        clauses.append("r.severity = ?")
+        params.append(defect_result.normalize_severity(severity))
+    if service_tag:
+        clauses.append("r.service_tag = ?")
+        params.append(service_tag)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with database.connection() as conn:
+        rows = conn.execute(f"SELECT {columns} FROM defect_reports r {joins} {where} ORDER BY {order} DESC LIMIT ?",
+                            (*params, limit)).fetchall()
+    return [_report(row) for row in rows]
+
+
+def reports_for_devices(service_tags, limit=DEVICE_HISTORY_LIMIT):
+    """Return the newest reports of each device, keyed by service tag, in one query"""
+    service_tags = sorted(set(service_tags))
+    if not service_tags:
+        return {}
+    columns = ", ".join(REPORT_COLUMNS)
+    with database.connection() as conn:
+        rows = conn.execute(f'''SELECT {columns} FROM (
+                                    SELECT *, ROW_NUMBER() OVER (PARTITION BY service_tag ORDER BY id DESC) AS n
+                                    FROM defect_reports
+                                    WHERE service_tag IN ({", ".join("?" * len(service_tags))}))
+                                WHERE n <= ? ORDER BY id DESC''', (*service_tags, limit)).fetchall()
+    reports = {}
+    for row in rows:
+        report = _report(row)
+        reports.setdefault(report['service_tag'], []).append(report)
+    return reports
+
+
+def get_thumbnails(report_ids):
+    """Return each report's photo thumbnails in analysis order, keyed by report id"""
+    report_ids = list(report_ids)
+    if not report_ids:
+        return {}
+    with database.connection() as conn:
+        rows = conn.execute(f'''SELECT i.report_id, t.thumbnail
+                                FROM defect_report_images i
+                                JOIN defect_thumbnails t ON t.image_hash = i.image_hash
+                                WHERE i.report_id IN ({", ".join("?" * len(report_ids))})
+                                ORDER BY i.report_id, i.position''', report_ids).fetchall()
+    thumbnails = {}
+    for report_id, thumbnail in rows:
+        thumbnails.setdefault(report_id, []).append(thumbnail)
+    return thumbnails
@@ -0,0 +1,220 @@
+import ast
+import json
+import re
+from dataclasses import dataclass
+
+SEVERITY_LEVELS = ["Low", "Medium", "High"]
+FIELDS = ("defect_detected", "defect_type", "severity", "affected_components")
+YES_VALUES = ("yes", "y", "true", "1", "detected", "present")
+NO_VALUES = ("no", "n", "false", "0", "none", "not detected", "absent")
+SEVERITY_ALIASES = {"minor": "Low", "moderate": "Medium", "med": "Medium", "major": "High", "severe": "High",
+                    "critical": "High"}
+UNKNOWN_VALUES = ("", "unknown", "n/a", "not specified", "unspecified")
+NO_COMPONENTS = ("", "none", "n/a", "not specified", "unknown")
+# Keys models use instead of the ones the prompt asks for
+KEY_ALIASES = {"defect": "defect_detected", "detected": "defect_detected", "type": "defect_type",
+               "defect_severity": "severity", "components": "affected_components",
+               "likely_affected_components": "affected_components"}
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+@dataclass(frozen=True, slots=True)
+class DefectResult:
+    """One validated defect analysis
+
+    A photo without a defect has defect_type and severity "None" and no
+    components. Component names are lowercase and distinct.
+    """
+
+    defect_detected: bool
+    defect_type: str = "None"
+    severity: str = "None"
+    affected_components: tuple = ()
+    images_analyzed: int = 1
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a result from an answer or a stored result; raises IncompleteResult naming the invalid fields"""
+        values, missing = check(data)
+        if missing:
+            raise IncompleteResult(values, missing)
+        return cls(**values, images_analyzed=int(data.get("images_analyzed") or 1))
+
+    def to_dict(self):
+        return {"defect_detected": self.defect_detected, "defect_type": self.defect_type, "severity": self.severity,
+                "affected_components": list(self.affected_components), "images_analyzed": self.images_analyzed}
+
+
+class IncompleteResult(ValueError):
+    """Raised when an answer decodes but some fields are missing or invalid
+
+    ``values`` holds the fields that did validate, normalized; ``missing`` names the rest.
+    """
+
+    def __init__(self, values, missing):
+        super().__init__(f"The analysis is missing valid {', '.join(missing)}")
+        self.values = values
+        self.missing = missing
+
+
+def normalize_components(affected):
+    """Turn the model's affected_components (a list or a comma-separated string) into distinct lowercase names"""
+    if isinstance(affected, str):
+        affected = affected.split(",")
+    components = []
+    for component in affected or []:
+        name = " ".join(str(component).split()).lower()
+        if name not in NO_COMPONENTS and name not in components:
+            components.append(name)
+    return components
+
+
+def normalize_severity(severity):
+    """Map a severity such as "high", "Severe" or "moderate" onto SEVERITY_LEVELS, or "Unknown" when it is none"""
+    name = str(severity or "").strip().lower()
+    level = SEVERITY_ALIASES.get(name, name.capitalize())
+    return level if level in SEVERITY_LEVELS else "Unknown"
+
+
+def is_defect(value):
+    if isinstance(value, str):
+        return value.strip().lower() in YES_VALUES
+    return bool(value)
+
+
+def _detected(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    name = str(value or "").strip().lower()
+    if name in YES_VALUES:
+        return True
+    if name in NO_VALUES:
+        return False
+    raise ValueError
+
+
+def normalize_keys(data):
+    """Spell an answer's keys the way the prompt asks for them, e.g. "Defect Type" as defect_type"""
+    keys = (re.sub(r"[\s-]+", "_", str(key).strip().lower()) for key in data)
+    return {KEY_ALIASES.get(key, key): value for key, value in zip(keys, data.values())}
+
+
+def check(data):
+    """Validate and normalize an answer's fields; return ``(values, missing)``
+
+    Fields that only apply to a defect are filled in as "None" when there is
+    none. A defect's type must be named, its severity must be one of
+    SEVERITY_LEVELS and its components must be a list or a string; an
+    explicitly empty component list is accepted.
+    """
+    data = normalize_keys(data)
+    values, missing = {}, []
+    try:
+        values["defect_detected"] = _detected(data["defect_detected"])
+    except (KeyError, ValueError):
+        missing.append("defect_detected")
+    if values.get("defect_detected") is False:
+        values.update(defect_type="None", severity="None", affected_components=())
+        return values, missing
+
+    defect_type = data.get("defect_type")
+    if isinstance(defect_type, str) and defect_type.strip().lower() not in UNKNOWN_VALUES + ("none",):
+        values["defect_type"] = " ".join(defect_type.split())
+    else:
+        missing.append("defect_type")
+    severity = normalize_severity(data.get("severity"))
+    if severity != "Unknown":
+        values["severity"] = severity
+    else:
+        missing.append("severity")
+    components = data.get("affected_components")
+    if isinstance(components, (list, tuple, str)):
+        values["affected_components"] = tuple(normalize_components(components))
+    else:
+        missing.append("affected_components")
+    return values, missing
+
+
+def _close_truncated(text):
+    """Close the strings, arrays and objects left open by an answer cut off at max_tokens
+
+    Returns the closed text and whether its last field is certainly whole,
+    which is only known when the answer was cut off after the next key.
+    """
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    # A key whose value never arrived, or a trailing comma, cannot be completed, so drop it
+    dangling = re.search(r'(,?\s*"[^"]*"\s*:|,)\s*$', text)
+    if dangling:
+        text = text[:dangling.start()]
+    return text + "".join(reversed(stack)), bool(dangling and dangling.group(1).endswith(":"))
+
+
+def decode(content):
+    """Recover the JSON object in a model answer; return ``(data, repaired)``
+
+    Plain JSON takes the fast path through json.loads. Anything else is
+    repaired: code fences and surrounding prose are cut away, trailing commas
+    dropped, Python-style literals and single quotes accepted, and an answer
+    truncated mid-object is closed without its last, possibly partial, field.
+    Raises ValueError when no object can be recovered.
+    """
+    try:
+        data = json.loads(content)
+        if isinstance(data, dict):
+            return data, False
+    except (TypeError, ValueError):
+        pass
+
+    text = str(content or "").replace("“", '"').replace("”", '"')
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("The answer holds no JSON object")
+    end = text.rfind("}")
+    candidates = [(text[start:end + 1], True)] if end > start else []
+    candidates.append(_close_truncated(text[start:]))
+    # Cut off inside a key, the closed object does not parse; without the partial key, the field before it is whole
+    candidates.append((_close_truncated(re.sub(r',\s*"[^"]*"?$', "", text[start:]))[0], True))
+    for candidate, whole in candidates:
+        candidate = _TRAILING_COMMA.sub(r"\1", candidate)
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            try:
+                data = ast.literal_eval(re.sub(r"\btrue\b", "True",
+                                               re.sub(r"\bfalse\b", "False", re.sub(r"\bnull\b", "None", candidate))))
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                continue
+        if isinstance(data, dict):
+            if not whole and data:
+                # The value being written when the answer was cut off may itself be cut short
+                data.pop(list(data)[-1])
+            return data, True
+    raise ValueError("The answer is not a readable JSON object")
+
+
+def reask_prompt(missing):
+    """Ask only for the fields an earlier answer left out or got wrong"""
+    hints = {"defect_detected": '"Yes" or "No"', "defect_type": "a short name for the defect",
+             "severity": " or ".join(f'"{level}"' for level in SEVERITY_LEVELS),
+             "affected_components": "a list of component names"}
+    wanted = ", ".join(f"{field} ({hints[field]})" for field in missing)
+    return (f"Your previous answer lacked valid values for: {wanted}. "
+            f"Respond in JSON format with only these keys: {', '.join(missing)}")
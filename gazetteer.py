@@ -0,0 +1,188 @@
+import re
+from collections import namedtuple
+
+Place = namedtuple("Place", "name state latitude longitude")
+
+# Indian cities with approximate city-centre coordinates and the leading digits of their PIN codes.
+# The first three digits of a PIN name its sorting district; longer prefixes split districts shared by
+# neighbouring cities. Alternative and former names follow the prefixes.
+PLACES = [
+    ("Delhi", "Delhi", 28.61, 77.21, ("110",), ("new delhi",)),
+    ("Mumbai", "Maharashtra", 19.08, 72.88, ("400",), ("bombay",)),
+    ("Thane", "Maharashtra", 19.22, 72.98, ("4006",), ()),
+    ("Navi Mumbai", "Maharashtra", 19.03, 73.03, ("4007",), ("vashi",)),
+    ("Pune", "Maharashtra", 18.52, 73.86, ("411", "412"), ("poona",)),
+    ("Nagpur", "Maharashtra", 21.15, 79.09, ("440", "441"), ()),
+    ("Nashik", "Maharashtra", 20.00, 73.79, ("422",), ("nasik",)),
+    ("Aurangabad", "Maharashtra", 19.88, 75.34, ("431",), ("chhatrapati sambhajinagar",)),
+    ("Kolhapur", "Maharashtra", 16.70, 74.24, ("416",), ()),
+    ("Solapur", "Maharashtra", 17.66, 75.91, ("413",), ("sholapur",)),
+    ("Amravati", "Maharashtra", 20.93, 77.75, ("444",), ()),
+    ("Bengaluru", "Karnataka", 12.97, 77.59, ("560", "562"), ("bangalore",)),
+    ("Mysuru", "Karnataka", 12.30, 76.64, ("570",), ("mysore",)),
+    ("Mangaluru", "Karnataka", 12.91, 74.86, ("575",), ("mangalore",)),
+    ("Hubballi", "Karnataka", 15.36, 75.12, ("580",), ("hubli", "dharwad")),
+    ("Belagavi", "Karnataka", 15.85, 74.50, ("590",), ("belgaum",)),
+    ("Davanagere", "Karnataka", 14.46, 75.92, ("5770",), ("davangere",)),
+    ("Shivamogga", "Karnataka", 13.93, 75.57, ("5772",), ("shimoga",)),
+    ("Kalaburagi", "Karnataka", 17.33, 76.83, ("585",), ("gulbarga",)),
+    ("Ballari", "Karnataka", 15.14, 76.92, ("583",), ("bellary",)),
+    ("Chennai", "Tamil Nadu", 13.08, 80.27, ("600",), ("madras",)),
+    ("Coimbatore", "Tamil Nadu", 11.02, 76.96, ("641",), ()),
+    ("Tiruppur", "Tamil Nadu", 11.11, 77.34, ("6416",), ("tirupur",)),
+    ("Madurai", "Tamil Nadu", 9.93, 78.12, ("625",), ()),
+    ("Tiruchirappalli", "Tamil Nadu", 10.79, 78.70, ("620",), ("trichy", "tiruchi")),
+    ("Salem", "Tamil Nadu", 11.66, 78.15, ("636",), ()),
+    ("Erode", "Tamil Nadu", 11.34, 77.72, ("638",), ()),
+    ("Tirunelveli", "Tamil Nadu", 8.71, 77.76, ("627",), ()),
+    ("Vellore", "Tamil Nadu", 12.92, 79.13, ("632",), ()),
+    ("Puducherry", "Puducherry", 11.94, 79.81, ("605",), ("pondicherry", "pondy")),
+    ("Hyderabad", "Telangana", 17.39, 78.49, ("500",), ("secunderabad", "cyberabad")),
+    ("Warangal", "Telangana", 17.97, 79.59, ("506",), ()),
+    ("Visakhapatnam", "Andhra Pradesh", 17.69, 83.22, ("530", "531"), ("vizag", "vishakhapatnam")),
+    ("Vijayawada", "Andhra Pradesh", 16.51, 80.65, ("520", "521"), ("bezawada",)),
+    ("Guntur", "Andhra Pradesh", 16.31, 80.44, ("522",), ()),
+    ("Nellore", "Andhra Pradesh", 14.44, 79.99, ("524",), ()),
+    ("Kurnool", "Andhra Pradesh", 15.83, 78.04, ("518",), ()),
+    ("Tirupati", "Andhra Pradesh", 13.63, 79.42, ("517",), ()),
+    ("Kakinada", "Andhra Pradesh", 16.99, 82.25, ("5330",), ()),
+    ("Rajahmundry", "Andhra Pradesh", 17.00, 81.80, ("5331",), ("rajamahendravaram",)),
+    ("Kochi", "Kerala", 9.93, 76.27, ("682", "683"), ("cochin", "ernakulam")),
+    ("Thiruvananthapuram", "Kerala", 8.52, 76.94, ("695",), ("trivandrum",)),
+    ("Kozhikode", "Kerala", 11.26, 75.78, ("673",), ("calicut",)),
+    ("Thrissur", "Kerala", 10.53, 76.21, ("680",), ("trichur",)),
+    ("Kolkata", "West Bengal", 22.57, 88.36, ("700",), ("calcutta", "howrah")),
+    ("Siliguri", "West Bengal", 26.73, 88.40, ("734",), ()),
+    ("Durgapur", "West Bengal", 23.52, 87.31, ("713",), ("asansol",)),
+    ("Ahmedabad", "Gujarat", 23.02, 72.57, ("380", "382"), ("amdavad",)),
+    ("Gandhinagar", "Gujarat", 23.22, 72.65, ("38201", "38202"), ()),
+    ("Surat", "Gujarat", 21.17, 72.83, ("394", "395"), ()),
+    ("Vadodara", "Gujarat", 22.31, 73.18, ("390", "391"), ("baroda",)),
+    ("Rajkot", "Gujarat", 22.30, 70.80, ("360",), ()),
+    ("Bhavnagar", "Gujarat", 21.76, 72.15, ("364",), ()),
+    ("Jamnagar", "Gujarat", 22.47, 70.06, ("361",), ()),
+    ("Anand", "Gujarat", 22.56, 72.95, ("388",), ()),
+    ("Jaipur", "Rajasthan", 26.91, 75.79, ("302", "303"), ()),
+    ("Jodhpur", "Rajasthan", 26.24, 73.02, ("342",), ()),
+    ("Udaipur", "Rajasthan", 24.59, 73.71, ("313",), ()),
+    ("Kota", "Rajasthan", 25.18, 75.83, ("324",), ()),
+    ("Ajmer", "Rajasthan", 26.45, 74.64, ("305",), ()),
+    ("Bikaner", "Rajasthan", 28.02, 73.31, ("334",), ()),
+    ("Lucknow", "Uttar Pradesh", 26.85, 80.95, ("226", "227"), ()),
+    ("Kanpur", "Uttar Pradesh", 26.45, 80.33, ("208", "209"), ("cawnpore",)),
+    ("Agra", "Uttar Pradesh", 27.18, 78.01, ("282", "283"), ()),
+    ("Varanasi", "Uttar Pradesh", 25.32, 82.97, ("221",), ("banaras", "benares", "kashi")),
+    ("Prayagraj", "Uttar Pradesh", 25.44, 81.85, ("211", "212"), ("allahabad",)),
+    ("Noida", "Uttar Pradesh", 28.54, 77.39, ("2013",), ("greater noida",)),
+    ("Ghaziabad", "Uttar Pradesh", 28.67, 77.45, ("2010", "2012"), ()),
+    ("Meerut", "Uttar Pradesh", 28.98, 77.71, ("250",), ()),
+    ("Bareilly", "Uttar Pradesh", 28.37, 79.43, ("243",), ()),
+    ("Aligarh", "Uttar Pradesh", 27.88, 78.08, ("202",), ()),
+    ("Moradabad", "Uttar Pradesh", 28.84, 78.77, ("244",), ()),
+    ("Gorakhpur", "Uttar Pradesh", 26.76, 83.37, ("273",), ()),
+    ("Jhansi", "Uttar Pradesh", 25.45, 78.57, ("284",), ()),
+    ("Gurugram", "Haryana", 28.46, 77.03, ("122",), ("gurgaon",)),
+    ("Faridabad", "Haryana", 28.41, 77.32, ("121",), ()),
+    ("Panipat", "Haryana", 29.39, 76.97, ("132",), ()),
+    ("Rohtak", "Haryana", 28.90, 76.61, ("124",), ()),
+    ("Hisar", "Haryana", 29.15, 75.72, ("125",), ("hissar",)),
+    ("Chandigarh", "Chandigarh", 30.73, 76.78, ("160",), ("mohali", "panchkula")),
+    ("Ludhiana", "Punjab", 30.90, 75.86, ("141",), ()),
+    ("Amritsar", "Punjab", 31.63, 74.87, ("143",), ()),
+    ("Jalandhar", "Punjab", 31.33, 75.58, ("144",), ("jullundur",)),
+    ("Patiala", "Punjab", 30.34, 76.39, ("147",), ()),
+    ("Dehradun", "Uttarakhand", 30.32, 78.03, ("248",), ()),
+    ("Haridwar", "Uttarakhand", 29.95, 78.16, ("249",), ()),
+    ("Shimla", "Himachal Pradesh", 31.10, 77.17, ("171",), ("simla",)),
+    ("Jammu", "Jammu and Kashmir", 32.73, 74.86, ("180", "181"), ()),
+    ("Srinagar", "Jammu and Kashmir", 34.08, 74.80, ("190", "191"), ()),
+    ("Indore", "Madhya Pradesh", 22.72, 75.86, ("452", "453"), ()),
+    ("Bhopal", "Madhya Pradesh", 23.26, 77.41, ("462", "463"), ()),
+    ("Gwalior", "Madhya Pradesh", 26.22, 78.18, ("474",), ()),
+    ("Jabalpur", "Madhya Pradesh", 23.18, 79.99, ("482",), ("jubbulpore",)),
+    ("Ujjain", "Madhya Pradesh", 23.18, 75.78, ("456",), ()),
+    ("Raipur", "Chhattisgarh", 21.25, 81.63, ("492", "493"), ()),
+    ("Bilaspur", "Chhattisgarh", 22.08, 82.14, ("495",), ()),
+    ("Patna", "Bihar", 25.59, 85.14, ("800", "801"), ()),
+    ("Gaya", "Bihar", 24.79, 85.00, ("823",), ()),
+    ("Muzaffarpur", "Bihar", 26.12, 85.39, ("842",), ()),
+    ("Ranchi", "Jharkhand", 23.34, 85.31, ("834", "835"), ()),
+    ("Jamshedpur", "Jharkhand", 22.80, 86.20, ("831",), ()),
+    ("Dhanbad", "Jharkhand", 23.80, 86.43, ("826",), ()),
+    ("Bhubaneswar", "Odisha", 20.30, 85.82, ("751", "752"), ()),
+    ("Cuttack", "Odisha", 20.46, 85.88, ("753",), ()),
+    ("Guwahati", "Assam", 26.14, 91.74, ("781",), ("gauhati",)),
+    ("Shillong", "Meghalaya", 25.58, 91.89, ("793",), ()),
+    ("Imphal", "Manipur", 24.82, 93.94, ("795",), ()),
+    ("Agartala", "Tripura", 23.83, 91.28, ("799",), ()),
+    ("Aizawl", "Mizoram", 23.73, 92.72, ("796",), ()),
+    ("Kohima", "Nagaland", 25.67, 94.11, ("797",), ()),
+    ("Itanagar", "Arunachal Pradesh", 27.08, 93.61, ("791",), ()),
+    ("Gangtok", "Sikkim", 27.33, 88.61, ("737",), ()),
+    ("Panaji", "Goa", 15.49, 73.83, ("403",), ("panjim", "goa")),
+    ("Margao", "Goa", 15.28, 73.96, ("4036",), ("madgaon",)),
+    ("Port Blair", "Andaman and Nicobar Islands", 11.62, 92.73, ("744",), ("sri vijaya puram",)),
+]
+
+_PIN = re.compile(r"(?<!\d)([1-9]\d{2})\s?(\d{3})(?!\d)")
+
+
+def _name_key(text):
+    return " ".join(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+_by_name = {}
+_by_prefix = {}
+for _name, _state, _latitude, _longitude, _prefixes, _aliases in PLACES:
+    _place = Place(_name, _state, _latitude, _longitude)
+    for _alias in (_name, *_aliases):
+        _by_name[_name_key(_alias)] = _place
+    for _prefix in _prefixes:
+        _by_prefix[_prefix] = _place
+_PREFIX_LENGTHS = sorted({len(prefix) for prefix in _by_prefix}, reverse=True)
+_MAX_NAME_WORDS = max(len(key.split()) for key in _by_name)
+
+
+def find_pin(text):
+    """Return the first six-digit PIN code in a text, or None; "560 001" is returned as 560001"""
+    match = _PIN.search(str(text or ""))
+    return match.group(1) + match.group(2) if match else None
+
+
+def place_for_pin(pin):
+    """Return the place whose longest PIN prefix matches, or None"""
+    for length in _PREFIX_LENGTHS:
+        place = _by_prefix.get(pin[:length])
+        if place:
+            return place
+    return None
+
+
+def find_place(text):
+    """Return the place named in a text, preferring the last and then the longest name, or None
+
+    Addresses run from the street to the city, so the last name found is
+    the most general one and the least likely to be a street or area
+    named after another city.
+    """
+    words = _name_key(text).split()
+    for end in range(len(words), 0, -1):
+        for start in range(max(end - _MAX_NAME_WORDS, 0), end):
+            place = _by_name.get(" ".join(words[start:end]))
+            if place:
+                return place
+    return None
+
+
+def geocode(text):
+    """Locate a city name, PIN code or address; return ``(place, method)`` or ``(None, None)``
+
+    A PIN is trusted over place names, and method says which one matched:
+    "pin" or "name".
+    """
+    pin = find_pin(text)
+    place = place_for_pin(pin) if pin else None
+    if place:
+        return place, "pin"
+    place = find_place(text)
+    return (place, "name") if place else (None, None)
@@ -0,0 +1,120 @@
+import heapq
+import math
+import os
+
+EARTH_RADIUS_KM = 6371.0
+# Cells of a twentieth of a degree are about 5.5 km high, so even a busy city spreads over dozens of them
+GRID_CELL_DEGREES = float(os.getenv("GRID_CELL_DEGREES", 0.05))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """Points bucketed into square cells of latitude and longitude for nearest-neighbour queries
+
+    nearest() scans rings of cells outward from the query's cell and stops
+    as soon as no unscanned cell can hold a point closer than the k-th best
+    found, so a query only looks at the points around it. Points may be
+    added and removed at any time; longitudes are not wrapped at the
+    antimeridian.
+    """
+
+    def __init__(self, cell_degrees=GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.points = {}
+        # Bounds of every cell ever used; removals leave them wide, which only costs a ring or two
+        self.rows = self.cols = None
+        self.max_abs_latitude = 0.0
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def insert(self, key, latitude, longitude):
+        """Add a point, moving it if the key is already indexed"""
+        self.remove(key)
+        cell = self._cell(latitude, longitude)
+        self.cells.setdefault(cell, {})[key] = (latitude, longitude)
+        self.points[key] = cell
+        row, col = cell
+        self.rows = (min(self.rows[0], row), max(self.rows[1], row)) if self.rows else (row, row)
+        self.cols = (min(self.cols[0], col), max(self.cols[1], col)) if self.cols else (col, col)
+        self.max_abs_latitude = max(self.max_abs_latitude, abs(latitude))
+
+    def remove(self, key):
+        cell = self.points.pop(key, None)
+        if cell is not None:
+            bucket = self.cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self.cells[cell]
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    def _reach_km(self, latitude, longitude, row, col, ring):
+        """Lower bound on the distance from the query to any point outside the rings scanned so far"""
+        size = self.cell_degrees
+        dlat = min(latitude - (row - ring) * size, (row + ring + 1) * size - latitude)
+        dlon = min(longitude - (col - ring) * size, (col + ring + 1) * size - longitude)
+        # Meridians converge, so a longitude gap is shortest at the highest latitude either point can have
+        cos_max = math.cos(math.radians(min(max(abs(latitude), self.max_abs_latitude), 90.0)))
+        along_parallel = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_max * math.sin(math.radians(dlon) / 2)))
+        return min(EARTH_RADIUS_KM * math.radians(dlat), along_parallel)
+
+    def nearest(self, latitude, longitude, k=1, max_km=None):
+        """Return up to ``k`` ``(distance_km, key)`` pairs nearest to a point, closest first
+
+        Points farther than ``max_km`` are left out.
+        """
+        if not self.points or k <= 0:
+            return []
+        row, col = self._cell(latitude, longitude)
+        last_ring = max(row - self.rows[0], self.rows[1] - row, col - self.cols[0], self.cols[1] - col, 0)
+        best = []
+
+        def consider(bucket):
+            for key, (lat, lon) in bucket.items():
+                distance = haversine_km(latitude, longitude, lat, lon)
+                if max_km is not None and distance > max_km:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, key))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, key))
+
+        for ring in range(last_ring + 1):
+            if 8 * ring > len(self.cells):
+                # The ring has more cells than the whole index, so check the occupied cells not yet scanned
+                for (r, c), bucket in self.cells.items():
+                    if max(abs(r - row), abs(c - col)) >= ring:
+                        consider(bucket)
+                break
+            for cell in self._ring(row, col, ring):
+                bucket = self.cells.get(cell)
+                if bucket:
+                    consider(bucket)
+            reach = self._reach_km(latitude, longitude, row, col, ring)
+            if (len(best) == k and -best[0][0] <= reach) or (max_km is not None and reach > max_km):
+                break
+        return sorted((-distance, key) for distance, key in best)
+
+    def stats(self):
+        return {"points": len(self.points), "cells": len(self.cells), "cell_degrees": self.cell_degrees}
@@ -1,333 +1,171 @@
 import streamlit as st
-import requests
-from groq import Groq
-from PIL import Image
 import sqlite3
-import io
-import base64
-import time
-import json
 import os
+import logging
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import pandas as pd
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import re
+import uuid
+import hashlib
+import io
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Groq client
-try:
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-except Exception as e:
-    st.error(f"Failed to initialize Groq client: {str(e)}")
-    st.stop()
-
-# Initialize SQLite database
-def init_db():
-    conn = sqlite3.connect('hardware_support.db')
-    c = conn.cursor()
-    
-    # Create Customers table
-    c.execute('''CREATE TABLE IF NOT EXISTS customers
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  service_tag TEXT UNIQUE,
-                  customer_name TEXT,
-                  customer_email TEXT,
-                  customer_phone TEXT,
-                  customer_address TEXT,
-                  laptop_model TEXT,
-                  purchase_date TEXT,
-                  warranty_end_date TEXT,
-                  warranty_valid INTEGER)''')
-    
-    # Create Service Technicians table
-    c.execute('''CREATE TABLE IF NOT EXISTS technicians
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT,
-                  email TEXT,
-                  phone TEXT,
-                  specialization TEXT,
-                  location TEXT,
-                  rating REAL,
-                  available INTEGER,
-                  password TEXT)''')
-    
-    # Create Appointments table
-    c.execute('''CREATE TABLE IF NOT EXISTS appointments
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  customer_id INTEGER,
-                  technician_id INTEGER,
-                  service_tag TEXT,
-                  issue_description TEXT,
-                  appointment_date TEXT,
-                  appointment_time TEXT,
-                  status TEXT,
-                  FOREIGN KEY (customer_id) REFERENCES customers (id),
-                  FOREIGN KEY (technician_id) REFERENCES technicians (id))''')
-    
-    # Insert sample data if tables are empty
-    if c.execute("SELECT COUNT(*) FROM customers").fetchone()[0] == 0:
-        sample_customers = [
-            ("ABC123", "John Doe", "vaishnavi.m@ubtiinc.com", "555-1001", "123 Main St, New York", 
-             "Dell XPS 15", "2023-01-15", "2025-12-31", 1),
-            ("XYZ789", "Jane Smith", "vaishnavi.m@ubtiinc.com", "555-1002", "456 Oak Ave, Chicago", 
-             "HP Spectre x360", "2022-06-30", "2023-06-30", 0),
-            ("DEF456", "Mike Johnson", "vaishnavi.m@ubtiinc.com", "555-1003", "789 Pine Rd, Los Angeles", 
-             "Lenovo ThinkPad X1", "2024-02-20", "2026-02-20", 1)
-        ]
-        c.executemany('''INSERT INTO customers 
-                         (service_tag, customer_name, customer_email, customer_phone, 
-                          customer_address, laptop_model, purchase_date, warranty_end_date, warranty_valid)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', sample_customers)
-    
-    if c.execute("SELECT COUNT(*) FROM technicians").fetchone()[0] == 0:
-        sample_technicians = [
-            ("Alex Chen", "vaishnavi.m@ubtiinc.com", "555-2001", "Dell", "Downtown", 4.8, 1, "tech123"),
-            ("Sarah Williams", "vaishnavi.m@ubtiinc.com", "555-2002", "HP", "Midtown", 4.6, 1, "tech123"),
-            ("David Kim", "vaishnavi.m@ubtiinc.com", "555-2003", "Lenovo", "Uptown", 4.9, 1, "tech123"),
-            ("Priya Patel", "vaishnavi.m@ubtiinc.com", "555-2004", "Dell", "Suburb", 4.7, 1, "tech123"),
-            ("James Wilson", "vaishnavi.m@ubtiinc.com", "555-2005", "HP", "City Center", 4.5, 1, "tech123")
-        ]
-        c.executemany('''INSERT INTO technicians 
-                         (name, email, phone, specialization, location, rating, available, password)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', sample_technicians)
-    
-    conn.commit()
-    conn.close()
-
-# Initialize the database
-init_db()
-
-# Email functions
-def send_email(to_email, subject, body):
-    """Send email using SMTP"""
-    try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", 587))
-        sender_email = os.getenv("SMTP_USER")
-        sender_password = os.getenv("SMTP_PASSWORD")
-        
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        html = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif;">
-                <div style="background-color: #f5f5f5; padding: 20px;">
-                    <div style="background-color: white; border-radius: 5px; padding: 20px; max-width: 600px; margin: 0 auto;">
-                        <h2 style="color: #4a6fa5;">Hardware Support Notification</h2>
-                        <div style="margin: 15px 0;">
-                            {body}
-                        </div>
-                        <p style="color: #666; font-size: 12px;">
-                            This is an automated message. Please do not reply directly.
-                        </p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(html, 'html'))
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()  # Upgrade the connection to a secure encrypted SSL/TLS connection
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-        return True
-    except Exception as e:
-        st.error(f"Failed to send email: {str(e)}")
-        print(f"Error: {str(e)}")  # Print the error for debugging
-        return False
+# Local modules read their settings from the environment at import time
+import service_centers
+import defect_analysis
+import defect_reports
+import warranty
+import admin_tables
+import bulk_io
+import scheduling
+import technician_schedule
+import catalog
+import readcache
+import service_tags
+import service
+from service import (get_customer_by_service_tag, update_customer_address, add_customer, delete_customer,
+                     authenticate_technician, add_technician, find_appointment_slots, schedule_appointment,
+                     update_appointment_status, update_appointment_statuses, get_warranty_renewal_info,
+                     get_technician_schedule, get_device_defect_reports, get_defect_report_thumbnails,
+                     search_defect_reports)
 
+# Prepare the database and background workers; this runs once per process, not on every rerun.
+# Heavy dependencies (pandas, PIL, the Groq client) are loaded by the pages that use them.
+service.bootstrap()
 
 # Web scraping functions
-# Function to extract phone numbers from text
-def extract_phone(snippet):
-    # Implement your phone extraction logic here
-    return "Phone number"
-
 def scrape_service_centers(brand, location):
-    """Scrape service centers using Serper API"""
+    """Find the nearest service centers from the local directory, searching Serper when it knows none"""
     try:
-        api_key = os.getenv("SERPER_API_KEY")
-        if not api_key:
-            st.error("API key for Serper is not set.")
-            return []
-        
-        headers = {
-            'X-API-KEY': api_key,
-            'Content-Type': 'application/json'
-        }
-        data = {
-            'q': f'{brand} authorized service centers in {location}, India',
-            'gl': 'in',  # Set geolocation to India
-            'hl': 'en'
-        }
-        
-        response = requests.post(
-            'https://google.serper.dev/search',
-            headers=headers,
-            json=data
-        )
-        
-        if response.status_code != 200:
-            st.error(f"Failed to fetch data from the API. Status code: {response.status_code}")
-            return []
-        
-        results = response.json().get('organic', [])
-        service_centers = []
-        
-        for result in results:
-            address = result.get('snippet', '').split('·')[0].strip()
-            # Check if the location is in the address
-            if location.lower() in address.lower():
-                service_centers.append({
-                    'name': result.get('title', ''),
-                    'address': address,
-                    'phone': extract_phone(result.get('snippet', '')),
-                    'link': result.get('link', '')
-                })
-        
-        # Limit to the first 3 results
-        return service_centers[:3]
+        return service.find_service_centers(brand, location)
+    except service_centers.ServiceCenterLookupError as e:
+        st.error(str(e))
+        return []
     except Exception as e:
         st.error(f"Scraping failed: {str(e)}")
         return []
 
 # Core application functions
-def analyze_image_for_defects(image_bytes):
-    """Analyze the uploaded image for hardware defects using LLaMA Vision"""
-    try:
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": """Analyze this image of a computer/laptop hardware component. 
-                        Identify any visible defects such as cracks, burns, liquid damage, or other physical issues.
-                        Provide a concise report with:
-                        1. Defect detected (Yes/No)
-                        2. Type of defect if present
-                        3. Severity (Low/Medium/High)
-                        4. Likely affected components
-                        Respond in JSON format with these keys: defect_detected, defect_type, severity, affected_components"""
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ]
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=messages,
-            temperature=0.3,
-            max_tokens=1024,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(completion.choices[0].message.content)
-    except Exception as e:
-        st.error(f"Error analyzing image: {str(e)}")
-        return None
-        
-def get_customer_by_service_tag(service_tag):
-    """Retrieve customer details from database using service tag"""
-    conn = sqlite3.connect('hardware_support.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM customers WHERE service_tag=?", (service_tag,))
-    customer = c.fetchone()
-    conn.close()
-    
-    if customer:
-        columns = ['id', 'service_tag', 'customer_name', 'customer_email', 'customer_phone', 
-                  'customer_address', 'laptop_model', 'purchase_date', 'warranty_end_date', 'warranty_valid']
-        return dict(zip(columns, customer))
-    return None
+def start_defect_analysis(prepared_images):
+    """Queue analysis of the prepared photos off the script thread, replacing any running job"""
+    cancel_defect_analysis()
+    st.session_state.analysis_errors = []
+    st.session_state.defect_report_id = None
+    st.session_state.analysis_images = prepared_images
+    st.session_state.analysis_job = defect_analysis.AnalysisJob(
+        (index, image_bytes, mime_type) for index, (_, image_bytes, mime_type) in enumerate(prepared_images)
+    )
 
-def get_available_technicians(brand):
-    """Get available technicians specializing in the given brand"""
-    conn = sqlite3.connect('hardware_support.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM technicians WHERE specialization=? AND available=1", (brand,))
-    technicians = c.fetchall()
-    conn.close()
+def cancel_defect_analysis():
+    """Stop waiting for the current analysis job, if any"""
+    job = st.session_state.get('analysis_job')
+    if job is not None:
+        job.cancel()
+        st.session_state.analysis_job = None
+
+def collect_defect_analysis(job):
+    """Turn a finished job into one saved defect report plus a list of per-image errors"""
+    records = job.results()
+    reports, errors = [], []
+    for record in records:
+        if record["error"]:
+            prefix = "Error analyzing image" if job.total == 1 else f"Error analyzing image {record['image'] + 1}"
+            errors.append(f"{prefix}: {record['error']}")
+        else:
+            reports.append(record["result"])
     
-    if technicians:
-        columns = ['id', 'name', 'email', 'phone', 'specialization', 'location', 'rating', 'available', 'password']
-        return [dict(zip(columns, tech)) for tech in technicians]
-    return []
+    report = (reports[0] if reports else None) if job.total == 1 else defect_analysis.merge_defect_reports(reports)
+    if report:
+        # Keep the analysis beyond this session so technicians see it without running inference again
+        images = st.session_state.analysis_images
+        try:
+            st.session_state.defect_report_id = service.save_defect_report(
+                report, [(images[record['image']][0], images[record['image']][1], record['result'], record['error'],
+                          record['latency_ms']) for record in records]
+            )
+        except Exception:
+            logging.getLogger(__name__).exception("Could not save the defect report")
+    return report, errors
 
-def schedule_appointment(customer_id, technician_id, service_tag, issue_description, appointment_datetime):
-    """Schedule an appointment in the database"""
-    conn = sqlite3.connect('hardware_support.db')
-    c = conn.cursor()
+@st.fragment(run_every=0.5)
+def show_analysis_progress():
+    """Poll the running analysis job so the rest of the page stays responsive"""
+    job = st.session_state.get('analysis_job')
+    if job is None:
+        return
+    
+    if job.timed_out():
+        cancel_defect_analysis()
+        st.session_state.analysis_errors = ["The analysis took too long to complete. Please try again."]
+        st.rerun()
     
-    appointment_date = appointment_datetime.strftime("%Y-%m-%d")
-    appointment_time = appointment_datetime.strftime("%H:%M")
+    if not job.done():
+        st.progress(job.completed / job.total,
+                    text=f"Analyzing image for defects... ({job.completed}/{job.total} done)")
+        if st.button("Cancel Analysis", key="cancel_analysis_btn"):
+            cancel_defect_analysis()
+            st.rerun()
+        return
     
-    c.execute('''INSERT INTO appointments 
-                 (customer_id, technician_id, service_tag, issue_description, 
-                  appointment_date, appointment_time, status)
-                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
-              (customer_id, technician_id, service_tag, issue_description, 
-               appointment_date, appointment_time, "Scheduled"))
+    st.session_state.analysis_job = None
+    st.session_state.defect_analysis, st.session_state.analysis_errors = collect_defect_analysis(job)
+    st.rerun()
+        
+def show_admin_table(key, table, filters, sort_options):
+    """Render one page of an admin table with sort and previous/next controls"""
+    import pandas as pd
+    sort_col, order_col = st.columns([3, 1])
+    sort = sort_col.selectbox("Sort by", sort_options, key=f"{key}_sort")
+    descending = order_col.checkbox("Descending", key=f"{key}_desc")
     
-    conn.commit()
-    appointment_id = c.lastrowid
-    conn.close()
+    # Start again from the first page whenever the filter or sort order changes
+    view = (tuple(sorted(filters.items())), sort, descending)
+    if st.session_state.get(f"{key}_view") != view:
+        st.session_state[f"{key}_view"] = view
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
     
-    return appointment_id
+    columns, rows, next_cursor = admin_tables.fetch_page(table, filters, sort, descending, cursors[-1])
+    total = admin_tables.count_rows(table, filters)
+    st.dataframe(pd.DataFrame(rows, columns=columns))
+    
+    pages = max(1, -(-total // admin_tables.ADMIN_PAGE_SIZE))
+    prev_col, info_col, next_col = st.columns([1, 3, 1])
+    if prev_col.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    info_col.caption(f"Page {len(cursors)} of {pages} · {total} matching rows")
+    if next_col.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+    
+    # Exports run only when clicked, on a separate thread, over every matching row
+    csv_col, parquet_col, _ = st.columns([1, 1, 3])
+    for column, fmt in ((csv_col, "csv"), (parquet_col, "parquet")):
+        column.download_button(f"Export {fmt.upper()}", key=f"{key}_export_{fmt}", file_name=f"{table}.{fmt}",
+                               data=lambda fmt=fmt: service.export_records(table, fmt, filters, sort, descending),
+                               mime="text/csv" if fmt == "csv" else "application/octet-stream", on_click="ignore")
 
-def get_warranty_renewal_info(brand):
-    """Get warranty renewal information for a specific brand"""
-    renewal_info = {
-        "Dell": {
-            "steps": [
-                "Visit Dell's warranty extension website",
-                "Enter your service tag to check eligibility",
-                "Select your preferred extension period (1-3 years)",
-                "Make payment online",
-                "Receive confirmation email with updated warranty details"
-            ],
-            "link": "https://www.dell.com/support/contractservices/en-in",
-            "pricing": "Starting at $99/year for basic coverage"
-        },
-        "HP": {
-            "steps": [
-                "Go to HP Care Pack purchase page",
-                "Enter your product number or select your model",
-                "Choose your Care Pack option",
-                "Complete the purchase",
-                "Your warranty will be automatically updated"
-            ],
-            "link": "https://www.hp.com/in-en/shop/carepack/warranty.html",
-            "pricing": "Starting at $129/year for basic coverage"
-        },
-        "Lenovo": {
-            "steps": [
-                "Visit Lenovo's warranty upgrade site",
-                "Enter your serial number",
-                "Select your upgrade options",
-                "Proceed to checkout",
-                "Your warranty status will update within 24 hours"
-            ],
-            "link": "https://pcsupport.lenovo.com/in/en/warranty-lookup#/",
-            "pricing": "Starting at $89/year for basic coverage"
-        }
-    }
-    return renewal_info.get(brand, {})
+def show_bulk_import(table, columns_help):
+    """Upload a CSV or Parquet file and upsert its rows into a table, showing the rejects"""
+    with st.expander(f"Bulk Import {table.title()}"):
+        st.caption(columns_help)
+        upload = st.file_uploader("CSV or Parquet file", type=list(bulk_io.FORMATS), key=f"{table}_import_file")
+        if upload and st.button("Import", key=f"{table}_import_btn"):
+            rejects = io.StringIO()
+            try:
+                with st.spinner("Importing..."):
+                    summary = service.import_records(table, upload, upload.name.rsplit(".", 1)[-1].lower(), rejects)
+            except bulk_io.ImportFormatError as e:
+                st.error(str(e))
+                return
+            st.success(f"Imported {summary['imported']} of {summary['rows']} rows in {summary['seconds']:.1f} s "
+                       f"({summary['rejected']} rejected).")
+            if summary['rejected']:
+                st.dataframe(summary['sample_rejects'])
+                st.download_button("Download all rejects", rejects.getvalue(), file_name=f"{table}_rejects.csv",
+                                   mime="text/csv", key=f"{table}_rejects")
 
 # Streamlit UI
 def main():
@@ -477,6 +315,10 @@ def main():
         st.markdown("📞 Call: 1-800-SUPPORT")
         st.markdown("✉️ Email: support@example.com")
     
+    # Stop waiting on an analysis the user navigated away from
+    if nav_option != "Customer Support":
+        cancel_defect_analysis()
+    
     # Initialize session state
     if 'defect_analysis' not in st.session_state:
         st.session_state.defect_analysis = None
@@ -488,6 +330,9 @@ def main():
         st.session_state.appointment_scheduled = None
     if 'address_updated' not in st.session_state:
         st.session_state.address_updated = False
+    # Reruns and double clicks reuse this key, so they cannot book twice
+    if 'booking_key' not in st.session_state:
+        st.session_state.booking_key = uuid.uuid4().hex
     
     # Home Page
     if nav_option == "Home":
@@ -570,35 +415,53 @@ def main():
         
         # Step 1: Image Upload and Analysis
         st.header("Step 1: Upload Image of Defective Hardware")
-        uploaded_file = st.file_uploader(
-            "Upload a clear image of the defective component", 
+        uploaded_files = st.file_uploader(
+            "Upload clear images of the defective component (several angles of the same device are fine)", 
             type=["jpg", "jpeg", "png"],
-            accept_multiple_files=False,
+            accept_multiple_files=True,
             key="file_uploader"
         )
         
-        if uploaded_file is not None:
-            image_bytes = uploaded_file.read()
-            image = Image.open(io.BytesIO(image_bytes))
+        if uploaded_files:
+            # Decode and re-encode each upload only once across reruns
+            upload_ids = tuple(uploaded_file.file_id for uploaded_file in uploaded_files)
+            if st.session_state.get('prepared_upload_ids') != upload_ids:
+                try:
+                    st.session_state.prepared_uploads = [
+                        defect_analysis.prepare_image(uploaded_file.getvalue()) for uploaded_file in uploaded_files
+                    ]
+                    st.session_state.prepared_upload_ids = upload_ids
+                except Exception as e:
+                    st.error(f"Could not read the uploaded image: {str(e)}")
+                    st.stop()
+            prepared_uploads = st.session_state.prepared_uploads
             
             col1, col2 = st.columns(2)
             with col1:
-                st.image(image, caption="Uploaded Image", use_container_width=True, output_format="JPEG")
+                st.image([image for image, _, _ in prepared_uploads],
+                         caption=[uploaded_file.name for uploaded_file in uploaded_files],
+                         use_container_width=True, output_format="JPEG")
             
             with col2:
                 if st.button("Analyze Image for Defects", key="analyze_btn"):
-                    with st.spinner("Analyzing image for defects..."):
-                        st.session_state.defect_analysis = analyze_image_for_defects(image_bytes)
-                        time.sleep(1)
+                    st.session_state.defect_analysis = None
+                    start_defect_analysis(prepared_uploads)
+                
+                if st.session_state.get('analysis_job') is not None:
+                    show_analysis_progress()
+                else:
+                    for error in st.session_state.get('analysis_errors', []):
+                        st.error(error)
                     
-                    if st.session_state.defect_analysis:
-                        if st.session_state.defect_analysis.get('defect_detected', False):
+                    report = st.session_state.defect_analysis
+                    if report:
+                        if report.defect_detected:
                             st.markdown(f"""
                             <div class="card danger-card">
                                 <h3>Defect Detected!</h3>
-                                <p><strong>Type:</strong> {st.session_state.defect_analysis.get('defect_type', 'Unknown')}</p>
-                                <p><strong>Severity:</strong> <span style="color: {'green' if st.session_state.defect_analysis.get('severity') == 'Low' else 'orange' if st.session_state.defect_analysis.get('severity') == 'Medium' else 'red'}">{st.session_state.defect_analysis.get('severity', 'Unknown')}</span></p>
-                                <p><strong>Affected Components:</strong> {st.session_state.defect_analysis.get('affected_components', 'Not specified')}</p>
+                                <p><strong>Type:</strong> {report.defect_type}</p>
+                                <p><strong>Severity:</strong> <span style="color: {'green' if report.severity == 'Low' else 'orange' if report.severity == 'Medium' else 'red'}">{report.severity}</span></p>
+                                <p><strong>Affected Components:</strong> {', '.join(report.affected_components) or 'Not specified'}</p>
                             </div>
                             """, unsafe_allow_html=True)
                         else:
@@ -611,7 +474,7 @@ def main():
                             """, unsafe_allow_html=True)
         
         # Step 2: Service Tag Verification
-        if st.session_state.defect_analysis and st.session_state.defect_analysis.get('defect_detected', False):
+        if st.session_state.defect_analysis and st.session_state.defect_analysis.defect_detected:
             st.header("Step 2: Verify Service Tag & Customer Details")
             service_tag = st.text_input("Enter your service tag number (found on the bottom of your device):", key="service_tag_input")
             
@@ -635,12 +498,7 @@ def main():
                         new_address = st.text_area("Enter your complete address:", key="address_input")
                         if st.button("Update Address", key="update_address_btn"):
                             if new_address:
-                                conn = sqlite3.connect('hardware_support.db')
-                                c = conn.cursor()
-                                c.execute("UPDATE customers SET customer_address=? WHERE id=?", 
-                                          (new_address, st.session_state.customer_info['id']))
-                                conn.commit()
-                                conn.close()
+                                update_customer_address(st.session_state.customer_info['id'], new_address)
                                 st.session_state.customer_info['customer_address'] = new_address
                                 st.session_state.address_updated = True
                                 st.success("Address updated successfully!")
@@ -661,13 +519,7 @@ def main():
         if st.session_state.customer_info and st.session_state.address_updated:
             st.header("Step 3: Warranty & Service Options")
             
-            brand = None
-            if "dell" in st.session_state.customer_info['laptop_model'].lower():
-                brand = "Dell"
-            elif "hp" in st.session_state.customer_info['laptop_model'].lower():
-                brand = "HP"
-            elif "lenovo" in st.session_state.customer_info['laptop_model'].lower():
-                brand = "Lenovo"
+            brand = catalog.detect_brand(st.session_state.customer_info['laptop_model'])
             
             if st.session_state.customer_info['warranty_valid']:
                 st.markdown(f"""
@@ -678,81 +530,74 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
                 
-                st.subheader("Available Service Technicians")
-                technicians = get_available_technicians(brand)
+                st.subheader("Schedule Your Appointment")
+                appointment_date = st.date_input("Preferred date:", min_value=datetime.today(), 
+                                               max_value=datetime.today() + timedelta(days=scheduling.SCHEDULING_WINDOW_DAYS))
+                appointment_time = st.time_input("Preferred time:", 
+                                                 value=datetime.strptime("10:00", "%H:%M").time())
                 
-                if technicians:
-                    if len(technicians) > 1:
-                        tech_options = {f"{tech['name']} ({tech['location']}) - ★{tech['rating']}": tech['id'] for tech in technicians}
-                        selected_tech = st.selectbox("Choose a technician:", options=list(tech_options.keys()))
-                        st.session_state.technician_selected = tech_options[selected_tech]
-                    else:
-                        st.session_state.technician_selected = technicians[0]['id']
-                    
-                    selected_tech_details = next((tech for tech in technicians if tech['id'] == st.session_state.technician_selected), None)
+                slots = find_appointment_slots(brand, st.session_state.customer_info['customer_address'],
+                                               datetime.combine(appointment_date, appointment_time))
+                
+                if slots:
+                    st.subheader("Available Service Technicians")
+                    slot_options = {f"{slot['start'].strftime('%a, %b %d at %I:%M %p')} · {slot['technician']['name']} "
+                                    f"({slot['technician']['location']}) - ★{slot['technician']['rating']}": slot
+                                    for slot in slots}
+                    selected_slot = slot_options[st.selectbox("Choose a technician and time:", options=list(slot_options.keys()))]
+                    st.session_state.technician_selected = selected_slot['technician']['id']
+                    selected_tech_details = selected_slot['technician']
+                    appointment_datetime = selected_slot['start']
                     
-                    if selected_tech_details:
-                        initials = "".join([name[0] for name in selected_tech_details['name'].split()[:2]]).upper()
-                        st.markdown(f"""
-                        <div class="card info-card">
-                            <div class="technician-card">
-                                <div class="technician-avatar">{initials}</div>
-                                <div class="technician-details">
-                                    <h4>{selected_tech_details['name']}</h4>
-                                    <p>📞 {selected_tech_details['phone']}</p>
-                                    <p>📍 {selected_tech_details['location']}</p>
-                                    <div class="rating">{"★" * int(selected_tech_details['rating'])}</div>
-                                </div>
+                    initials = "".join([name[0] for name in selected_tech_details['name'].split()[:2]]).upper()
+                    st.markdown(f"""
+                    <div class="card info-card">
+                        <div class="technician-card">
+                            <div class="technician-avatar">{initials}</div>
+                            <div class="technician-details">
+                                <h4>{selected_tech_details['name']}</h4>
+                                <p>📞 {selected_tech_details['phone']}</p>
+                                <p>📍 {selected_tech_details['location']}</p>
+                                <div class="rating">{"★" * int(selected_tech_details['rating'])}</div>
                             </div>
-                            <p><strong>Specialization:</strong> {selected_tech_details['specialization']}</p>
-                            <p>This technician is available for at-home service in your area.</p>
                         </div>
-                        """, unsafe_allow_html=True)
-                        
-                        st.subheader("Schedule Your Appointment")
-                        appointment_date = st.date_input("Preferred date:", min_value=datetime.today(), 
-                                                       max_value=datetime.today() + timedelta(days=30))
-                        appointment_time = st.time_input("Preferred time:", 
-                                                         value=datetime.strptime("10:00", "%H:%M").time())
-                        
-                        issue_description = st.text_area("Describe the issue in more detail:", 
-                                                        value=st.session_state.defect_analysis.get('defect_type', ""))
-                        
-                        if st.button("Confirm Appointment", key="schedule_btn"):
-                            appointment_datetime = datetime.combine(appointment_date, appointment_time)
+                        <p><strong>Specialization:</strong> {selected_tech_details['specialization']}</p>
+                        <p>This technician is available for at-home service in your area.</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    
+                    issue_description = st.text_area("Describe the issue in more detail:", 
+                                                    value=st.session_state.defect_analysis.defect_type)
+                    
+                    if st.button("Confirm Appointment", key="schedule_btn"):
+                        try:
                             appointment_id = schedule_appointment(
                                 st.session_state.customer_info['id'],
                                 st.session_state.technician_selected,
                                 st.session_state.customer_info['service_tag'],
                                 issue_description,
-                                appointment_datetime
+                                appointment_datetime,
+                                idempotency_key=st.session_state.booking_key,
+                                defect=st.session_state.defect_analysis.to_dict(),
+                                defect_report_id=st.session_state.get('defect_report_id')
                             )
-                            
-                            # Send confirmation email
-                            email_body = f"""
-                            <p>Your appointment has been scheduled successfully!</p>
-                            <p><strong>Details:</strong></p>
-                            <ul>
-                                <li>Date: {appointment_date.strftime('%B %d, %Y')}</li>
-                                <li>Time: {appointment_time.strftime('%I:%M %p')}</li>
-                                <li>Technician: {selected_tech_details['name']}</li>
-                                <li>Contact: {selected_tech_details['phone']}</li>
-                                <li>Address: {st.session_state.customer_info['customer_address']}</li>
-                            </ul>
-                            <p>Our technician will call you before the scheduled visit.</p>
-                            """
-                            send_email(st.session_state.customer_info['customer_email'], 
-                                     "Appointment Confirmation", email_body)
-                            
-                            st.session_state.appointment_scheduled = {
-                                "id": appointment_id,
-                                "date": appointment_date.strftime("%B %d, %Y"),
-                                "time": appointment_time.strftime("%I:%M %p"),
-                                "technician": selected_tech_details['name'],
-                                "phone": selected_tech_details['phone']
-                            }
-                            
+                        except scheduling.SlotUnavailableError:
+                            st.error("Sorry, that slot was just booked. Please choose another time.")
+                            st.stop()
+                        
+                        # A repeated click returns the original booking, whose details are already shown
+                        if st.session_state.appointment_scheduled and st.session_state.appointment_scheduled['id'] == appointment_id:
                             st.rerun()
+                        
+                        st.session_state.appointment_scheduled = {
+                            "id": appointment_id,
+                            "date": appointment_datetime.strftime("%B %d, %Y"),
+                            "time": appointment_datetime.strftime("%I:%M %p"),
+                            "technician": selected_tech_details['name'],
+                            "phone": selected_tech_details['phone']
+                        }
+                        
+                        st.rerun()
                 else:
                     st.warning("No technicians available for your brand at this time.")
                     st.info("Please try again later or contact our support team for assistance.")
@@ -792,14 +637,20 @@ def main():
                         if st.button("Find Service Centers"):
                             if location:
                                 # Call the scrape_service_centers function with both brand and location
-                                service_centers = scrape_service_centers(brand, location)
-                                if service_centers:
-                                    for center in service_centers:
+                                nearby_centers = scrape_service_centers(brand, location)
+                                if nearby_centers:
+                                    for center in nearby_centers:
+                                        # Kept on the phone line: a blank line would end the HTML block
+                                        extra = (f"<p>🏙️ <strong>City:</strong> {center['city']}</p>"
+                                                 if center['city'] else "")
+                                        if (center['distance_km'] or 0) >= 1:
+                                            extra += (f"<p>🧭 <strong>Distance:</strong> about "
+                                                      f"{center['distance_km']:g} km from the city centre</p>")
                                         st.markdown(f"""
                                         <div class="card service-center-card">
                                             <h4>{center['name']}</h4>
-                                            <p>📍 <strong>Address:</strong> {center['address']}</p>
-                                            <p>📞 <strong>Phone:</strong> {center['phone']}</p>
+                                            <p>📍 <strong>Address:</strong> {center['address'] or 'Not listed'}</p>
+                                            <p>📞 <strong>Phone:</strong> {center['phone'] or 'Not listed'}</p>{extra}
                                             <p><a href="{center['link']}" target="_blank">View Details</a></p>
                                         </div>
                                         """, unsafe_allow_html=True)
@@ -826,11 +677,14 @@ def main():
             """, unsafe_allow_html=True)
             
             if st.button("Schedule Another Appointment", key="new_appointment_btn"):
+                cancel_defect_analysis()
                 st.session_state.defect_analysis = None
+                st.session_state.defect_report_id = None
                 st.session_state.customer_info = None
                 st.session_state.technician_selected = None
                 st.session_state.appointment_scheduled = None
                 st.session_state.address_updated = False
+                st.session_state.booking_key = uuid.uuid4().hex
                 st.rerun()
     
     # Technician Portal
@@ -840,77 +694,92 @@ def main():
         tech_id = st.text_input("Enter Technician ID:")
         tech_pass = st.text_input("Password:", type="password")
         
-        conn = sqlite3.connect('hardware_support.db')
-        technician = conn.execute(
-            "SELECT * FROM technicians WHERE id=? AND password=?", 
-            (tech_id, tech_pass)
-        ).fetchone()
+        # Check the credentials once per change instead of on every widget interaction
+        login = (tech_id, hashlib.sha256(tech_pass.encode()).hexdigest())
+        if st.session_state.get('technician_login') != login:
+            st.session_state.technician_login = login
+            st.session_state.technician = authenticate_technician(tech_id, tech_pass)
+        technician = st.session_state.technician
         
         if not technician:
             
             st.stop()
         
-        columns = ['id', 'name', 'email', 'phone', 'specialization', 'location', 'rating', 'available', 'password']
-        technician = dict(zip(columns, technician))
-        
         st.success(f"Welcome, {technician['name']}!")
         
         st.header("Your Schedule")
-        appointments = pd.read_sql(f"""
-            SELECT a.id, c.customer_name, c.customer_phone, c.customer_address,
-                   a.service_tag, a.issue_description, 
-                   a.appointment_date, a.appointment_time, a.status
-            FROM appointments a
-            JOIN customers c ON a.customer_id = c.id
-            WHERE a.technician_id = {technician['id']}
-            AND a.appointment_date >= date('now')
-            ORDER BY a.appointment_date
-        """, conn)
-        
-        if not appointments.empty:
-            for _, appt in appointments.iterrows():
-                with st.expander(f"{appt['appointment_date']} - {appt['customer_name']} ({appt['status']})"):
+        window_col, page_col = st.columns([3, 2])
+        window = window_col.radio("Show", technician_schedule.WINDOWS, horizontal=True, key="schedule_window")
+        if st.session_state.get('schedule_window_shown') != window:
+            st.session_state.schedule_window_shown = window
+            st.session_state.schedule_offset = 0
+        if window != "Upcoming":
+            prev_col, label_col, next_col = page_col.columns([1, 3, 1])
+            if prev_col.button("◀", key="schedule_prev", disabled=st.session_state.schedule_offset == 0):
+                st.session_state.schedule_offset -= 1
+                st.rerun()
+            if next_col.button("▶", key="schedule_next"):
+                st.session_state.schedule_offset += 1
+                st.rerun()
+            start, end = technician_schedule.window_bounds(window, st.session_state.schedule_offset)
+            label_col.caption(start.strftime("%a, %b %d") if window == "Today" else
+                              f"{start.strftime('%b %d')} – {(end - timedelta(days=1)).strftime('%b %d')}")
+        # Only appointments changed since the last render are read from the database
+        appointments = get_technician_schedule(technician['id'], window, st.session_state.get('schedule_offset', 0))
+        
+        if appointments:
+            # Saved photo analyses for every device on the schedule, fetched in two queries
+            device_reports = get_device_defect_reports(appt['service_tag'] for appt in appointments)
+            thumbnails = get_defect_report_thumbnails(report['id'] for reports in device_reports.values()
+                                                      for report in reports)
+            for appt in appointments:
+                with st.expander(f"{appt['appointment_date']} {appt['appointment_time']} - "
+                                 f"{appt['customer_name']} ({appt['status']})"):
                     st.markdown(f"""
                     Customer: {appt['customer_name']}  
+                    Email: {appt['customer_email']}  
                     Phone: {appt['customer_phone']}  
                     Address: {appt['customer_address']}  
                     Service Tag: {appt['service_tag']}  
                     Issue: {appt['issue_description']}
                     """)
                     
+                    for report in device_reports.get(appt['service_tag'], []):
+                        label = ("Photo analysis for this visit" if report['appointment_id'] == appt['id'] else
+                                 f"Earlier analysis ({datetime.fromtimestamp(report['created_at']).strftime('%b %d, %Y')})")
+                        st.markdown(f"**{label}:** {report['defect_type']} · Severity {report['severity']} · "
+                                    f"Components: {', '.join(report['affected_components']) or 'Not specified'}")
+                        if thumbnails.get(report['id']):
+                            st.image(thumbnails[report['id']], width=defect_reports.THUMBNAIL_EDGE)
+                    
                     cols = st.columns(3)
                     with cols[0]:
                         if st.button("Start Service", key=f"start_{appt['id']}"):
-                            conn.execute("UPDATE appointments SET status='In Progress' WHERE id=?", (appt['id'],))
-                            conn.commit()
+                            update_appointment_statuses([appt['id']], "In Progress", technician['id'])
                             st.rerun()
                     with cols[1]:
                         if st.button("Complete", key=f"complete_{appt['id']}"):
-                            conn.execute("UPDATE appointments SET status='Completed' WHERE id=?", (appt['id'],))
-                            conn.commit()
-                            
-                            # Send completion email
-                            customer_email = conn.execute(
-                                "SELECT customer_email FROM customers WHERE id=?", 
-                                (appt['customer_id'],)
-                            ).fetchone()[0]
-                            
-                            email_body = f"""
-                            <p>Your service appointment has been completed!</p>
-                            <p><strong>Details:</strong></p>
-                            <ul>
-                                <li>Technician: {technician['name']}</li>
-                                <li>Service Tag: {appt['service_tag']}</li>
-                                <li>Issue: {appt['issue_description']}</li>
-                            </ul>
-                            <p>Please contact us if you have any questions about your repair.</p>
-                            """
-                            send_email(customer_email, "Service Completed", email_body)
+                            # Marks the appointment completed and queues the customer's email
+                            update_appointment_statuses([appt['id']], "Completed", technician['id'], notify=True)
                             st.rerun()
+                    with cols[2]:
+                        st.checkbox("Select", key=f"select_{appt['id']}")
+            
+            # Several jobs change status in one transaction
+            selected = [appt['id'] for appt in appointments if st.session_state.get(f"select_{appt['id']}")]
+            start_col, complete_col, _ = st.columns([1, 1, 3])
+            batch_status = None
+            if start_col.button(f"Start {len(selected)} Selected", key="start_selected", disabled=not selected):
+                batch_status = "In Progress"
+            if complete_col.button(f"Complete {len(selected)} Selected", key="complete_selected", disabled=not selected):
+                batch_status = "Completed"
+            if batch_status:
+                update_appointment_statuses(selected, batch_status, technician['id'], notify=True)
+                for appointment_id in selected:
+                    del st.session_state[f"select_{appointment_id}"]
+                st.rerun()
         else:
-            st.info("No upcoming appointments")
-        
-        conn.close()
+            st.info("No appointments in this period" if window != "Upcoming" else "No upcoming appointments")
     
     # Admin Dashboard
     elif nav_option == "Admin Dashboard":
@@ -921,13 +790,17 @@ def main():
 
             st.stop()
         
-        tab1, tab2, tab3 = st.tabs(["Customers", "Technicians", "Appointments"])
+        tab1, tab2, tab3, tab4 = st.tabs(["Customers", "Technicians", "Appointments", "Analytics"])
         
         with tab1:
             st.header("Customer Management")
-            conn = sqlite3.connect('hardware_support.db')
-            customers = pd.read_sql("SELECT * FROM customers", conn)
-            st.dataframe(customers)
+            customer_search = st.text_input("Search by service tag or name:", key="customer_search").strip()
+            show_admin_table("customers", "customers", {"search": customer_search},
+                             ["id", "service_tag", "customer_name", "warranty_end_date"])
+            
+            show_bulk_import("customers", "Columns: service_tag, customer_name and warranty_end_date are required; "
+                                          "customer_email, customer_phone, customer_address, laptop_model and "
+                                          "purchase_date are optional. Existing service tags are updated.")
             
             with st.expander("Add New Customer"):
                 with st.form("add_customer"):
@@ -939,76 +812,168 @@ def main():
                     model = st.text_input("Laptop Model")
                     purchase_date = st.date_input("Purchase Date")
                     warranty_end = st.date_input("Warranty End Date")
-                    warranty_valid = st.checkbox("Warranty Active")
                     
                     if st.form_submit_button("Add Customer"):
                         try:
-                            conn.execute('''INSERT INTO customers 
-                                         (service_tag, customer_name, customer_email, customer_phone,
-                                          customer_address, laptop_model, purchase_date, warranty_end_date, warranty_valid)
-                                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                      (service_tag, name, email, phone, address, model, 
-                                       purchase_date.strftime("%Y-%m-%d"), warranty_end.strftime("%Y-%m-%d"), 
-                                       int(warranty_valid)))
-                            conn.commit()
+                            add_customer(service_tag, name, email, phone, address, model,
+                                         purchase_date.strftime("%Y-%m-%d"), warranty_end.strftime("%Y-%m-%d"))
                             st.success("Customer added!")
+                        except service_tags.InvalidServiceTagError as e:
+                            st.error(str(e))
                         except sqlite3.IntegrityError:
                             st.error("Service tag already exists")
             
             with st.expander("Delete Customer"):
                 customer_id = st.text_input("Enter Customer ID to delete:")
                 if st.button("Delete Customer"):
-                    conn.execute("DELETE FROM customers WHERE id=?", (customer_id,))
-                    conn.commit()
+                    delete_customer(customer_id)
                     st.success("Customer deleted")
+            
+            with st.expander("Expiring Warranties"):
+                expiring_days = st.number_input("Warranties ending within (days):", min_value=1, max_value=365, value=30)
+                expiring = warranty.get_expiring_warranties(int(expiring_days))
+                if expiring:
+                    st.dataframe(expiring)
+                else:
+                    st.info("No warranties expire in this period")
         
         with tab2:
             st.header("Technician Management")
-            technicians = pd.read_sql("SELECT id, name, specialization, location, rating, available FROM technicians", conn)
-            st.dataframe(technicians)
+            search_col, spec_col = st.columns(2)
+            technician_search = search_col.text_input("Search by name:", key="technician_search").strip()
+            specialization_filter = spec_col.selectbox("Specialization", ["All"] + catalog.brand_names(),
+                                                       key="technician_specialization")
+            show_admin_table("technicians", "technicians",
+                             {"search": technician_search,
+                              "specialization": None if specialization_filter == "All" else specialization_filter},
+                             ["id", "name", "rating"])
+            
+            show_bulk_import("technicians", "Columns: name and specialization are required; id, email, phone, "
+                                            "location, rating, available and password are optional. Rows with an id "
+                                            "update that technician, rows without one need a password.")
             
             with st.expander("Add New Technician"):
                 with st.form("add_technician"):
                     name = st.text_input("Name")
                     email = st.text_input("Email")
                     phone = st.text_input("Phone")
-                    specialization = st.selectbox("Specialization", ["Dell", "HP", "Lenovo"])
+                    specialization = st.selectbox("Specialization", catalog.brand_names())
                     location = st.text_input("Location")
                     rating = st.slider("Rating", 1.0, 5.0, 4.5)
                     available = st.checkbox("Available", value=True)
                     password = st.text_input("Password", type="password")
                     
                     if st.form_submit_button("Add Technician"):
-                        conn.execute('''INSERT INTO technicians 
-                                     (name, email, phone, specialization, location, rating, available, password)
-                                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                                  (name, email, phone, specialization, location, rating, int(available), password))
-                        conn.commit()
+                        add_technician(name, email, phone, specialization, location, rating, available, password)
                         st.success("Technician added!")
         
         with tab3:
             st.header("Appointment Monitoring")
-            appointments = pd.read_sql("""
-                SELECT a.id, c.customer_name, t.name as technician, 
-                       a.appointment_date, a.appointment_time, a.status
-                FROM appointments a
-                JOIN customers c ON a.customer_id = c.id
-                JOIN technicians t ON a.technician_id = t.id
-                ORDER BY a.appointment_date
-            """, conn)
-            st.dataframe(appointments)
+            search_col, status_col = st.columns(2)
+            appointment_search = search_col.text_input("Search by ID, service tag or customer name:",
+                                                       key="appointment_search").strip()
+            status_filter = status_col.selectbox("Status", ["All", "Scheduled", "In Progress", "Completed", "Cancelled"],
+                                                 key="appointment_status_filter")
+            from_col, to_col = st.columns(2)
+            date_from = from_col.date_input("From", value=None, key="appointment_date_from")
+            date_to = to_col.date_input("To", value=None, key="appointment_date_to")
+            show_admin_table("appointments", "appointments",
+                             {"search": appointment_search,
+                              "status": None if status_filter == "All" else status_filter,
+                              "date_from": date_from, "date_to": date_to},
+                             ["appointment_date", "id", "status"])
             
             st.subheader("Update Appointment Status")
-            selected_id = st.selectbox("Select Appointment", appointments['id'])
-            new_status = st.selectbox("New Status", 
-                                    ["Scheduled", "In Progress", "Completed", "Cancelled"])
-            if st.button("Update Status"):
-                conn.execute("UPDATE appointments SET status=? WHERE id=?", 
-                            (new_status, selected_id))
-                conn.commit()
-                st.success("Status updated!")
-        
-        conn.close()
+            status_search = st.text_input("Find appointment by ID, service tag or customer name:").strip()
+            matches = admin_tables.search_appointments(status_search) if status_search else []
+            if matches:
+                labels = dict(matches)
+                selected_id = st.selectbox("Select Appointment", list(labels), format_func=labels.get)
+                new_status = st.selectbox("New Status", 
+                                        ["Scheduled", "In Progress", "Completed", "Cancelled"])
+                if st.button("Update Status"):
+                    update_appointment_status(selected_id, new_status)
+                    st.success("Status updated!")
+            elif status_search:
+                st.info("No matching appointments")
+        
+        with tab4:
+            # Imported here so pandas and numpy load only for the admin dashboard
+            import analytics
+            
+            st.header("Operational Analytics")
+            from_col, to_col = st.columns(2)
+            window_start = from_col.date_input("Appointments from", value=datetime.today() - timedelta(days=30),
+                                               key="analytics_from")
+            window_end = to_col.date_input("Appointments to", value=datetime.today() + timedelta(days=14),
+                                           key="analytics_to")
+            window_end += timedelta(days=1)
+            
+            utilization = analytics.technician_utilization(window_start, window_end)
+            summary = analytics.completion_summary(utilization)
+            kpi = st.columns(4)
+            kpi[0].metric("Booked", summary['booked'])
+            kpi[1].metric("Completed", summary['completed'])
+            kpi[2].metric("Mean Utilization", f"{summary['mean_utilization']:.0%}")
+            kpi[3].metric("Mean Time to Completion",
+                          "n/a" if summary['mean_hours_to_complete'] is None
+                          else f"{summary['mean_hours_to_complete']:.1f} h")
+            
+            st.subheader("Technician Utilization")
+            st.bar_chart(utilization.head(25).set_index("name")["utilization"])
+            st.dataframe(utilization[["name", "brand", "location", "booked", "completed",
+                                      "utilization", "mean_hours_to_complete"]],
+                         column_config={"utilization": st.column_config.ProgressColumn(
+                             "utilization", format="percent", min_value=0, max_value=1)})
+            
+            backlog_col, defect_col = st.columns(2)
+            with backlog_col:
+                st.subheader("Open Backlog by Brand and Location")
+                backlog = analytics.backlog_by_area()
+                if backlog.empty:
+                    st.info("No open appointments")
+                else:
+                    st.dataframe(backlog)
+            with defect_col:
+                st.subheader("Defect Types by Severity")
+                defects = analytics.defect_distribution(window_start, window_end)
+                if defects.empty:
+                    st.info("No appointments in this period")
+                else:
+                    st.dataframe(defects)
+            
+            st.subheader("Warranty Expiry Cohorts")
+            cohorts = analytics.warranty_cohorts()
+            if cohorts.empty:
+                st.info("No warranties end in the past or next 12 months")
+            else:
+                st.bar_chart(cohorts.set_index("month")["customers"])
+
+            st.subheader("Defect Reports")
+            severity_col, component_col = st.columns(2)
+            report_severity = severity_col.selectbox("Severity", ["Any", *defect_analysis.SEVERITY_LEVELS],
+                                                     key="report_severity")
+            report_component = component_col.text_input("Affected component", key="report_component").strip()
+            found_reports = search_defect_reports(None if report_severity == "Any" else report_severity,
+                                                  report_component or None)
+            if found_reports:
+                st.dataframe(found_reports)
+            else:
+                st.info("No matching defect reports")
+
+        with st.expander("Lookup Cache Statistics"):
+            st.caption("Hit rate and approximate memory of this server process's read-through caches")
+            st.dataframe(readcache.cache_stats())
+
+        with st.expander("Inference Backends"):
+            st.caption("Circuit breaker state, smoothed latency and outcomes of each vision backend, "
+                       "in order of preference")
+            st.dataframe(service.get_inference_health())
+
+        with st.expander("Service Center Directory"):
+            st.caption("Centers found by past searches, how they were geocoded and how many searched areas "
+                       "are due a refresh")
+            st.dataframe([service.get_service_center_directory_stats()])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,81 @@
+import argparse
+import io
+import statistics
+import sys
+import time
+
+import defect_analysis
+import inference
+from prompt_eval import StubVisionServer
+
+# (label, width, height, format): what customers upload, from phone photos to screenshots
+SAMPLES = [
+    ("12 MP phone photo", 4032, 3024, "JPEG"),
+    ("8 MP phone photo", 3264, 2448, "JPEG"),
+    ("1080p screenshot", 1920, 1080, "PNG"),
+    ("small photo", 800, 600, "JPEG"),
+]
+
+
+def synthetic_photo(width, height, image_format, seed):
+    """A photo-like image: smooth shading under sensor noise, saved the way a phone or screenshot tool would"""
+    from PIL import Image, ImageChops, ImageFilter
+
+    shading = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.effect_noise((width, height), 40 + seed % 20).filter(ImageFilter.GaussianBlur(1)).convert("RGB")
+    image = ImageChops.add(ImageChops.multiply(shading, Image.new("RGB", (width, height), (210, 190, 160))),
+                           noise, scale=1.6)
+    output = io.BytesIO()
+    if image_format == "JPEG":
+        # Phones store the sensor's orientation in EXIF rather than rotating the pixels
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        image.save(output, "JPEG", quality=95, exif=exif)
+    else:
+        image.save(output, image_format)
+    return output.getvalue()
+
+
+def timed_request(backend, image_bytes, mime_type):
+    started = time.perf_counter()
+    _, prompt_tokens, _ = backend.complete(defect_analysis.build_messages(image_bytes, mime_type),
+                                           defect_analysis.ANALYSIS_TEMPERATURE, defect_analysis.ANALYSIS_MAX_TOKENS,
+                                           defect_analysis.ANALYSIS_TIMEOUT_SECONDS)
+    return (time.perf_counter() - started) * 1000, prompt_tokens
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare sending uploads as-is with preparing them first.")
+    parser.add_argument("--runs", type=int, default=3, help="timed requests per image and variant")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="stub model time per request")
+    parser.add_argument("--ms-per-kb", type=float, default=0.5, help="stub transfer time per KB of request")
+    parser.add_argument("--max-edge", type=int, default=defect_analysis.IMAGE_MAX_EDGE)
+    parser.add_argument("--quality", type=int, default=defect_analysis.IMAGE_QUALITY)
+    args = parser.parse_args(argv)
+
+    print(f"{'image':<20} {'upload':>9} {'sent':>9} {'prep ms':>8} {'before ms':>10} {'after ms':>9} "
+          f"{'tokens before':>14} {'after':>6}")
+    with StubVisionServer(latency_ms=args.latency_ms, ms_per_kb=args.ms_per_kb, ms_per_token=0) as stub:
+        backend = inference.OpenAIBackend("stub", "stub", stub.url)
+        for seed, (label, width, height, image_format) in enumerate(SAMPLES):
+            upload = synthetic_photo(width, height, image_format, seed)
+            prep_ms = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                _, prepared, mime_type = defect_analysis.prepare_image(upload, args.max_edge, "JPEG", args.quality)
+                prep_ms.append((time.perf_counter() - started) * 1000)
+            # Before: the upload was sent as it arrived; after: prepared once, then sent
+            before = [timed_request(backend, upload, f"image/{image_format.lower()}") for _ in range(args.runs)]
+            after = [timed_request(backend, prepared, mime_type) for _ in range(args.runs)]
+            prep = statistics.median(prep_ms)
+            print(f"{label:<20} {len(upload) / 1024:>7.0f}KB {len(prepared) / 1024:>7.0f}KB {prep:>8.1f} "
+                  f"{statistics.median(ms for ms, _ in before):>10.1f} "
+                  f"{prep + statistics.median(ms for ms, _ in after):>9.1f} "
+                  f"{before[0][1]:>14} {after[0][1]:>6}")
+    print("after ms includes preparing the image; request times come from the stub, so compare them, "
+          "not their absolute values")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+# Backends in order of preference, as a JSON list (see build_backends); empty means Groq alone
+INFERENCE_BACKENDS = os.getenv("INFERENCE_BACKENDS", "")
+# A backend failing this many calls in a row is skipped until a trial call gets through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+# When the backend asked first has not answered after this long, the next one is asked too; 0 turns hedging off
+HEDGE_AFTER_MS = float(os.getenv("HEDGE_AFTER_MS", 0))
+INFERENCE_MAX_WORKERS = int(os.getenv("INFERENCE_MAX_WORKERS", 16))
+LATENCY_SMOOTHING = 0.2
+
+
+class InferenceError(Exception):
+    """Raised when no backend returned a usable answer"""
+
+
+class GroqBackend:
+    """A model served by Groq, or by any server speaking the Groq API when ``base_url`` is set"""
+
+    def __init__(self, name, model, base_url=None, api_key=None, max_retries=0, json_mode=True):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY")
+        self.max_retries = max_retries
+        self.json_mode = json_mode
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # Imported here so pages that never analyze a photo do not pay for the SDK
+                    from groq import Groq
+                    self._client = Groq(api_key=self.api_key or "local", base_url=self.base_url,
+                                        max_retries=self.max_retries)
+        return self._client
+
+    def complete(self, messages, temperature, max_tokens, timeout):
+        """Return the completion text with its prompt and completion token counts"""
+        options = {"response_format": {"type": "json_object"}} if self.json_mode else {}
+        completion = self._get_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            **options
+        )
+        usage = completion.usage
+        return (completion.choices[0].message.content, usage.prompt_tokens if usage else None,
+                usage.completion_tokens if usage else None)
+
+
+class OpenAIBackend:
+    """A model behind an OpenAI-compatible chat completions endpoint, such as an on-prem vLLM or llama.cpp server
+
+    ``base_url`` includes the version prefix, e.g. ``http://gpu-01:8000/v1``.
+    """
+
+    def __init__(self, name, model, base_url, api_key=None, json_mode=True):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.json_mode = json_mode
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+                    self._client = httpx.Client(base_url=self.base_url.rstrip("/"), headers=headers)
+        return self._client
+
+    def complete(self, messages, temperature, max_tokens, timeout):
+        """Return the completion text with its prompt and completion token counts"""
+        request = {"model": self.model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        if self.json_mode:
+            request["response_format"] = {"type": "json_object"}
+        response = self._get_client().post("/chat/completions", json=request, timeout=timeout)
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage") or {}
+        return body["choices"][0]["message"]["content"], usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+BACKEND_TYPES = {"groq": GroqBackend, "openai": OpenAIBackend}
+
+
+def build_backends(spec=INFERENCE_BACKENDS, default_model=None):
+    """Build the backends described by a JSON list, in order of preference
+
+    Each entry has a ``name``, a ``type`` (groq or openai), a ``model`` (the
+    default model when omitted) and any other constructor argument such as
+    ``base_url``. ``api_key_env`` names the environment variable holding the
+    key, so keys stay out of the list:
+
+        [{"name": "scout", "type": "groq"},
+         {"name": "onprem", "type": "openai", "base_url": "http://gpu-01:8000/v1",
+          "model": "llava-1.6", "api_key_env": "ONPREM_API_KEY"}]
+
+    An empty spec is Groq alone with the SDK's own retries, as before backends
+    were configurable.
+    """
+    if not spec.strip():
+        return [GroqBackend("groq", default_model, max_retries=2)]
+    backends = []
+    for entry in json.loads(spec):
+        entry = dict(entry)
+        backend_type = entry.pop("type", "groq")
+        if backend_type not in BACKEND_TYPES:
+            raise ValueError(f"Unknown inference backend type {backend_type!r}")
+        key_variable = entry.pop("api_key_env", None)
+        if key_variable:
+            entry["api_key"] = os.environ.get(key_variable)
+        entry.setdefault("model", default_model)
+        backends.append(BACKEND_TYPES[backend_type](**entry))
+    if len({backend.name for backend in backends}) != len(backends):
+        raise ValueError("Inference backend names must be unique")
+    return backends
+
+
+class BackendHealth:
+    """Circuit breaker and running statistics for one backend
+
+    The breaker opens after ``threshold`` consecutive failures. Once
+    ``reset_seconds`` have passed it lets a single trial call through: success
+    closes it, failure keeps it open for another period. Answers that arrive
+    but cannot be parsed count against the model, not the breaker.
+    """
+
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.calls = self.failures = self.invalid = self.answers = self.hedges = 0
+        self.latency_ms = None
+        self.last_error = None
+
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._trial or time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        """Whether a call may go to this backend now; claims the trial call when the breaker is due one"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._trial = True
+                return True
+            return False
+
+    def succeeded(self, latency_ms):
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial = False
+            self.latency_ms = latency_ms if self.latency_ms is None else (
+                LATENCY_SMOOTHING * latency_ms + (1 - LATENCY_SMOOTHING) * self.latency_ms)
+
+    def failed(self, error):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self._trial or self.consecutive_failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def count(self, field):
+        """Add one to a counter: invalid, answers or hedges"""
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        return {"state": self.state(), "calls": self.calls, "failures": self.failures, "invalid": self.invalid,
+                "answers": self.answers, "hedges": self.hedges,
+                "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+                "consecutive_failures": self.consecutive_failures, "last_error": self.last_error}
+
+
+class InferenceRouter:
+    """Sends each request to the healthiest backends in order of preference and returns the first valid answer
+
+    Backends with an open breaker are skipped. A failure or an answer that
+    does not parse moves on to the next backend. With hedging on, a request
+    the current backend has not answered within ``hedge_after_ms`` is also
+    sent to the next one, once per request, and whichever valid answer comes
+    first wins. Calls still running when an answer wins are left to finish on
+    the pool and only update their backend's health.
+    """
+
+    def __init__(self, backends, hedge_after_ms=HEDGE_AFTER_MS, max_workers=INFERENCE_MAX_WORKERS):
+        if not backends:
+            raise ValueError("At least one inference backend is required")
+        self.backends = backends
+        self.hedge_after_ms = hedge_after_ms
+        self.health = {backend.name: BackendHealth() for backend in backends}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+
+    def _call(self, backend, messages, temperature, max_tokens, timeout, parse, size):
+        health = self.health[backend.name]
+        started = time.perf_counter()
+        try:
+            with metrics.span("vision", backend.name) as span:
+                span.size = size
+                content, prompt_tokens, completion_tokens = backend.complete(messages, temperature, max_tokens,
+                                                                             timeout)
+        except Exception as e:
+            health.failed(f"{type(e).__name__}: {e}")
+            raise
+        parse_started = time.perf_counter()
+        health.succeeded((parse_started - started) * 1000)
+        try:
+            result = parse(content)
+        except ValueError:
+            health.count("invalid")
+            raise
+        return result, {"backend": backend.name, "model": backend.model,
+                        "upstream_ms": (parse_started - started) * 1000,
+                        "parse_ms": (time.perf_counter() - parse_started) * 1000,
+                        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+    def complete(self, messages, temperature, max_tokens, timeout, parse=json.loads, size=None):
+        """Return ``(result, info)``: the first valid ``parse(content)`` and which backend produced it
+
+        ``parse`` raises ValueError for an answer that is not usable. ``info``
+        holds the backend and model names, upstream and parse milliseconds,
+        token counts and whether the request was hedged. Raises InferenceError
+        when every backend failed, was skipped or ran out of time.
+        """
+        deadline = time.monotonic() + timeout
+        waiting = list(self.backends)
+        pending = {}
+        errors = []
+        hedged = False
+
+        def launch():
+            while waiting:
+                backend = waiting.pop(0)
+                if self.health[backend.name].allow():
+                    remaining = max(deadline - time.monotonic(), 0.001)
+                    pending[self._executor.submit(self._call, backend, messages, temperature, max_tokens, remaining,
+                                                  parse, size)] = backend
+                    return backend
+                errors.append(f"{backend.name}: skipped while its circuit breaker is open")
+            return None
+
+        launch()
+        hedge_at = time.monotonic() + self.hedge_after_ms / 1000
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                raise InferenceError(f"No inference backend answered within {timeout:g} seconds")
+            can_hedge = self.hedge_after_ms > 0 and not hedged and waiting
+            done, _ = wait(pending, timeout=min(deadline, hedge_at) - now if can_hedge else deadline - now,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                if can_hedge and time.monotonic() >= hedge_at:
+                    hedged = True
+                    backend = launch()
+                    if backend is not None:
+                        self.health[backend.name].count("hedges")
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result, info = future.result()
+                except Exception as e:
+                    errors.append(f"{backend.name}: {str(e)}")
+                    continue
+                self.health[backend.name].count("answers")
+                info["hedged"] = hedged
+                return result, info
+            if not pending and launch() is not None:
+                hedge_at = time.monotonic() + self.hedge_after_ms / 1000
+        raise InferenceError("No inference backend could analyze the image. " + "; ".join(errors))
+
+    def health_snapshot(self):
+        """Return each backend's breaker state and statistics, in order of preference"""
+        return [{"backend": backend.name, "model": backend.model, **self.health[backend.name].snapshot()}
+                for backend in self.backends]
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+SERVICE_TAGS = ["ABC123", "XYZ789", "DEF456"]
+BRANDS = ["Dell", "HP", "Lenovo"]
+
+
+def customer_lookup(client):
+    return "GET /customers", client.get(f"/customers/{random.choice(SERVICE_TAGS)}")
+
+
+def technician_list(client):
+    return "GET /technicians", client.get("/technicians", params={"brand": random.choice(BRANDS)})
+
+
+def slot_search(client):
+    earliest = datetime.now() + timedelta(days=random.randint(0, 14))
+    return "GET /slots", client.get("/slots", params={"brand": random.choice(BRANDS), "address": "Downtown",
+                                                      "earliest": earliest.isoformat(timespec="minutes")})
+
+
+def booking(client):
+    # Random far-future slots keep bookings from piling up on the sample calendars
+    start = datetime(2040, 1, 1, 9) + timedelta(days=random.randint(0, 3650), hours=random.randint(0, 8))
+    return "POST /appointments", client.post("/appointments",
+                                             json={"customer_id": 1, "technician_id": random.randint(1, 5),
+                                                   "service_tag": "ABC123", "issue_description": "Load test",
+                                                   "start": start.isoformat(timespec="minutes")},
+                                             headers={"Idempotency-Key": uuid.uuid4().hex})
+
+
+SCENARIOS = {"customer": customer_lookup, "technicians": technician_list, "slots": slot_search, "book": booking}
+
+
+async def client_loop(client, scenarios, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        name, request = random.choice(scenarios)(client)
+        started = time.perf_counter()
+        try:
+            response = await request
+            statuses[name][response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[name][type(e).__name__] += 1
+            continue
+        latencies[name].append((time.perf_counter() - started) * 1000)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(url, concurrency, duration, scenarios, api_key):
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    headers = {"X-API-Key": api_key} if api_key else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client_loop(client, scenarios, deadline, latencies, statuses)
+                               for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the support API with concurrent clients and report latency.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--scenarios", default="customer,technicians,slots",
+                        help=f"comma-separated mix drawn from: {', '.join(SCENARIOS)} (book writes real appointments)")
+    parser.add_argument("--api-key", help="value for the X-API-Key header")
+    args = parser.parse_args(argv)
+
+    scenarios = [SCENARIOS[name.strip()] for name in args.scenarios.split(",")]
+    latencies, statuses = asyncio.run(run(args.url, args.concurrency, args.duration, scenarios, args.api_key))
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} requests in {args.duration:.0f}s with {args.concurrency} clients: {total / args.duration:.0f} req/s")
+    print(f"{'endpoint':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}  statuses")
+    for name in sorted(statuses):
+        values = latencies[name] or [0.0]
+        print(f"{name:<22}{len(latencies[name]):>8}{percentile(values, 0.5):>10.1f}{percentile(values, 0.99):>10.1f}"
+              f"{statistics.fmean(values):>10.1f}  {dict(statuses[name])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import readcache
+
+# Set METRICS_PORT to serve /metrics from this process; the API serves it on its own port instead
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# One JSON line per span goes to this file ("-" for stderr) when set
+SPAN_LOG_PATH = os.getenv("SPAN_LOG_PATH")
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the shape Prometheus expects"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), cumulative
+
+
+class SpanSeries:
+    """Latency, error and payload-size statistics for one (span, operation) pair"""
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sizes = Histogram(SIZE_BUCKETS)
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+_series = {}
+_series_lock = threading.Lock()
+_span_log = None
+
+
+def _get_series(key):
+    series = _series.get(key)
+    if series is None:
+        with _series_lock:
+            series = _series.setdefault(key, SpanSeries())
+    return series
+
+
+def record(span, operation, seconds, error=None, size=None):
+    """Record one finished span"""
+    series = _get_series((span, operation))
+    with series.lock:
+        series.latency.observe(seconds)
+        if error is not None:
+            series.errors += 1
+        if size is not None:
+            series.sizes.observe(size)
+    if _span_log is not None:
+        _span_log.info(json.dumps({"ts": round(time.time(), 6), "span": span, "operation": operation,
+                                   "duration_ms": round(seconds * 1000, 3), "error": error, "bytes": size}))
+
+
+class span:
+    """Time a block as one span; set ``.size`` inside the block to record a payload size
+
+        with metrics.span("smtp", "send_message") as s:
+            s.size = len(body)
+            ...
+    """
+
+    __slots__ = ("name", "operation", "size", "started")
+
+    def __init__(self, name, operation):
+        self.name = name
+        self.operation = operation
+        self.size = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, self.operation, time.perf_counter() - self.started,
+               None if exc_type is None else f"{exc_type.__name__}: {exc}", self.size)
+        return False
+
+
+def configure_span_log(path=SPAN_LOG_PATH):
+    """Write every span as a JSON line to ``path`` ("-" for stderr); None turns the log off"""
+    global _span_log
+    if not path:
+        _span_log = None
+        return
+    logger = logging.getLogger("hardware.spans")
+    logger.handlers.clear()
+    logger.addHandler(logging.StreamHandler() if path == "-" else logging.FileHandler(path))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _span_log = logger
+
+
+def _labels(**labels):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _histogram_lines(name, labels, histogram):
+    for bound, cumulative in histogram.samples():
+        yield f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}"
+    yield f"{name}_sum{_labels(**labels)} {histogram.sum}"
+    yield f"{name}_count{_labels(**labels)} {histogram.count}"
+
+
+def render_prometheus():
+    """Render every span series and read-through cache in the Prometheus text exposition format"""
+    with _series_lock:
+        items = sorted(_series.items())
+    latency, sizes, errors = [], [], []
+    for (name, operation), series in items:
+        labels = {"span": name, "operation": operation}
+        with series.lock:
+            latency.extend(_histogram_lines("hardware_span_duration_seconds", labels, series.latency))
+            if series.sizes.count:
+                sizes.extend(_histogram_lines("hardware_span_payload_bytes", labels, series.sizes))
+            errors.append(f"hardware_span_errors_total{_labels(**labels)} {series.errors}")
+
+    lines = ["# HELP hardware_span_duration_seconds Latency of instrumented operations.",
+             "# TYPE hardware_span_duration_seconds histogram", *latency,
+             "# HELP hardware_span_payload_bytes Payload size sent or received by instrumented operations.",
+             "# TYPE hardware_span_payload_bytes histogram", *sizes,
+             "# HELP hardware_span_errors_total Instrumented operations that raised.",
+             "# TYPE hardware_span_errors_total counter", *errors]
+    caches = readcache.cache_stats()
+    for field, kind, help_text in (("hits", "counter", "Read-through cache hits."),
+                                   ("misses", "counter", "Read-through cache misses."),
+                                   ("entries", "gauge", "Entries held by a read-through cache."),
+                                   ("bytes", "gauge", "Approximate memory held by a read-through cache.")):
+        name = f"hardware_cache_{field}_total" if kind == "counter" else f"hardware_cache_{field}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_labels(cache=stats['cache'])} {stats[field]}" for stats in caches]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a background thread once per process; does nothing when the port is 0"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None or not port:
+            return _exporter
+        try:
+            _exporter = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError:
+            # Another process on this host (e.g. a second worker) already owns the port
+            logging.getLogger(__name__).exception("Could not serve metrics on %s:%s", host, port)
+            return None
+        _exporter.daemon_threads = True
+        threading.Thread(target=_exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+    return _exporter
+
+
+configure_span_log()
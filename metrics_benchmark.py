@@ -0,0 +1,84 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Runs against a scratch database; set before database is imported so the real one is never touched
+os.environ["HARDWARE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="metrics-bench-"), "bench.db")
+
+import database  # noqa: E402
+import metrics  # noqa: E402
+
+
+def bare(iterations):
+    for _ in range(iterations):
+        pass
+
+
+def spanned(iterations):
+    for _ in range(iterations):
+        with metrics.span("bench", "empty"):
+            pass
+
+
+def lookup(iterations):
+    # A pooled primary-key read, the cheapest hot path that carries a span ("db")
+    for number in range(iterations):
+        with database.connection() as conn:
+            conn.execute("SELECT customer_name FROM customers WHERE id = ?", (number % 100 + 1,)).fetchone()
+
+
+def per_call_ns(body, iterations, threads):
+    """Run ``body`` on ``threads`` threads at once; returns wall-clock ns per call across all of them"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        body(iterations)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - started) * 1e9 / (iterations * threads)
+
+
+def best_of(repeats, body, iterations, threads):
+    return min(per_call_ns(body, iterations, threads) for _ in range(repeats))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure what a metrics span adds to an empty block and to a "
+                                                 "pooled database lookup.")
+    parser.add_argument("--iterations", type=int, default=100000, help="calls per thread for the empty block")
+    parser.add_argument("--lookups", type=int, default=5000, help="calls per thread for the database lookup")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeats", type=int, default=5, help="runs per measurement; the fastest is kept")
+    parser.add_argument("--span-log", action="store_true", help="also write every span as a JSON line")
+    args = parser.parse_args(argv)
+
+    database.migrate()
+    with database.connection() as conn:
+        conn.executemany("INSERT INTO customers (service_tag, customer_name) VALUES (?, ?)",
+                         [(f"BENCH{number:03d}", f"Customer {number}") for number in range(100)])
+    metrics.configure_span_log(os.devnull if args.span_log else None)
+
+    for threads in args.threads:
+        empty = best_of(args.repeats, bare, args.iterations, threads)
+        with_span = best_of(args.repeats, spanned, args.iterations, threads)
+        lookups = [per_call_ns(lookup, args.lookups, threads) for _ in range(args.repeats)]
+        overhead = with_span - empty
+        print(f"{threads:>3} threads   span overhead {overhead:8.0f} ns/call   "
+              f"pooled lookup {min(lookups) / 1000:7.1f} us/call (median {statistics.median(lookups) / 1000:.1f})   "
+              f"span share {overhead / min(lookups):6.2%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
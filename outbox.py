@@ -0,0 +1,225 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+import database
+import metrics
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 30))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
+# Claimed messages not settled within the lease (e.g. the process died mid-send) are retried
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", 600))
+# Close the SMTP session after this long without traffic instead of holding it forever
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", 60))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 30))
+SMTP_PROBE_AFTER_SECONDS = 10
+# Only for relays on a trusted network: log in even when the server offers no STARTTLS
+SMTP_ALLOW_PLAINTEXT_LOGIN = bool(int(os.getenv("SMTP_ALLOW_PLAINTEXT_LOGIN", 0)))
+
+
+def build_message(sender_email, to_email, subject, body):
+    """Wrap a notification body in the standard HTML template"""
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    html = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif;">
+            <div style="background-color: #f5f5f5; padding: 20px;">
+                <div style="background-color: white; border-radius: 5px; padding: 20px; max-width: 600px; margin: 0 auto;">
+                    <h2 style="color: #4a6fa5;">Hardware Support Notification</h2>
+                    <div style="margin: 15px 0;">
+                        {body}
+                    </div>
+                    <p style="color: #666; font-size: 12px;">
+                        This is an automated message. Please do not reply directly.
+                    </p>
+                </div>
+            </div>
+        </body>
+    </html>
+    """
+
+    msg.attach(MIMEText(html, 'html'))
+    return msg
+
+
+def enqueue_email(to_email, subject, body, conn=None):
+    """Queue an email for background delivery and return its outbox id
+
+    Pass ``conn`` to enqueue inside a transaction the caller already holds;
+    the caller then calls wake_worker() once that transaction has committed.
+    """
+    now = time.time()
+    params = (to_email, subject, body, now, now)
+    query = '''INSERT INTO email_outbox
+               (to_email, subject, body, status, attempts, next_attempt_at, created_at)
+               VALUES (?, ?, ?, 'pending', 0, ?, ?)'''
+    if conn is not None:
+        return conn.execute(query, params).lastrowid
+
+    with database.connection() as conn:
+        outbox_id = conn.execute(query, params).lastrowid
+    wake_worker()
+    return outbox_id
+
+
+def get_outbox_stats():
+    """Return the number of outbox messages in each status"""
+    with database.connection() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status").fetchall())
+
+
+class OutboxWorker(threading.Thread):
+    """Background thread delivering queued emails over one long-lived SMTP session"""
+
+    def __init__(self):
+        super().__init__(name="email-outbox", daemon=True)
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.smtp = None
+        self.smtp_last_used = 0.0
+
+    def _connect(self):
+        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+        smtp_port = int(os.getenv("SMTP_PORT", 587))
+        sender_email = os.getenv("SMTP_USER")
+        sender_password = os.getenv("SMTP_PASSWORD")
+
+        server = smtplib.SMTP(smtp_server, smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
+        server.ehlo()
+        if server.has_extn("starttls"):
+            server.starttls()  # Upgrade the connection to a secure encrypted SSL/TLS connection
+            server.ehlo()
+        elif sender_email and sender_password and not SMTP_ALLOW_PLAINTEXT_LOGIN:
+            # The extension may have been stripped on the way; never send the password unencrypted
+            server.close()
+            raise smtplib.SMTPNotSupportedError("The SMTP server does not offer STARTTLS, so the password "
+                                                "would be sent unencrypted. Set SMTP_ALLOW_PLAINTEXT_LOGIN=1 "
+                                                "to allow it.")
+        if sender_email and sender_password:
+            server.login(sender_email, sender_password)
+        return server
+
+    def _session(self):
+        """Return an authenticated SMTP session, reconnecting if it was dropped"""
+        if self.smtp is not None:
+            # Only probe sessions that sat idle long enough for the relay to drop them
+            if time.time() - self.smtp_last_used < SMTP_PROBE_AFTER_SECONDS:
+                return self.smtp
+            try:
+                if self.smtp.noop()[0] == 250:
+                    return self.smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close()
+        self.smtp = self._connect()
+        return self.smtp
+
+    def _close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+    def _claim_batch(self):
+        """Mark a batch of due messages as sending so no other worker picks them up"""
+        now = time.time()
+        with database.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute('''SELECT id, to_email, subject, body, attempts FROM email_outbox
+                                   WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                                   ORDER BY next_attempt_at LIMIT ?''',
+                                (now, OUTBOX_BATCH_SIZE)).fetchall()
+            conn.executemany("UPDATE email_outbox SET status='sending', next_attempt_at=? WHERE id=?",
+                             [(now + OUTBOX_LEASE_SECONDS, row[0]) for row in rows])
+        return rows
+
+    def _record_failure(self, conn, outbox_id, attempts, error):
+        attempts += 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            conn.execute("UPDATE email_outbox SET status='dead', attempts=?, last_error=? WHERE id=?",
+                         (attempts, error, outbox_id))
+        else:
+            retry_at = time.time() + OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+            conn.execute('''UPDATE email_outbox SET status='pending', attempts=?, next_attempt_at=?, last_error=?
+                            WHERE id=?''', (attempts, retry_at, error, outbox_id))
+
+    def deliver_pending(self):
+        """Send every due message in batches; returns the number delivered"""
+        delivered = 0
+        while True:
+            rows = self._claim_batch()
+            if not rows:
+                return delivered
+
+            sender_email = os.getenv("SMTP_USER")
+            results = []
+            for outbox_id, to_email, subject, body, attempts in rows:
+                try:
+                    with metrics.span("smtp", "send_message") as span:
+                        span.size = len(body)
+                        server = self._session()
+                        server.send_message(build_message(sender_email, to_email, subject, body))
+                    self.smtp_last_used = time.time()
+                    results.append((outbox_id, attempts, None))
+                except Exception as e:
+                    logging.getLogger(__name__).exception("Could not send outbox message %s", outbox_id)
+                    results.append((outbox_id, attempts, str(e)))
+                    if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                        self._close()
+
+            with database.connection() as conn:
+                for outbox_id, attempts, error in results:
+                    if error is None:
+                        conn.execute("UPDATE email_outbox SET status='sent', sent_at=?, last_error=NULL WHERE id=?",
+                                     (time.time(), outbox_id))
+                        delivered += 1
+                    else:
+                        self._record_failure(conn, outbox_id, attempts, error)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            try:
+                self.deliver_pending()
+            except Exception:
+                logging.getLogger(__name__).exception("Outbox delivery pass failed")
+            if self.smtp is not None and time.time() - self.smtp_last_used > SMTP_IDLE_SECONDS:
+                self._close()
+            self.wakeup.wait(OUTBOX_POLL_SECONDS)
+        self._close()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Start the process-wide outbox worker once; later calls are no-ops"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker()
+            _worker.start()
+    return _worker
+
+
+def wake_worker():
+    """Ask the worker to deliver immediately instead of waiting for the next poll"""
+    if _worker is not None:
+        _worker.wakeup.set()
@@ -0,0 +1,132 @@
+import argparse
+import os
+import smtplib
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Runs against a scratch database; set before database is imported so the real one is never touched
+os.environ["HARDWARE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="outbox-bench-"), "bench.db")
+
+import database  # noqa: E402
+import outbox  # noqa: E402
+
+
+class StandInSMTP(socketserver.ThreadingTCPServer):
+    """A local SMTP relay that accepts and discards every message
+
+    ``connect_ms`` is spent before the greeting, standing in for the TCP and
+    TLS handshakes with a remote relay; ``reply_ms`` before every reply,
+    standing in for the round trip of each command.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_ms, reply_ms):
+        self.connect_ms = connect_ms
+        self.reply_ms = reply_ms
+        self.sessions = self.accepted = 0
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        time.sleep(self.server.reply_ms / 1000)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.sessions += 1
+        time.sleep(self.server.connect_ms / 1000)
+        self.reply("220 stand-in ESMTP")
+        while line := self.rfile.readline():
+            command = line.decode().strip().split(" ", 1)[0].upper()
+            if command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.accepted += 1
+                self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def send_inline(messages):
+    """Send each message on a session of its own, as send_email did before the outbox; returns per-call ms"""
+    latencies = []
+    for to_email, subject, body in messages:
+        started = time.perf_counter()
+        server = smtplib.SMTP(os.environ["SMTP_SERVER"], int(os.environ["SMTP_PORT"]),
+                              timeout=outbox.SMTP_TIMEOUT_SECONDS)
+        server.ehlo()
+        server.send_message(outbox.build_message(os.environ["SMTP_USER"], to_email, subject, body))
+        server.quit()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def send_through_outbox(messages):
+    """Queue every message, then deliver them with one worker pass; returns per-enqueue ms and delivery seconds"""
+    latencies = []
+    for to_email, subject, body in messages:
+        started = time.perf_counter()
+        outbox.enqueue_email(to_email, subject, body)
+        latencies.append((time.perf_counter() - started) * 1000)
+    worker = outbox.OutboxWorker()
+    started = time.perf_counter()
+    delivered = worker.deliver_pending()
+    seconds = time.perf_counter() - started
+    worker._close()
+    assert delivered == len(messages), f"delivered {delivered} of {len(messages)}"
+    return latencies, seconds
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure email throughput sent inline, one SMTP session per "
+                                                 "message, against the outbox worker reusing one session.")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--connect-ms", type=float, default=20, help="simulated connection and TLS setup")
+    parser.add_argument("--reply-ms", type=float, default=1, help="simulated round trip per SMTP command")
+    args = parser.parse_args(argv)
+
+    relay = StandInSMTP(args.connect_ms, args.reply_ms)
+    threading.Thread(target=relay.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    os.environ.update({"SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(relay.server_address[1]),
+                       "SMTP_USER": "support@example.com"})
+    os.environ.pop("SMTP_PASSWORD", None)
+    database.migrate()
+    messages = [(f"customer{number}@example.com", "Appointment Confirmation", f"<p>Visit {number}</p>")
+                for number in range(args.messages)]
+
+    try:
+        started = time.perf_counter()
+        inline = send_inline(messages)
+        inline_seconds = time.perf_counter() - started
+        inline_sessions = relay.sessions
+        print(f"inline, session per message   {len(messages) / inline_seconds:>8.0f} msgs/s   "
+              f"{inline_sessions} sessions   caller waits p50 {statistics.median(inline):7.2f} ms   "
+              f"p99 {percentile(inline, 0.99):7.2f} ms")
+
+        enqueue, outbox_seconds = send_through_outbox(messages)
+        print(f"outbox, one reused session    {len(messages) / outbox_seconds:>8.0f} msgs/s   "
+              f"{relay.sessions - inline_sessions} sessions   caller waits p50 "
+              f"{statistics.median(enqueue):7.2f} ms   p99 {percentile(enqueue, 0.99):7.2f} ms")
+    finally:
+        relay.shutdown()
+        relay.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
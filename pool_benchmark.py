@@ -0,0 +1,140 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Runs against a scratch database; set before database is imported so the real one is never touched
+os.environ["HARDWARE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="pool-bench-"), "bench.db")
+
+import database  # noqa: E402
+import scheduling  # noqa: E402
+import service  # noqa: E402
+
+
+class ConnectionPerCall(database.ConnectionPool):
+    """Opens a plain connection for every unit of work and closes it after, as the app did before the pool"""
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=database.DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+
+    def acquire(self):
+        return self._connect()
+
+    def release(self, conn):
+        conn.close()
+
+
+def seed(customers, technicians):
+    service.init_db()
+    with database.connection() as conn:
+        conn.executemany('''INSERT INTO customers (service_tag, customer_name, customer_email, laptop_model,
+                                                   warranty_end_date, warranty_valid)
+                            VALUES (?, ?, ?, 'Dell XPS 13', '2030-01-01', 1)''',
+                         [(f"BENCH{number:06d}", f"Customer {number}", f"c{number}@example.com")
+                          for number in range(customers)])
+        conn.executemany('''INSERT INTO technicians (name, specialization, location, rating, available, password)
+                            VALUES (?, ?, 'Downtown', ?, 1, 'pw')''',
+                         [(f"Technician {number}", ("Dell", "HP", "Lenovo")[number % 3], 4 + number % 10 / 10)
+                          for number in range(technicians)])
+    with database.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM technicians")]
+
+
+def lookup(rng, customers, technician_ids):
+    # Straight to the loaders, so every call reaches the database instead of the read-through caches
+    service._load_customer(f"BENCH{rng.randrange(customers):06d}")
+    return "lookup"
+
+
+def technicians(rng, customers, technician_ids):
+    scheduling._load_technicians(rng.choice(("Dell", "HP", "Lenovo")))
+    return "technicians"
+
+
+def booking(rng, customers, technician_ids):
+    # Random far-future slots keep conflicts rare, so the write path itself is measured
+    start = datetime(2040, 1, 1, 9) + timedelta(days=rng.randrange(3650), hours=rng.randrange(9))
+    try:
+        scheduling.book_appointment(1, rng.choice(technician_ids), "ABC123", "Benchmark", start)
+    except scheduling.SlotUnavailableError:
+        return "booking (slot taken)"
+    return "booking"
+
+
+def run(threads, seconds, booking_share, customers, technician_ids):
+    """Run the mix on ``threads`` threads for ``seconds``; returns latencies per operation and errors"""
+    latencies, errors = defaultdict(list), defaultdict(int)
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+    deadline = [0.0]
+
+    def worker(number):
+        rng = random.Random(number)
+        mine, failed = defaultdict(list), defaultdict(int)
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            roll = rng.random()
+            operation = booking if roll < booking_share else technicians if roll < 0.3 else lookup
+            started = time.perf_counter()
+            try:
+                name = operation(rng, customers, technician_ids)
+            except sqlite3.Error as e:
+                failed[f"{operation.__name__}: {e}"] += 1
+                continue
+            mine[name].append((time.perf_counter() - started) * 1000)
+        with lock:
+            for name, values in mine.items():
+                latencies[name] += values
+            for name, count in failed.items():
+                errors[name] += count
+
+    pool = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    deadline[0] = time.perf_counter() + seconds + 0.05
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare concurrent lookups and bookings with and without the "
+                                                 "connection pool.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    parser.add_argument("--booking-share", type=float, default=0.1, help="share of operations that book")
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--technicians", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    technician_ids = seed(args.customers, args.technicians)
+    variants = {"connection per call": ConnectionPerCall(database.DB_PATH),
+                "pool": database.ConnectionPool(database.DB_PATH)}
+    for threads in args.threads:
+        for label, pool in variants.items():
+            database._pool = pool
+            latencies, errors = run(threads, args.seconds, args.booking_share, args.customers, technician_ids)
+            total = sum(len(values) for values in latencies.values())
+            print(f"{threads:>3} threads, {label:<20} {total / args.seconds:>9.0f} ops/s")
+            for name, values in sorted(latencies.items()):
+                print(f"      {name:<22} {len(values):>8}   p50 {statistics.median(values):7.2f} ms   "
+                      f"p99 {percentile(values, 0.99):7.2f} ms")
+            for name, count in errors.items():
+                print(f"      error x{count}: {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,483 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import defect_analysis
+import defect_result
+import inference
+
+# Regression gate for compare: the candidate fails when it is worse than the baseline by more than these
+MAX_LATENCY_REGRESSION = float(os.getenv("EVAL_MAX_LATENCY_REGRESSION", 0.10))
+MAX_TOKEN_REGRESSION = float(os.getenv("EVAL_MAX_TOKEN_REGRESSION", 0.10))
+MAX_ACCURACY_DROP = float(os.getenv("EVAL_MAX_ACCURACY_DROP", 0.02))
+MAX_PARSE_FAILURE_INCREASE = float(os.getenv("EVAL_MAX_PARSE_FAILURE_INCREASE", 0.0))
+
+# Summary metrics shown by compare: name -> True when higher is better
+METRICS = {
+    "detection_accuracy": True,
+    "severity_accuracy": True,
+    "type_accuracy": True,
+    "component_recall": True,
+    "parse_failure_rate": False,
+    "repair_rate": False,
+    "incomplete_rate": False,
+    "error_rate": False,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "prompt_tokens_mean": False,
+    "completion_tokens_mean": False,
+    "payload_bytes_mean": False,
+    "request_bytes_mean": False,
+}
+
+STUB_DEFECT_TYPES = ["crack", "burn mark", "liquid damage", "bent pin", "swollen battery"]
+STUB_COMPONENTS = ["screen", "keyboard", "motherboard", "battery", "hinge", "charging port"]
+STUB_TILE_EDGE = 336
+# Ways the stub garbles an answer, all of which defect_result.decode can repair
+STUB_MALFORMATIONS = [
+    lambda answer: f"Here is the analysis of the image:\n{json.dumps(answer)}",
+    lambda answer: f"```json\n{json.dumps(answer, indent=2)}\n```",
+    lambda answer: repr(answer),
+    lambda answer: json.dumps(answer).replace("]", ",]"),
+]
+STUB_TOKENS_PER_TILE = 144
+
+
+def load_corpus(manifest):
+    """Read a labeled image corpus from a JSON Lines manifest
+
+    Each line labels one image, e.g. ``{"image": "cracked_lid.jpg",
+    "defect_detected": true, "defect_type": "crack", "severity": "High",
+    "affected_components": ["screen"]}``. Image paths are relative to the
+    manifest; only ``image`` and ``defect_detected`` are required.
+    """
+    base = os.path.dirname(os.path.abspath(manifest))
+    corpus = []
+    with open(manifest) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            label = json.loads(line)
+            if "image" not in label or "defect_detected" not in label:
+                raise ValueError(f"{manifest}:{number}: a label needs image and defect_detected")
+            with open(os.path.join(base, label["image"]), 'rb') as image:
+                corpus.append((label, image.read()))
+    return corpus
+
+
+def _stub_answer(digest):
+    """A deterministic analysis chosen by the image digest, so repeated runs get identical answers"""
+    detected = digest[0] % 3 != 0
+    if not detected:
+        return {"defect_detected": "No", "defect_type": "None", "severity": "None", "affected_components": []}
+    return {"defect_detected": "Yes",
+            "defect_type": STUB_DEFECT_TYPES[digest[1] % len(STUB_DEFECT_TYPES)],
+            "severity": defect_analysis.SEVERITY_LEVELS[digest[2] % len(defect_analysis.SEVERITY_LEVELS)],
+            "affected_components": [STUB_COMPONENTS[digest[3] % len(STUB_COMPONENTS)]]}
+
+
+def _read_image_url(image_url):
+    """Return an image's tokens, estimated as a vision model counts them, and a fingerprint of its content
+
+    The tokens are a fixed count per 336 px tile plus one downscaled overview.
+    The fingerprint is an average hash of a 4x4 grayscale copy, so the same
+    photo prepared at another size or quality gets the same stub answer.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(base64.b64decode(image_url.partition(",")[2])))
+    width, height = image.size
+    pixels = image.convert("L").resize((4, 4), Image.BOX).tobytes()
+    average = sum(pixels) / len(pixels)
+    fingerprint = bytes(pixel > average for pixel in pixels)
+    tokens = (math.ceil(width / STUB_TILE_EDGE) * math.ceil(height / STUB_TILE_EDGE) + 1) * STUB_TOKENS_PER_TILE
+    return tokens, hashlib.sha256(fingerprint).digest()
+
+
+class StubVisionServer:
+    """A local stand-in for the vision API that answers deterministically
+
+    Its answers come from a fingerprint of the image, so it measures the cost
+    of a prompt, payload and max_tokens setting, not accuracy. Latency is
+    ``latency_ms`` plus ``ms_per_kb`` per KB of request and ``ms_per_token``
+    per completion token. Text tokens are estimated at four characters each.
+    A completion longer than max_tokens is cut off mid-JSON as a real model's
+    would be. ``malformed_rate`` of the images get near-JSON answers (prose,
+    code fences, Python literals or trailing commas), ``incomplete_rate`` of
+    them answers missing one field, and ``failure_rate`` of all requests,
+    drawn at random, fail with a 503. A follow-up asking for specific keys
+    gets just those keys.
+    The settings are plain attributes, so a test can change them mid-run to
+    inject a slowdown or an outage.
+    """
+
+    def __init__(self, latency_ms=50.0, ms_per_kb=0.5, ms_per_token=1.0, malformed_rate=0.0, failure_rate=0.0,
+                 incomplete_rate=0.0, port=0):
+        self.latency_ms = latency_ms
+        self.ms_per_kb = ms_per_kb
+        self.ms_per_token = ms_per_token
+        self.malformed_rate = malformed_rate
+        self.failure_rate = failure_rate
+        self.incomplete_rate = incomplete_rate
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, reply = stub.handle(self.path, body)
+                payload = json.dumps(reply).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05},
+                                        name="stub-vision", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, path, body):
+        """Answer one chat completion request; returns ``(status, reply)``"""
+        if not path.rstrip("/").endswith("/chat/completions"):
+            return 404, {"error": {"message": f"Unknown path {path}"}}
+        self.requests += 1
+        if random.random() < self.failure_rate:
+            time.sleep(self.latency_ms / 1000)
+            return 503, {"error": {"message": "Injected failure"}}
+        request = json.loads(body)
+        # A re-ask follows the photo with the earlier answer and the follow-up as plain-text turns
+        parts = []
+        for message in request["messages"]:
+            content = message["content"]
+            parts += content if isinstance(content, list) else [{"type": "text", "text": content}]
+        prompt = "".join(part.get("text", "") for part in parts if part.get("type") == "text")
+        image_url = "".join(part["image_url"]["url"] for part in parts if part.get("type") == "image_url")
+        image_tokens, digest = _read_image_url(image_url)
+
+        answer = _stub_answer(digest)
+        asked = re.search(r"only these keys: ([\w, ]+)$", parts[-1].get("text", ""))
+        if asked:
+            content = json.dumps({key: answer[key] for key in asked.group(1).split(", ") if key in answer})
+        else:
+            if answer["defect_detected"] == "Yes" and digest[7] / 256 < self.incomplete_rate:
+                del answer[defect_result.FIELDS[1 + digest[6] % 3]]
+            content = json.dumps(answer)
+            if digest[4] / 256 < self.malformed_rate:
+                content = STUB_MALFORMATIONS[digest[5] % len(STUB_MALFORMATIONS)](answer)
+        completion_tokens = math.ceil(len(content) / 4)
+        max_tokens = request.get("max_tokens") or completion_tokens
+        if completion_tokens > max_tokens:
+            content, completion_tokens = content[:max_tokens * 4], max_tokens
+        prompt_tokens = math.ceil(len(prompt) / 4) + image_tokens
+
+        time.sleep((self.latency_ms + self.ms_per_kb * len(body) / 1024 + self.ms_per_token * completion_tokens)
+                   / 1000)
+        return 200, {
+            "id": f"stub-{digest.hex()[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop" if completion_tokens < max_tokens else "length",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+def score(result, label):
+    """Compare one analysis, as validated by defect_result.check, with its label
+
+    Fields the answer lacked score as wrong; fields that are unlabeled or do
+    not apply score None.
+    """
+    result = result or {}
+    labeled_defect = defect_result.is_defect(label["defect_detected"])
+    predicted_defect = result.get("defect_detected")
+    predicted_type = str(result.get("defect_type") or "").lower()
+    predicted_severity = result.get("severity")
+    predicted_components = result.get("affected_components") or ()
+
+    scores = {"detection_correct": predicted_defect == labeled_defect, "severity_correct": None,
+              "type_correct": None, "component_recall": None}
+    if not labeled_defect:
+        return scores
+    if label.get("severity"):
+        scores["severity_correct"] = predicted_severity == defect_result.normalize_severity(label["severity"])
+    if label.get("defect_type"):
+        scores["type_correct"] = str(label["defect_type"]).lower() in predicted_type
+    components = defect_result.normalize_components(label.get("affected_components"))
+    if components:
+        scores["component_recall"] = sum(component in predicted_components for component in components) / len(components)
+    return scores
+
+
+def evaluate_image(backend, config, label, payload, mime_type):
+    """Send one prepared image and return its measurements and scores"""
+    messages = defect_analysis.build_messages(payload, mime_type, config["prompt"])
+    record = {"image": label["image"], "payload_bytes": len(payload), "request_bytes": len(json.dumps(messages)),
+              "latency_ms": None, "prompt_tokens": None, "completion_tokens": None, "parse_failed": False,
+              "repaired": False, "missing": [], "error": None, "result": None}
+    started = time.perf_counter()
+    try:
+        content, record["prompt_tokens"], record["completion_tokens"] = backend.complete(
+            messages, config["temperature"], config["max_tokens"], defect_analysis.ANALYSIS_TIMEOUT_SECONDS)
+        record["latency_ms"] = (time.perf_counter() - started) * 1000
+        try:
+            answer, record["repaired"] = defect_result.decode(content)
+            record["result"], record["missing"] = defect_result.check(answer)
+        except ValueError:
+            record["parse_failed"] = True
+    except Exception as e:
+        record["latency_ms"] = (time.perf_counter() - started) * 1000
+        record["error"] = str(e)
+    record.update(score(record["result"], label))
+    return record
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return statistics.fmean(values) if values else None
+
+
+def summarize(records):
+    """Aggregate per-image records into the metrics compared between runs
+
+    Parse failures and errors count as wrong answers in every accuracy
+    metric. Parse failures are answers even defect_result.decode cannot
+    recover; repaired answers needed its repairs and incomplete ones lacked
+    a field, which analyze_image would ask for again.
+    """
+    answered = [record for record in records if record["error"] is None]
+    latencies = [record["latency_ms"] for record in answered]
+    summary = {
+        "requests": len(records),
+        "errors": len(records) - len(answered),
+        "parse_failures": sum(record["parse_failed"] for record in records),
+        "error_rate": (len(records) - len(answered)) / len(records) if records else None,
+        "parse_failure_rate": sum(record["parse_failed"] for record in records) / len(records) if records else None,
+        "repair_rate": sum(record["repaired"] for record in records) / len(records) if records else None,
+        "incomplete_rate": sum(bool(record["missing"]) for record in records) / len(records) if records else None,
+        "latency_p50_ms": percentile(latencies, 0.5),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "latency_max_ms": max(latencies) if latencies else None,
+        "prompt_tokens_mean": _mean(record["prompt_tokens"] for record in answered),
+        "completion_tokens_mean": _mean(record["completion_tokens"] for record in answered),
+        "payload_bytes_mean": _mean(record["payload_bytes"] for record in records),
+        "request_bytes_mean": _mean(record["request_bytes"] for record in records),
+        "detection_accuracy": _mean(float(record["detection_correct"]) for record in records),
+        "severity_accuracy": _mean(None if record["severity_correct"] is None else float(record["severity_correct"])
+                                   for record in records),
+        "type_accuracy": _mean(None if record["type_correct"] is None else float(record["type_correct"])
+                               for record in records),
+        "component_recall": _mean(record["component_recall"] for record in records),
+    }
+    tokens = [(record["prompt_tokens"] or 0) + (record["completion_tokens"] or 0) for record in answered]
+    summary["total_tokens"] = sum(tokens)
+    return summary
+
+
+def run_eval(corpus, backend, config, repeat=1, workers=1):
+    """Replay the corpus through a backend ``repeat`` times and return the run: config, records and summary
+
+    Images are prepared with the run's image settings before any timing starts.
+    """
+    prepared = []
+    for label, image_bytes in corpus:
+        _, payload, mime_type = defect_analysis.prepare_image(image_bytes, config["image_max_edge"],
+                                                              config["image_format"], config["image_quality"])
+        prepared.append((label, payload, mime_type))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prompt-eval") as pool:
+        records = list(pool.map(lambda item: evaluate_image(backend, config, *item), prepared * repeat))
+    return {"created_at": time.time(), "backend": backend.name, "config": config,
+            "seconds": round(time.perf_counter() - started, 3), "summary": summarize(records), "records": records}
+
+
+def compare(baseline, candidate, max_latency_regression=MAX_LATENCY_REGRESSION,
+            max_token_regression=MAX_TOKEN_REGRESSION, max_accuracy_drop=MAX_ACCURACY_DROP,
+            max_parse_failure_increase=MAX_PARSE_FAILURE_INCREASE):
+    """Return ``(rows, failures)``: one (metric, baseline, candidate, change) row per metric and the gates broken
+
+    Latency and tokens are gated on relative change, accuracy and parse
+    failures on absolute change.
+    """
+    before, after = baseline["summary"], candidate["summary"]
+    rows = []
+    for metric in METRICS:
+        old, new = before.get(metric), after.get(metric)
+        rows.append((metric, old, new, None if old is None or new is None else new - old))
+
+    def relative(metric):
+        old, new = before.get(metric), after.get(metric)
+        return (new - old) / old if old and new is not None else 0.0
+
+    def drop(metric):
+        old, new = before.get(metric), after.get(metric)
+        return old - new if old is not None and new is not None else 0.0
+
+    failures = []
+    if relative("latency_p95_ms") > max_latency_regression:
+        failures.append(f"p95 latency rose {relative('latency_p95_ms'):.1%} (limit {max_latency_regression:.0%})")
+    old_tokens = (before.get("prompt_tokens_mean") or 0) + (before.get("completion_tokens_mean") or 0)
+    new_tokens = (after.get("prompt_tokens_mean") or 0) + (after.get("completion_tokens_mean") or 0)
+    tokens = (new_tokens - old_tokens) / old_tokens if old_tokens else 0.0
+    if tokens > max_token_regression:
+        failures.append(f"tokens per request rose {tokens:.1%} (limit {max_token_regression:.0%})")
+    for metric in ("detection_accuracy", "severity_accuracy", "type_accuracy", "component_recall"):
+        if drop(metric) > max_accuracy_drop:
+            failures.append(f"{metric} fell {drop(metric):.3f} (limit {max_accuracy_drop:.3f})")
+    for metric in ("parse_failure_rate", "error_rate"):
+        if -drop(metric) > max_parse_failure_increase:
+            failures.append(f"{metric} rose {-drop(metric):.3f} (limit {max_parse_failure_increase:.3f})")
+    return rows, failures
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if abs(value) < 10 else f"{value:.1f}"
+
+
+def print_summary(run):
+    config = run["config"]
+    summary = run["summary"]
+    print(f"{run['backend']} {config['model']} temperature={config['temperature']} max_tokens={config['max_tokens']} "
+          f"image={config['image_max_edge']}px {config['image_format']} q{config['image_quality']}: "
+          f"{summary['requests']} requests in {run['seconds']:.1f}s")
+    for metric in METRICS:
+        print(f"  {metric:<24}{_format(summary.get(metric)):>12}")
+
+
+def print_comparison(rows, failures):
+    print(f"{'metric':<24}{'baseline':>12}{'candidate':>12}{'change':>12}")
+    for metric, old, new, change in rows:
+        print(f"{metric:<24}{_format(old):>12}{_format(new):>12}{_format(change):>12}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+
+def _load_run(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _gate_args(parser):
+    parser.add_argument("--max-latency-regression", type=float, default=MAX_LATENCY_REGRESSION,
+                        help="allowed relative rise in p95 latency")
+    parser.add_argument("--max-token-regression", type=float, default=MAX_TOKEN_REGRESSION,
+                        help="allowed relative rise in tokens per request")
+    parser.add_argument("--max-accuracy-drop", type=float, default=MAX_ACCURACY_DROP,
+                        help="allowed absolute fall in each accuracy metric")
+    parser.add_argument("--max-parse-failure-increase", type=float, default=MAX_PARSE_FAILURE_INCREASE,
+                        help="allowed absolute rise in the parse failure and error rates")
+
+
+def _gate(args, baseline, candidate):
+    rows, failures = compare(baseline, candidate, args.max_latency_regression, args.max_token_regression,
+                             args.max_accuracy_drop, args.max_parse_failure_increase)
+    print_comparison(rows, failures)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the defect-analysis prompt against a labeled image corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="replay the corpus and record latency, tokens, payload and accuracy")
+    run.add_argument("manifest", help="JSON Lines file labeling one image per line")
+    run.add_argument("--backend", choices=["stub", *inference.BACKEND_TYPES], default="stub",
+                     help="stub starts a local deterministic stand-in; groq calls the real API; "
+                          "openai calls an OpenAI-compatible server at --base-url")
+    run.add_argument("--base-url", help="server to send groq or openai requests to")
+    run.add_argument("--model", default=defect_analysis.ANALYSIS_MODEL)
+    run.add_argument("--prompt-file", help="read the prompt from this file instead of ANALYSIS_PROMPT")
+    run.add_argument("--temperature", type=float, default=defect_analysis.ANALYSIS_TEMPERATURE)
+    run.add_argument("--max-tokens", type=int, default=defect_analysis.ANALYSIS_MAX_TOKENS)
+    run.add_argument("--image-max-edge", type=int, default=defect_analysis.IMAGE_MAX_EDGE)
+    run.add_argument("--image-format", default=defect_analysis.IMAGE_FORMAT)
+    run.add_argument("--image-quality", type=int, default=defect_analysis.IMAGE_QUALITY)
+    run.add_argument("--repeat", type=int, default=1, help="times to replay the corpus")
+    run.add_argument("--workers", type=int, default=1, help="concurrent requests; 1 gives the cleanest latency")
+    run.add_argument("--stub-latency-ms", type=float, default=50.0)
+    run.add_argument("--stub-ms-per-kb", type=float, default=0.5)
+    run.add_argument("--stub-ms-per-token", type=float, default=1.0)
+    run.add_argument("--stub-malformed-rate", type=float, default=0.0)
+    run.add_argument("--stub-failure-rate", type=float, default=0.0)
+    run.add_argument("--stub-incomplete-rate", type=float, default=0.0)
+    run.add_argument("--output", help="save the run here as JSON for later comparison")
+    run.add_argument("--baseline", help="compare with this saved run and fail on a regression")
+    _gate_args(run)
+
+    diff = commands.add_parser("compare", help="compare two saved runs and fail on a regression")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    _gate_args(diff)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        return _gate(args, _load_run(args.baseline), _load_run(args.candidate))
+
+    prompt = defect_analysis.ANALYSIS_PROMPT
+    if args.prompt_file:
+        with open(args.prompt_file) as f:
+            prompt = f.read()
+    config = {"model": args.model, "prompt": prompt, "temperature": args.temperature, "max_tokens": args.max_tokens,
+              "image_max_edge": args.image_max_edge, "image_format": args.image_format.upper(),
+              "image_quality": args.image_quality}
+    corpus = load_corpus(args.manifest)
+
+    if args.backend == "stub":
+        with StubVisionServer(args.stub_latency_ms, args.stub_ms_per_kb, args.stub_ms_per_token,
+                              args.stub_malformed_rate, args.stub_failure_rate, args.stub_incomplete_rate) as stub:
+            result = run_eval(corpus, inference.GroqBackend("stub", args.model, stub.url), config, args.repeat,
+                              args.workers)
+    elif args.backend == "openai" and not args.base_url:
+        parser.error("--backend openai needs --base-url")
+    else:
+        backend = inference.BACKEND_TYPES[args.backend](args.backend, args.model, base_url=args.base_url)
+        result = run_eval(corpus, backend, config, args.repeat, args.workers)
+
+    print_summary(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1)
+    if args.baseline:
+        print()
+        return _gate(args, _load_run(args.baseline), result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
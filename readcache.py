@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Writes in this process invalidate entries immediately; other processes see them within the TTL
+LOOKUP_CACHE_SECONDS = float(os.getenv("LOOKUP_CACHE_SECONDS", 30))
+LOOKUP_CACHE_MAX_ENTRIES = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", 10000))
+
+_caches = {}
+
+
+def approximate_size(value):
+    """Estimate the bytes held by a value built from tuples, lists, dicts and scalars"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(approximate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    return size
+
+
+class ReadThroughCache:
+    """Thread-safe, size-bounded TTL cache that loads missing keys with ``loader(key)``
+
+    Values are shared by every caller, so loaders should return immutable rows
+    (tuples) and callers build fresh dicts from them.
+    """
+
+    def __init__(self, name, loader, ttl=LOOKUP_CACHE_SECONDS, max_entries=LOOKUP_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a load that raced with one is not stored
+        self._generation = 0
+        self.hits = self.misses = self.invalidations = self.bytes = 0
+        _caches[name] = self
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = self.loader(key)
+        size = approximate_size(key) + approximate_size(value)
+        with self._lock:
+            if generation == self._generation:
+                self._discard(key)
+                self._entries[key] = (value, now + self.ttl, size)
+                self.bytes += size
+                while len(self._entries) > self.max_entries:
+                    self._discard(next(iter(self._entries)))
+        return value
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.bytes -= entry[2]
+
+    def invalidate(self, key=None):
+        """Forget one key, or every key when none is given"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+                self.bytes = 0
+            else:
+                self._discard(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"cache": self.name, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                    "invalidations": self.invalidations, "entries": len(self._entries), "bytes": self.bytes}
+
+
+def cache_stats():
+    """Return hit rate and memory footprint for every read-through cache in this process"""
+    return [cache.stats() for cache in _caches.values()]
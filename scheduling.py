@@ -0,0 +1,265 @@
+import bisect
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import database
+import defect_reports
+import outbox
+import readcache
+
+# Every visit books one slot of this length on the technician's calendar
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", 60))
+WORKDAY_START = os.getenv("WORKDAY_START", "09:00")
+WORKDAY_END = os.getenv("WORKDAY_END", "18:00")
+SCHEDULING_WINDOW_DAYS = int(os.getenv("SCHEDULING_WINDOW_DAYS", 30))
+# New bookings are picked up on every search; a full reload also catches cancellations
+CALENDAR_RELOAD_SECONDS = float(os.getenv("CALENDAR_RELOAD_SECONDS", 300))
+
+# Ranking weights: a technician scores up to RATING_WEIGHT for a 5-star rating,
+# PROXIMITY_WEIGHT for serving the customer's area and loses up to LOAD_WEIGHT
+# when fully booked; each day a slot lies past the preferred time costs DELAY_WEIGHT
+RATING_WEIGHT = float(os.getenv("RATING_WEIGHT", 1.0))
+PROXIMITY_WEIGHT = float(os.getenv("PROXIMITY_WEIGHT", 0.5))
+LOAD_WEIGHT = float(os.getenv("LOAD_WEIGHT", 0.5))
+DELAY_WEIGHT = float(os.getenv("DELAY_WEIGHT", 0.1))
+
+
+class SlotUnavailableError(Exception):
+    """Raised when the requested technician slot is already booked"""
+
+
+def to_minutes(hhmm):
+    """Convert an HH:MM string to minutes since midnight"""
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def to_hhmm(minutes):
+    """Convert minutes since midnight to an HH:MM string"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class TechnicianCalendar:
+    """In-memory interval index of booked slots per technician and day
+
+    Each (technician, day) maps to the sorted start minutes of its bookings.
+    All bookings last SLOT_MINUTES, so a slot starting at ``s`` is free when no
+    booking starts strictly between ``s - SLOT_MINUTES`` and ``s + SLOT_MINUTES``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._starts = {}
+        self._load = Counter()
+        self._last_id = 0
+        self._window = None
+        self._loaded_at = 0.0
+        # Set until the first load and by invalidate(); the age check alone is not enough, as the clock
+        # behind time.monotonic() may have started less than CALENDAR_RELOAD_SECONDS ago
+        self._stale = True
+
+    def _add(self, technician_id, appointment_date, minute):
+        bisect.insort(self._starts.setdefault((technician_id, appointment_date), []), minute)
+        self._load[technician_id] += 1
+
+    def _reload(self, conn, start, end):
+        # Later rows are left to _catch_up so none is counted twice
+        last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM appointments").fetchone()[0]
+        rows = conn.execute('''SELECT technician_id, appointment_date, appointment_time FROM appointments
+                               WHERE appointment_date >= ? AND appointment_date < ? AND status != 'Cancelled'
+                               AND id <= ?''', (start, end, last_id)).fetchall()
+        self._starts, self._load = {}, Counter()
+        for technician_id, appointment_date, appointment_time in rows:
+            self._add(technician_id, appointment_date, to_minutes(appointment_time))
+        self._last_id = last_id
+        self._window = (start, end)
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    def _catch_up(self, conn, start, end):
+        rows = conn.execute('''SELECT id, technician_id, appointment_date, appointment_time, status FROM appointments
+                               WHERE id > ?''', (self._last_id,)).fetchall()
+        for appointment_id, technician_id, appointment_date, appointment_time, status in rows:
+            self._last_id = max(self._last_id, appointment_id)
+            if status != 'Cancelled' and start <= appointment_date < end:
+                self._add(technician_id, appointment_date, to_minutes(appointment_time))
+
+    def sync(self, today=None):
+        """Bring the index up to date for the scheduling window starting today"""
+        start = today or date.today()
+        window = (start.isoformat(), (start + timedelta(days=SCHEDULING_WINDOW_DAYS + 1)).isoformat())
+        with self._lock, database.connection() as conn:
+            if (self._stale or self._window != window
+                    or time.monotonic() - self._loaded_at > CALENDAR_RELOAD_SECONDS):
+                self._reload(conn, *window)
+            else:
+                self._catch_up(conn, *window)
+
+    def invalidate(self):
+        """Force a full reload on the next sync, e.g. after an appointment is cancelled or moved"""
+        with self._lock:
+            self._stale = True
+
+    def is_free(self, technician_id, appointment_date, minute):
+        starts = self._starts.get((technician_id, appointment_date), ())
+        i = bisect.bisect_right(starts, minute - SLOT_MINUTES)
+        return i == len(starts) or starts[i] >= minute + SLOT_MINUTES
+
+    def load(self, technician_id):
+        """Number of bookings the technician has within the window"""
+        return self._load[technician_id]
+
+
+_calendar = TechnicianCalendar()
+
+
+def get_calendar():
+    """Return the process-wide technician calendar"""
+    return _calendar
+
+
+def proximity(technician_location, customer_address):
+    """Score 1.0 when the technician's service area is named in the customer's address"""
+    if not technician_location or not customer_address:
+        return 0.0
+    return 1.0 if technician_location.lower() in customer_address.lower() else 0.0
+
+
+def _open_slots(calendar, technician_id, earliest, last_day):
+    """Yield the technician's free slot start times from ``earliest`` onwards, in order"""
+    day_start, day_end = to_minutes(WORKDAY_START), to_minutes(WORKDAY_END)
+    day = earliest.date()
+    first = max(day_start, earliest.hour * 60 + earliest.minute)
+    while day <= last_day:
+        day_iso = day.isoformat()
+        # Align to the slot grid for the day
+        minute = day_start + -(-(first - day_start) // SLOT_MINUTES) * SLOT_MINUTES
+        while minute + SLOT_MINUTES <= day_end:
+            if calendar.is_free(technician_id, day_iso, minute):
+                yield datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+            minute += SLOT_MINUTES
+        day += timedelta(days=1)
+        first = day_start
+
+
+TECHNICIAN_COLUMNS = ['id', 'name', 'email', 'phone', 'specialization', 'location', 'rating', 'available']
+
+
+def _load_technicians(brand):
+    with database.connection() as conn:
+        return tuple(conn.execute(f'''SELECT {', '.join(TECHNICIAN_COLUMNS)} FROM technicians
+                                      WHERE specialization=? AND available=1 ORDER BY rating DESC''',
+                                   (brand,)).fetchall())
+
+
+technician_cache = readcache.ReadThroughCache("technicians_by_brand", _load_technicians)
+
+
+def available_technicians(brand):
+    """Return the available technicians for a brand, best rated first, through the shared cache"""
+    return [dict(zip(TECHNICIAN_COLUMNS, row)) for row in technician_cache.get(brand)]
+
+
+def find_open_slots(brand, customer_address="", earliest=None, limit=5, per_technician=2):
+    """Return the best ``limit`` open slots for a brand, highest score first
+
+    Technicians are ranked by rating, whether they serve the customer's area
+    and how booked up they are; a slot's score is its technician's score less
+    DELAY_WEIGHT per day after ``earliest``. Technicians are visited best
+    first and the search stops once no remaining technician can beat the
+    slots already found.
+    """
+    now = datetime.now()
+    earliest = max(earliest or now, now)
+    last_day = now.date() + timedelta(days=SCHEDULING_WINDOW_DAYS)
+
+    calendar = get_calendar()
+    calendar.sync()
+
+    capacity = (to_minutes(WORKDAY_END) - to_minutes(WORKDAY_START)) // SLOT_MINUTES * SCHEDULING_WINDOW_DAYS
+    candidates = []
+    for technician in available_technicians(brand):
+        score = (RATING_WEIGHT * (technician['rating'] or 0) / 5
+                 + PROXIMITY_WEIGHT * proximity(technician['location'], customer_address)
+                 - LOAD_WEIGHT * min(calendar.load(technician['id']) / capacity, 1.0))
+        candidates.append((score, technician))
+    candidates.sort(key=lambda candidate: -candidate[0])
+
+    best = []  # min-heap of (score, tiebreak, slot)
+    for order, (score, technician) in enumerate(candidates):
+        if len(best) == limit and score <= best[0][0]:
+            break
+        for n, start in enumerate(_open_slots(calendar, technician['id'], earliest, last_day)):
+            slot_score = score - DELAY_WEIGHT * (start - earliest).total_seconds() / 86400
+            if n == per_technician or (len(best) == limit and slot_score <= best[0][0]):
+                break
+            entry = (slot_score, -(order * per_technician + n), {"technician": technician, "start": start,
+                                                                   "score": round(slot_score, 4)})
+            if len(best) < limit:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heapreplace(best, entry)
+
+    return [entry[2] for entry in sorted(best, reverse=True)]
+
+
+def has_conflict(conn, technician_id, appointment_date, appointment_time):
+    """Check the database for a booking overlapping the given slot"""
+    minute = to_minutes(appointment_time)
+    row = conn.execute('''SELECT 1 FROM appointments
+                          WHERE technician_id=? AND appointment_date=? AND status != 'Cancelled'
+                          AND appointment_time BETWEEN ? AND ? LIMIT 1''',
+                       (technician_id, appointment_date, to_hhmm(max(minute - SLOT_MINUTES + 1, 0)),
+                        to_hhmm(min(minute + SLOT_MINUTES - 1, 24 * 60 - 1)))).fetchone()
+    return row is not None
+
+
+def book_appointment(customer_id, technician_id, service_tag, issue_description, appointment_datetime,
+                     idempotency_key=None, confirmation=None, defect=None, defect_report_id=None):
+    """Insert an appointment unless the technician is already booked at that time
+
+    The availability check, the insert and the optional ``confirmation``
+    email, given as ``(to_email, subject, body)``, share one write
+    transaction: two concurrent bookings cannot both take the same slot and
+    the email is queued exactly when the booking commits. Retrying with the
+    same ``idempotency_key`` returns the original appointment id without
+    booking or emailing again. Raises SlotUnavailableError when the slot is taken.
+    ``defect`` is the photo analysis the booking came from, if any; its type
+    and severity feed the analytics rollups. ``defect_report_id`` names the
+    saved report of that analysis, which is linked to the new appointment.
+    """
+    appointment_date = appointment_datetime.strftime("%Y-%m-%d")
+    appointment_time = appointment_datetime.strftime("%H:%M")
+    defect = defect or {}
+    defect_type = str(defect["defect_type"]) if defect.get("defect_type") else None
+    severity = str(defect["severity"]).strip().capitalize() if defect.get("severity") else None
+
+    with database.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        if idempotency_key is not None:
+            row = conn.execute("SELECT id FROM appointments WHERE idempotency_key=?", (idempotency_key,)).fetchone()
+            if row:
+                return row[0]
+        if has_conflict(conn, technician_id, appointment_date, appointment_time):
+            raise SlotUnavailableError("This technician is already booked at that time.")
+        appointment_id = conn.execute('''INSERT INTO appointments
+                                         (customer_id, technician_id, service_tag, issue_description,
+                                          appointment_date, appointment_time, status, idempotency_key,
+                                          created_at, updated_at, defect_type, severity)
+                                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                      (customer_id, technician_id, service_tag, issue_description,
+                                       appointment_date, appointment_time, "Scheduled",
+                                       idempotency_key, now, now, defect_type, severity)).lastrowid
+        if defect_report_id is not None:
+            defect_reports.link_report(conn, defect_report_id, appointment_id, service_tag)
+        if confirmation is not None:
+            outbox.enqueue_email(*confirmation, conn=conn)
+
+    if confirmation is not None:
+        outbox.wake_worker()
+    return appointment_id
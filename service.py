@@ -0,0 +1,394 @@
+import os
+import threading
+import time
+
+import admin_tables
+import bulk_io
+import catalog
+import database
+import defect_analysis
+import defect_reports
+import metrics
+import outbox
+import readcache
+import scheduling
+import service_centers
+import service_tags
+import technician_schedule
+import warranty
+
+SAMPLE_CUSTOMERS = [
+    ("ABC123", "John Doe", "vaishnavi.m@ubtiinc.com", "555-1001", "123 Main St, New York",
+     "Dell XPS 15", "2023-01-15", "2025-12-31", 1),
+    ("XYZ789", "Jane Smith", "vaishnavi.m@ubtiinc.com", "555-1002", "456 Oak Ave, Chicago",
+     "HP Spectre x360", "2022-06-30", "2023-06-30", 0),
+    ("DEF456", "Mike Johnson", "vaishnavi.m@ubtiinc.com", "555-1003", "789 Pine Rd, Los Angeles",
+     "Lenovo ThinkPad X1", "2024-02-20", "2026-02-20", 1)
+]
+
+SAMPLE_TECHNICIANS = [
+    ("Alex Chen", "vaishnavi.m@ubtiinc.com", "555-2001", "Dell", "Downtown", 4.8, 1, "tech123"),
+    ("Sarah Williams", "vaishnavi.m@ubtiinc.com", "555-2002", "HP", "Midtown", 4.6, 1, "tech123"),
+    ("David Kim", "vaishnavi.m@ubtiinc.com", "555-2003", "Lenovo", "Uptown", 4.9, 1, "tech123"),
+    ("Priya Patel", "vaishnavi.m@ubtiinc.com", "555-2004", "Dell", "Suburb", 4.7, 1, "tech123"),
+    ("James Wilson", "vaishnavi.m@ubtiinc.com", "555-2005", "HP", "City Center", 4.5, 1, "tech123")
+]
+
+CUSTOMER_COLUMNS = ['id', 'service_tag', 'customer_name', 'customer_email', 'customer_phone',
+                    'customer_address', 'laptop_model', 'purchase_date', 'warranty_end_date', 'warranty_valid']
+TECHNICIAN_COLUMNS = ['id', 'name', 'email', 'phone', 'specialization', 'location', 'rating', 'available']
+
+
+class NotFoundError(Exception):
+    """Raised when a customer, technician or appointment does not exist"""
+
+
+# Setup
+def init_db():
+    """Apply migrations and seed the sample data and brand catalog into an empty database"""
+    database.migrate()
+
+    with database.connection() as conn:
+        if conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0] == 0:
+            conn.executemany(f'''INSERT INTO customers
+                                 (service_tag, customer_name, customer_email, customer_phone, customer_address,
+                                  laptop_model, purchase_date, warranty_end_date, warranty_valid, warranty_changed_at)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {database.UNIX_NOW})''', SAMPLE_CUSTOMERS)
+
+        if conn.execute("SELECT COUNT(*) FROM technicians").fetchone()[0] == 0:
+            conn.executemany('''INSERT INTO technicians
+                                (name, email, phone, specialization, location, rating, available, password)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', SAMPLE_TECHNICIANS)
+
+        catalog.seed_catalog(conn)
+
+
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+
+def bootstrap():
+    """Prepare the database and start this process's background workers
+
+    Only the first call in a process does any work, so the Streamlit script can
+    call this on every rerun.
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        init_db()
+        defect_analysis.purge_stale_cache()
+        warranty.start_nightly_refresh()
+        outbox.start_worker()
+        if os.getenv("SERPER_API_KEY"):
+            service_centers.start_refresh_job(os.getenv("SERPER_API_KEY"))
+        metrics.start_exporter()
+        _bootstrapped = True
+
+
+# Read-through caches for the lookups every rerun repeats; the write paths below invalidate them
+def _load_customer(service_tag):
+    with database.connection() as conn:
+        return conn.execute(f"SELECT {', '.join(CUSTOMER_COLUMNS)} FROM customers WHERE service_tag=?",
+                            (service_tag,)).fetchone()
+
+
+customer_cache = readcache.ReadThroughCache("customers_by_service_tag", _load_customer)
+
+
+# Invalidate after the write commits, or a concurrent reader could cache the old row again
+def _service_tag_of(conn, customer_id):
+    row = conn.execute("SELECT service_tag FROM customers WHERE id=?", (customer_id,)).fetchone()
+    return row[0] if row else None
+
+
+# Customers
+def get_customer_by_service_tag(service_tag):
+    """Retrieve customer details from database using service tag"""
+    customer = customer_cache.get(service_tags.normalize_service_tag(service_tag))
+
+    if customer:
+        customer = dict(zip(CUSTOMER_COLUMNS, customer))
+        # Derive the status from the end date so a lapsed warranty is never served as active
+        customer['warranty_valid'] = int(warranty.is_warranty_valid(customer['warranty_end_date']))
+        return customer
+    return None
+
+
+def update_customer_address(customer_id, address):
+    """Update the service address stored for a customer"""
+    with database.connection() as conn:
+        conn.execute("UPDATE customers SET customer_address=? WHERE id=?", (address, customer_id))
+        service_tag = _service_tag_of(conn, customer_id)
+    customer_cache.invalidate(service_tag)
+
+
+def get_customer_email(customer_id):
+    """Look up the email address of a customer"""
+    with database.connection() as conn:
+        row = conn.execute("SELECT customer_email FROM customers WHERE id=?", (customer_id,)).fetchone()
+    return row[0] if row else None
+
+
+def add_customer(service_tag, name, email, phone, address, model, purchase_date, warranty_end_date):
+    """Insert a customer record
+
+    Raises service_tags.InvalidServiceTagError for an empty service tag and
+    sqlite3.IntegrityError for a duplicate one.
+    """
+    service_tag = service_tags.require_service_tag(service_tag)
+    with database.connection() as conn:
+        conn.execute(f'''INSERT INTO customers
+                         (service_tag, customer_name, customer_email, customer_phone, customer_address,
+                          laptop_model, purchase_date, warranty_end_date, warranty_valid, warranty_changed_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {database.UNIX_NOW})''',
+                     (service_tag, name, email, phone, address, model,
+                      purchase_date, warranty_end_date, int(warranty.is_warranty_valid(warranty_end_date))))
+    # A lookup of this tag before it existed is cached as "not found"
+    customer_cache.invalidate(service_tag)
+    admin_tables.invalidate_counts("customers")
+
+
+def delete_customer(customer_id):
+    """Delete a customer record"""
+    with database.connection() as conn:
+        service_tag = _service_tag_of(conn, customer_id)
+        conn.execute("DELETE FROM customers WHERE id=?", (customer_id,))
+    customer_cache.invalidate(service_tag)
+    admin_tables.invalidate_counts()
+
+
+# Technicians
+def authenticate_technician(tech_id, password):
+    """Return the technician matching the given ID and password, or None"""
+    with database.connection() as conn:
+        technician = conn.execute(f"SELECT {', '.join(TECHNICIAN_COLUMNS)} FROM technicians WHERE id=? AND password=?",
+                                  (tech_id, password)).fetchone()
+    return dict(zip(TECHNICIAN_COLUMNS, technician)) if technician else None
+
+
+def add_technician(name, email, phone, specialization, location, rating, available, password):
+    """Insert a technician record"""
+    with database.connection() as conn:
+        conn.execute('''INSERT INTO technicians
+                        (name, email, phone, specialization, location, rating, available, password)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (name, email, phone, specialization, location, rating, int(available), password))
+    scheduling.technician_cache.invalidate(specialization)
+    admin_tables.invalidate_counts("technicians")
+
+
+def list_technicians(brand):
+    """Return the available technicians for a brand, best rated first"""
+    return scheduling.available_technicians(brand)
+
+
+def get_technician_schedule(technician_id, window="Upcoming", offset=0):
+    """Return a technician's appointments in a Today, This week or Upcoming window, earliest first
+
+    Repeated calls only fetch the appointments changed since the previous one.
+    """
+    start, end = technician_schedule.window_bounds(window, offset)
+    return technician_schedule.get_schedule(technician_id).appointments(start, end)
+
+
+# Bulk import and export
+def import_records(table, source, fmt="csv", rejects=None):
+    """Upsert customers or technicians from a CSV or Parquet file; see bulk_io.import_file"""
+    def forget_cached_rows():
+        # Each chunk commits on its own, so readers see it at once rather than after the whole file or the TTL
+        if table == "customers":
+            customer_cache.invalidate()
+        elif table == "technicians":
+            scheduling.technician_cache.invalidate()
+        admin_tables.invalidate_counts(table)
+
+    return bulk_io.import_file(table, source, fmt, rejects, on_commit=forget_cached_rows)
+
+
+def export_records(table, fmt="csv", filters=None, sort="id", descending=False):
+    """Export an admin table as CSV or Parquet into a rewound temporary file"""
+    return bulk_io.export_file(table, fmt, filters, sort, descending)
+
+
+def iter_export_csv(table, filters=None, sort="id", descending=False):
+    """Stream an admin table as CSV byte chunks"""
+    return bulk_io.iter_csv(table, filters, sort, descending)
+
+
+def find_appointment_slots(brand, customer_address, preferred_datetime, limit=5):
+    """Return the best open technician slots at or after the preferred time"""
+    return scheduling.find_open_slots(brand, customer_address, preferred_datetime, limit=limit)
+
+
+def schedule_appointment(customer_id, technician_id, service_tag, issue_description, appointment_datetime,
+                         idempotency_key=None, defect=None, defect_report_id=None):
+    """Book an appointment and queue its confirmation email in one transaction
+
+    Raises NotFoundError for an unknown customer or technician,
+    service_tags.InvalidServiceTagError for an empty service tag and
+    scheduling.SlotUnavailableError if the slot is already taken.
+    """
+    service_tag = service_tags.require_service_tag(service_tag)
+    with database.connection() as conn:
+        customer = conn.execute("SELECT customer_email, customer_address FROM customers WHERE id=?",
+                                (customer_id,)).fetchone()
+        technician = conn.execute("SELECT name, phone FROM technicians WHERE id=?", (technician_id,)).fetchone()
+    if customer is None or technician is None:
+        raise NotFoundError("Unknown customer or technician.")
+
+    email_body = f"""
+    <p>Your appointment has been scheduled successfully!</p>
+    <p><strong>Details:</strong></p>
+    <ul>
+        <li>Date: {appointment_datetime.strftime('%B %d, %Y')}</li>
+        <li>Time: {appointment_datetime.strftime('%I:%M %p')}</li>
+        <li>Technician: {technician[0]}</li>
+        <li>Contact: {technician[1]}</li>
+        <li>Address: {customer[1]}</li>
+    </ul>
+    <p>Our technician will call you before the scheduled visit.</p>
+    """
+    confirmation = (customer[0], "Appointment Confirmation", email_body) if customer[0] else None
+    appointment_id = scheduling.book_appointment(customer_id, technician_id, service_tag,
+                                                 issue_description, appointment_datetime,
+                                                 idempotency_key, confirmation, defect, defect_report_id)
+    admin_tables.invalidate_counts("appointments")
+
+    return appointment_id
+
+
+def update_appointment_statuses(appointment_ids, status, technician_id=None, notify=False):
+    """Move several appointments to ``status`` in one write transaction and return the ids that changed
+
+    Pass ``technician_id`` to only touch that technician's appointments. With
+    ``notify``, appointments newly Completed queue their completion email in
+    the same transaction, so completing one twice sends one email.
+    """
+    appointment_ids = sorted({int(appointment_id) for appointment_id in appointment_ids})
+    if not appointment_ids:
+        return []
+    placeholders = ", ".join("?" * len(appointment_ids))
+    now = time.time()
+    with database.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        query = f'''SELECT a.id, a.status, a.service_tag, a.issue_description, c.customer_email, t.name
+                     FROM appointments a
+                     LEFT JOIN customers c ON a.customer_id = c.id
+                     LEFT JOIN technicians t ON a.technician_id = t.id
+                     WHERE a.id IN ({placeholders})'''
+        params = list(appointment_ids)
+        if technician_id is not None:
+            query += " AND a.technician_id = ?"
+            params.append(int(technician_id))
+        changed = [row for row in conn.execute(query, params).fetchall() if row[1] != status]
+        if not changed:
+            return []
+        conn.execute(f'''UPDATE appointments
+                         SET status=?, completed_at = CASE WHEN ?='Completed' THEN COALESCE(completed_at, ?) END
+                         WHERE id IN ({", ".join("?" * len(changed))})''',
+                     [status, status, now, *(row[0] for row in changed)])
+
+        emails = 0
+        if notify and status == "Completed":
+            for _, _, service_tag, issue_description, customer_email, technician_name in changed:
+                if not customer_email:
+                    continue
+                email_body = f"""
+                <p>Your service appointment has been completed!</p>
+                <p><strong>Details:</strong></p>
+                <ul>
+                    <li>Technician: {technician_name}</li>
+                    <li>Service Tag: {service_tag}</li>
+                    <li>Issue: {issue_description}</li>
+                </ul>
+                <p>Please contact us if you have any questions about your repair.</p>
+                """
+                outbox.enqueue_email(customer_email, "Service Completed", email_body, conn=conn)
+                emails += 1
+
+    if emails:
+        outbox.wake_worker()
+    admin_tables.invalidate_counts("appointments")
+    scheduling.get_calendar().invalidate()
+    return [row[0] for row in changed]
+
+
+def update_appointment_status(appointment_id, status):
+    """Set the status of an appointment"""
+    update_appointment_statuses([appointment_id], status)
+
+
+def complete_appointment(appointment_id):
+    """Mark an appointment completed and queue the completion email in the same transaction
+
+    Completing an appointment twice sends one email. Raises NotFoundError for
+    an unknown appointment.
+    """
+    with database.connection() as conn:
+        exists = conn.execute("SELECT 1 FROM appointments WHERE id=?", (appointment_id,)).fetchone()
+    if exists is None:
+        raise NotFoundError(f"Appointment {appointment_id} not found.")
+    update_appointment_statuses([appointment_id], "Completed", notify=True)
+
+
+# Warranty, service centers and defect analysis
+def get_warranty_renewal_info(brand):
+    """Get warranty renewal information for a specific brand"""
+    return catalog.get_renewal_info(brand)
+
+
+def find_service_centers(brand, location):
+    """Find the authorized service centers nearest a city, PIN code or address
+
+    Raises ServiceCenterLookupError when a search is needed and fails, which
+    includes SERPER_API_KEY not being set.
+    """
+    return service_centers.lookup_service_centers(brand, location, os.getenv("SERPER_API_KEY"))
+
+
+def get_service_center_directory_stats():
+    """Return the size and geocoding coverage of the service center directory"""
+    return service_centers.get_directory_stats()
+
+
+def analyze_photo(image_bytes):
+    """Analyze an uploaded photo for defects and save the result as a defect report
+
+    Returns the analysis with the new report's id under ``report_id``. Raises
+    AnalysisError on failure or timeout.
+    """
+    started = time.perf_counter()
+    image, prepared, mime_type = defect_analysis.prepare_image(image_bytes)
+    result = defect_analysis.analyze_upload(prepared, mime_type)
+    report_id = save_defect_report(result, [(image, prepared, result, None, (time.perf_counter() - started) * 1000)])
+    return dict(result.to_dict(), report_id=report_id)
+
+
+def get_inference_health():
+    """Return the circuit breaker state and statistics of every inference backend, in order of preference"""
+    return defect_analysis.get_backend_health()
+
+
+def save_defect_report(report, images):
+    """Persist a finished analysis; see defect_reports.save_report for the shape of ``images``"""
+    return defect_reports.save_report(report, images)
+
+
+def get_device_defect_reports(service_tags):
+    """Return the saved defect reports of each device, newest first, keyed by service tag"""
+    return defect_reports.reports_for_devices(service_tags)
+
+
+def get_defect_report_thumbnails(report_ids):
+    """Return the photo thumbnails of each report, keyed by report id"""
+    return defect_reports.get_thumbnails(report_ids)
+
+
+def search_defect_reports(severity=None, component=None, service_tag=None, limit=50):
+    """Return the newest defect reports with the given severity, affected component and device"""
+    return defect_reports.search_reports(severity, component, service_tags.normalize_service_tag(service_tag),
+                                         limit)
@@ -0,0 +1,138 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Runs against a scratch database; set before database is imported so the real one is never touched
+os.environ["HARDWARE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="service-center-bench-"), "bench.db")
+
+import database  # noqa: E402
+import gazetteer  # noqa: E402
+import geoindex  # noqa: E402
+import service_centers  # noqa: E402
+
+BRANDS = ["Dell", "HP", "Lenovo", "Apple", "Asus", "Acer", "Microsoft", "Samsung"]
+
+
+def synthetic_centers(count, brands, rng):
+    """Scatter centers around gazetteer cities, bigger cities first, within about 15 km of their centres"""
+    weights = [1 / (rank + 1) for rank in range(len(gazetteer.PLACES))]
+    centers = []
+    for number in range(count):
+        name, _, latitude, longitude, _, _ = rng.choices(gazetteer.PLACES, weights)[0]
+        centers.append({"brand": rng.choice(brands), "name": f"Service center {number}",
+                        "address": f"Shop {number}, Main Road, {name}", "phone": None, "link": "",
+                        "city": name, "latitude": latitude + rng.gauss(0, 0.07),
+                        "longitude": longitude + rng.gauss(0, 0.07), "geocoded_by": "places"})
+    return centers
+
+
+def synthetic_queries(count, brands, rng):
+    """City names, alternative names and PIN codes, as customers type them"""
+    queries = []
+    for _ in range(count):
+        name, _, _, _, prefixes, aliases = rng.choice(gazetteer.PLACES)
+        kind = rng.random()
+        if kind < 0.4:
+            prefix = rng.choice(prefixes)
+            text = prefix + "".join(rng.choices("0123456789", k=6 - len(prefix)))
+        elif kind < 0.6 and aliases:
+            text = rng.choice(aliases).title()
+        else:
+            text = name
+        queries.append((rng.choice(brands), text))
+    return queries
+
+
+def brute_force(points, latitude, longitude, k, max_km):
+    found = sorted((geoindex.haversine_km(latitude, longitude, lat, lon), key) for key, (lat, lon) in points.items())
+    return [(distance, key) for distance, key in found if distance <= max_km][:k]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {"p50": statistics.median(samples), "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))]}
+
+
+def time_each(function, arguments):
+    timings, results = [], []
+    for args in arguments:
+        started = time.perf_counter()
+        results.append(function(*args))
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark nearest service center queries against a brute-force scan.")
+    parser.add_argument("--centers", type=int, default=20000, help="synthetic centers to index")
+    parser.add_argument("--brands", type=int, default=5, help="brands to spread them over")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=service_centers.SERVICE_CENTER_RESULTS)
+    parser.add_argument("--radius-km", type=float, default=service_centers.SERVICE_CENTER_RADIUS_KM)
+    parser.add_argument("--cell-degrees", type=float, default=geoindex.GRID_CELL_DEGREES)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    brands = BRANDS[:args.brands]
+    centers = synthetic_centers(args.centers, brands, rng)
+    queries = synthetic_queries(args.queries, brands, rng)
+
+    started = time.perf_counter()
+    indexes, points = {}, {}
+    for key, center in enumerate(centers):
+        brand = center["brand"].lower()
+        indexes.setdefault(brand, geoindex.GridIndex(args.cell_degrees)).insert(key, center["latitude"],
+                                                                                 center["longitude"])
+        points.setdefault(brand, {})[key] = (center["latitude"], center["longitude"])
+    build_ms = (time.perf_counter() - started) * 1000
+
+    geocode_us, places = time_each(lambda text: gazetteer.geocode(text)[0], [(text,) for _, text in queries])
+    located = [(brand.lower(), place.latitude, place.longitude)
+               for (brand, _), place in zip(queries, places) if place is not None]
+    grid_us, grid_results = time_each(
+        lambda brand, lat, lon: indexes[brand].nearest(lat, lon, args.k, args.radius_km), located)
+    scan_us, scan_results = time_each(
+        lambda brand, lat, lon: brute_force(points[brand], lat, lon, args.k, args.radius_km), located)
+    mismatches = sum([key for _, key in grid] != [key for _, key in scan]
+                     for grid, scan in zip(grid_results, scan_results))
+
+    # The whole lookup as the app makes it: geocode, cache row check and directory query, with no network
+    database.migrate()
+    with database.connection() as conn:
+        conn.executemany('''INSERT INTO service_centers
+                            (brand, name, address, phone, link, city, latitude, longitude, geocoded_by,
+                             first_seen, last_seen)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         [(center["brand"], center["name"], center["address"], center["phone"], center["link"],
+                           center["city"], center["latitude"], center["longitude"], center["geocoded_by"],
+                           time.time(), time.time()) for center in centers])
+
+    def lookup(brand, text):
+        try:
+            return service_centers.lookup_service_centers(brand, text, None)
+        except service_centers.ServiceCenterLookupError:
+            # Nothing stored near the place, so the app would search Serper
+            return None
+
+    lookup(*queries[0])
+    lookup_us, answers = time_each(lookup, queries)
+
+    print(f"{args.centers} centers over {len(brands)} brands, {len(indexes[brands[0].lower()].cells)} cells of "
+          f"{args.cell_degrees:g} degrees for {brands[0]}; index built in {build_ms:.1f} ms")
+    print(f"{len(located)} of {len(queries)} queries geocoded; k={args.k} within {args.radius_km:g} km")
+    for label, samples in (("geocode", geocode_us), ("grid nearest", grid_us), ("brute-force scan", scan_us),
+                           ("lookup_service_centers", lookup_us)):
+        stats = percentiles(samples)
+        print(f"  {label:<24} p50 {stats['p50']:9.1f} us   p99 {stats['p99']:9.1f} us")
+    print(f"{sum(answer is None for answer in answers)} lookups found nothing nearby and would search Serper; "
+          f"grid and scan disagree on {mismatches} queries")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,498 @@
+import json
+import logging
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import gazetteer
+import metrics
+from geoindex import GridIndex
+from ratelimit import TokenBucket
+
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+SERPER_TIMEOUT_SECONDS = float(os.getenv("SERPER_TIMEOUT_SECONDS", 10))
+SERPER_RATE_PER_SECOND = float(os.getenv("SERPER_RATE_PER_SECOND", 5))
+SERPER_BURST = int(os.getenv("SERPER_BURST", 10))
+# Results younger than the TTL are served as-is; older ones up to the stale
+# window are served immediately while a refresh runs in the background
+SERVICE_CENTER_TTL_SECONDS = int(os.getenv("SERVICE_CENTER_TTL_SECONDS", 24 * 3600))
+SERVICE_CENTER_STALE_SECONDS = int(os.getenv("SERVICE_CENTER_STALE_SECONDS", 7 * 24 * 3600))
+SERVICE_CENTER_RESULTS = int(os.getenv("SERVICE_CENTER_RESULTS", 3))
+# Centers farther than this from the place asked about are not offered
+SERVICE_CENTER_RADIUS_KM = float(os.getenv("SERVICE_CENTER_RADIUS_KM", 50))
+# How often the in-memory directory picks up centers stored by other processes, and fully reloads
+SERVICE_CENTER_CHECK_SECONDS = float(os.getenv("SERVICE_CENTER_CHECK_SECONDS", 30))
+SERVICE_CENTER_RELOAD_SECONDS = float(os.getenv("SERVICE_CENTER_RELOAD_SECONDS", 3600))
+SERVICE_CENTER_SYNC_OVERLAP_SECONDS = float(os.getenv("SERVICE_CENTER_SYNC_OVERLAP_SECONDS", 2))
+# The refresh job searches again for up to a batch of stale areas per run
+SERVICE_CENTER_REFRESH_SECONDS = float(os.getenv("SERVICE_CENTER_REFRESH_SECONDS", 3600))
+SERVICE_CENTER_REFRESH_BATCH = int(os.getenv("SERVICE_CENTER_REFRESH_BATCH", 20))
+# Centers no search has returned for this long are taken to have closed
+SERVICE_CENTER_EXPIRY_SECONDS = int(os.getenv("SERVICE_CENTER_EXPIRY_SECONDS", 90 * 24 * 3600))
+
+DIRECTORY_COLUMNS = ['id', 'brand', 'name', 'address', 'phone', 'link', 'city', 'latitude', 'longitude',
+                     'geocoded_by', 'last_seen']
+# Runs of digits that may hold a phone number, including any +91 and the spaces, dashes and brackets between groups
+_PHONE_RUN = re.compile(r"\+?\d[\d\s()\-]{6,}\d")
+_SEGMENT_SPLIT = re.compile(r"\s*[·|•\n]\s*|(?<=[a-z)])\.\s+(?=[A-Z])")
+_ADDRESS_LABEL = re.compile(r"^(?:address|addr|location)\s*:\s*", re.I)
+_CONTACT_LABEL = re.compile(r"\b(?:phone|tel|call|ph|mobile|contact)\b", re.I)
+_ADDRESS_WORDS = re.compile(r"\b(?:road|rd|street|st|nagar|floor|building|bldg|complex|plaza|mall|tower|near|opp|"
+                            r"opposite|sector|block|layout|cross|main|marg|chowk|lane|colony|phase|shop|no)\b", re.I)
+
+
+class ServiceCenterLookupError(Exception):
+    """Raised when the Serper API cannot be queried"""
+
+
+_rate_limiter = TokenBucket(SERPER_RATE_PER_SECOND, SERPER_BURST)
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="service-center-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the shared HTTP session so connections to Serper are kept alive"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Imported here so processes that never look up service centers skip it
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+                session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+                _session = session
+    return _session
+
+
+def normalize_query(brand, location):
+    """Build the cache key for a (brand, location) pair"""
+    return f"{' '.join(brand.lower().split())}|{' '.join(location.lower().split())}"
+
+
+def _format_phone(groups):
+    digits = "".join(groups).lstrip("+")
+    if digits.startswith(("1800", "1860")) and len(digits) in (10, 11):
+        return " ".join(group.lstrip("+") for group in groups)
+    if groups[0].startswith("+") and not digits.startswith("91"):
+        return None
+    if len(digits) == 12 and digits.startswith("91") or len(digits) == 11 and digits.startswith("0"):
+        prefixed = True
+    elif len(digits) == 10:
+        prefixed = False
+    else:
+        return None
+    national = digits[-10:]
+    if national[0] == "0":
+        return None
+    skip, kept = len(digits) - 10, []
+    for group in (group.lstrip("+") for group in groups):
+        if skip >= len(group):
+            skip -= len(group)
+            continue
+        kept.append(group[skip:])
+        skip = 0
+    # A landline's STD code is written apart from the number; keep the writer's grouping
+    if prefixed and len(kept) > 1 and len(kept[0]) <= 4:
+        return "+91 " + " ".join(kept)
+    if national[0] in "6789":
+        return f"+91 {national[:5]} {national[5:]}"
+    # A landline needs its trunk 0 or +91 to be told apart from other ten-digit numbers
+    return "+91 " + " ".join(kept) if prefixed else None
+
+
+def _find_phone(snippet):
+    # A run of digits may join a PIN code and a phone number, so the groups of each run are tried from the
+    # earliest and longest; returns the formatted number and the span of its groups, or (None, None)
+    for run in _PHONE_RUN.finditer(snippet or ""):
+        groups = list(re.finditer(r"\+?\d+", run.group()))
+        for start in range(len(groups)):
+            for end in range(len(groups), start, -1):
+                phone = _format_phone([group.group() for group in groups[start:end]])
+                if phone:
+                    return phone, (run.start() + groups[start].start(), run.start() + groups[end - 1].end())
+    return None, None
+
+
+def extract_phone(snippet):
+    """Return the first Indian mobile, landline or toll-free number in a text, written from +91, or None"""
+    return _find_phone(snippet)[0]
+
+
+def extract_address(snippet):
+    """Return the part of a search snippet that reads most like a street address, or ""
+
+    The phone number extract_phone finds is cut out first, so one written
+    straight after the address is not kept with it. Segments are scored on
+    holding a PIN code, a known city, street words and comma-separated
+    parts; one scoring below three is not an address.
+    """
+    snippet = snippet or ""
+    _, span = _find_phone(snippet)
+    if span:
+        # Cut at a segment break so text on either side of the number stays apart
+        snippet = f"{snippet[:span[0]]}\n{snippet[span[1]:]}"
+    best, best_score = "", 2
+    for segment in _SEGMENT_SPLIT.split(snippet):
+        segment = _CONTACT_LABEL.split(_ADDRESS_LABEL.sub("", segment.strip()))[0].strip(" ,.:-")
+        score = (3 * bool(gazetteer.find_pin(segment)) + 2 * bool(gazetteer.find_place(segment))
+                 + len(_ADDRESS_WORDS.findall(segment)) + (segment.count(",") >= 2))
+        if score > best_score:
+            best, best_score = segment, score
+    return best
+
+
+def parse_service_centers(response):
+    """Turn a Serper response into geocoded service center records
+
+    Local results ("places") come with an address, phone number and
+    coordinates; web results ("organic") have them extracted from the
+    snippet and are geocoded from the gazetteer by PIN code or city name.
+    """
+    service_centers = []
+
+    for result in response.get('places', []):
+        latitude, longitude = result.get('latitude'), result.get('longitude')
+        address = ' '.join(str(result.get('address') or '').split())
+        place, method = gazetteer.geocode(address)
+        if latitude is not None and longitude is not None:
+            method = 'places'
+        elif place:
+            latitude, longitude = place.latitude, place.longitude
+        service_centers.append({
+            'name': result.get('title', ''),
+            'address': address,
+            'phone': extract_phone(result.get('phoneNumber', '')),
+            'link': result.get('website') or result.get('link', ''),
+            'city': place.name if place else None,
+            'latitude': latitude,
+            'longitude': longitude,
+            'geocoded_by': method
+        })
+
+    for result in response.get('organic', []):
+        snippet = result.get('snippet', '')
+        address = extract_address(snippet)
+        # The address is the surest guide; titles often name the area, snippets any city they mention
+        for text in (address, result.get('title', ''), snippet):
+            place, method = gazetteer.geocode(text)
+            if place:
+                break
+        service_centers.append({
+            'name': result.get('title', ''),
+            'address': address,
+            'phone': extract_phone(snippet),
+            'link': result.get('link', ''),
+            'city': place.name if place else None,
+            'latitude': place.latitude if place else None,
+            'longitude': place.longitude if place else None,
+            'geocoded_by': method
+        })
+
+    return [center for center in service_centers if center['name']]
+
+
+def fetch_service_centers(brand, location, api_key):
+    """Query Serper for authorized service centers, bypassing the cache"""
+    if not api_key:
+        raise ServiceCenterLookupError("API key for Serper is not set.")
+    if not _rate_limiter.acquire(SERPER_TIMEOUT_SECONDS):
+        raise ServiceCenterLookupError("Too many service center lookups, please try again shortly.")
+
+    headers = {
+        'X-API-KEY': api_key,
+        'Content-Type': 'application/json'
+    }
+    data = {
+        'q': f'{brand} authorized service centers in {location}, India',
+        'gl': 'in',  # Set geolocation to India
+        'hl': 'en'
+    }
+
+    with metrics.span("serper", "search") as span:
+        response = get_session().post(SERPER_URL, headers=headers, json=data, timeout=SERPER_TIMEOUT_SECONDS)
+        span.size = len(response.content)
+    if response.status_code != 200:
+        raise ServiceCenterLookupError(f"Failed to fetch data from the API. Status code: {response.status_code}")
+
+    return parse_service_centers(response.json())
+
+
+class ServiceCenterDirectory:
+    """Every stored service center, with a spatial index per brand for nearest-center queries
+
+    Like a technician schedule it is kept current by fetching only the rows
+    stored since the last check, made at most every
+    SERVICE_CENTER_CHECK_SECONDS; a full reload every
+    SERVICE_CENTER_RELOAD_SECONDS also drops expired centers.
+    """
+
+    def __init__(self):
+        self._centers = {}
+        self._indexes = {}
+        self._synced_to = None
+        self._checked_at = self._loaded_at = 0.0
+        # Set until the first load and by invalidate(); the clock behind time.monotonic() may have started
+        # less than a check interval ago, so the age of the last check alone cannot stand for "never"
+        self._check_due = self._reload_due = True
+        self._lock = threading.Lock()
+        self.reloads = self.refreshes = self.rows_fetched = 0
+
+    def _add(self, row):
+        center = dict(zip(DIRECTORY_COLUMNS, row))
+        self._centers[center['id']] = center
+        if center['latitude'] is not None:
+            index = self._indexes.setdefault(' '.join(center['brand'].lower().split()), GridIndex())
+            index.insert(center['id'], center['latitude'], center['longitude'])
+        self._synced_to = max(self._synced_to or 0.0, min(center['last_seen'], time.time()))
+
+    def _sync(self):
+        now = time.monotonic()
+        if not self._check_due and now - self._checked_at < SERVICE_CENTER_CHECK_SECONDS:
+            return
+        with database.connection() as conn:
+            if self._reload_due or now - self._loaded_at > SERVICE_CENTER_RELOAD_SECONDS:
+                rows = conn.execute(f"SELECT {', '.join(DIRECTORY_COLUMNS)} FROM service_centers").fetchall()
+                self._centers, self._indexes, self._synced_to = {}, {}, None
+                self._loaded_at = now
+                self._reload_due = False
+                self.reloads += 1
+            else:
+                rows = conn.execute(f"SELECT {', '.join(DIRECTORY_COLUMNS)} FROM service_centers WHERE last_seen > ?",
+                                    ((self._synced_to or 0.0) - SERVICE_CENTER_SYNC_OVERLAP_SECONDS,)).fetchall()
+                self.refreshes += 1
+        for row in rows:
+            self._add(row)
+        self.rows_fetched += len(rows)
+        self._checked_at = now
+        self._check_due = False
+
+    def invalidate(self, reload=False):
+        """Check for changes on the next query; ``reload`` also rebuilds the directory from scratch"""
+        with self._lock:
+            self._check_due = True
+            if reload:
+                self._reload_due = True
+
+    def nearest(self, brand, latitude, longitude, k=SERVICE_CENTER_RESULTS, max_km=SERVICE_CENTER_RADIUS_KM):
+        """Return up to ``k`` of a brand's centers nearest a point, closest first, each with its ``distance_km``"""
+        with self._lock:
+            self._sync()
+            index = self._indexes.get(' '.join(brand.lower().split()))
+            found = index.nearest(latitude, longitude, k, max_km) if index else []
+            return [dict(self._centers[key], distance_km=round(distance, 1)) for distance, key in found]
+
+    def stats(self):
+        with self._lock:
+            self._sync()
+            geocoded = {}
+            for center in self._centers.values():
+                geocoded[center['geocoded_by']] = geocoded.get(center['geocoded_by'], 0) + 1
+            return {"centers": len(self._centers), "brands": len(self._indexes),
+                    "cells": sum(len(index.cells) for index in self._indexes.values()),
+                    "geocoded_by_places": geocoded.get('places', 0), "geocoded_by_pin": geocoded.get('pin', 0),
+                    "geocoded_by_name": geocoded.get('name', 0), "not_geocoded": geocoded.get(None, 0),
+                    "reloads": self.reloads, "refreshes": self.refreshes, "rows_fetched": self.rows_fetched}
+
+
+directory = ServiceCenterDirectory()
+
+
+def _public(center):
+    # A center geocoded from its PIN code or city name sits at the city's centre, so its distance is not known
+    distance_km = center.get('distance_km') if center.get('geocoded_by') == 'places' else None
+    return {'name': center['name'], 'address': center['address'], 'phone': center['phone'],
+            'link': center['link'], 'city': center['city'], 'distance_km': distance_km}
+
+
+def _store(query_key, brand, location, service_centers):
+    now = time.time()
+    with database.connection() as conn:
+        conn.execute('''INSERT INTO service_center_cache
+                        (query_key, brand, location, results, fetched_at, requested_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (query_key) DO UPDATE SET
+                            results = excluded.results, fetched_at = excluded.fetched_at''',
+                     (query_key, brand, location, json.dumps(service_centers), now, now))
+        conn.executemany('''INSERT INTO service_centers
+                            (brand, name, address, phone, link, city, latitude, longitude, geocoded_by,
+                             first_seen, last_seen)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (brand, name, address) DO UPDATE SET
+                                phone = COALESCE(excluded.phone, phone),
+                                link = excluded.link,
+                                city = COALESCE(excluded.city, city),
+                                latitude = COALESCE(excluded.latitude, latitude),
+                                longitude = COALESCE(excluded.longitude, longitude),
+                                geocoded_by = COALESCE(excluded.geocoded_by, geocoded_by),
+                                last_seen = excluded.last_seen''',
+                         [(brand, center['name'], center['address'], center['phone'], center['link'],
+                           center['city'], center['latitude'], center['longitude'], center['geocoded_by'], now, now)
+                          for center in service_centers])
+    directory.invalidate()
+
+
+def _refresh(query_key, brand, location, api_key):
+    try:
+        _store(query_key, brand, location, fetch_service_centers(brand, location, api_key))
+    except Exception:
+        logging.getLogger(__name__).exception("Could not refresh service centers for %s in %s", brand, location)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(query_key)
+
+
+def refresh_in_background(query_key, brand, location, api_key):
+    """Schedule a cache refresh unless one is already running for this query"""
+    if not api_key:
+        return
+    with _refreshing_lock:
+        if query_key in _refreshing:
+            return
+        _refreshing.add(query_key)
+    _refresh_executor.submit(_refresh, query_key, brand, location, api_key)
+
+
+def _rank(nearby, service_centers, limit):
+    # Centers placed at a city's centre only look close; rank them after the ones located on the map.
+    # The directory only holds coordinates, yet hits with none are still centers in this area, so they come last.
+    nearby.sort(key=lambda center: center['geocoded_by'] != 'places')
+    listed = {(center['name'].lower(), center['address'].lower()) for center in nearby}
+    unplaced = [center for center in service_centers if center['latitude'] is None
+                and (center['name'].lower(), center['address'].lower()) not in listed]
+    return [_public(center) for center in nearby + unplaced][:limit]
+
+
+def lookup_service_centers(brand, location, api_key, limit=SERVICE_CENTER_RESULTS):
+    """Return a brand's service centers nearest a city, PIN code or address
+
+    Places the gazetteer knows are answered from the directory, nearest
+    first within SERVICE_CENTER_RADIUS_KM with centers located only to a city
+    after those with their own coordinates, followed by the area's search
+    results that could not be geocoded; they share one search per city
+    however they are written. Serper is only waited for when nothing is
+    known near the place yet; a stale search is redone in the background.
+    A place the gazetteer does not know is searched for by its text and put
+    at the median position of the centers that search located; with none
+    located, only the search's own hits are returned.
+    """
+    brand, location = ' '.join(brand.split()), ' '.join(location.split())
+    place, _ = gazetteer.geocode(location)
+    area = place.name if place else location
+    query_key = normalize_query(brand, area)
+    with database.connection() as conn:
+        row = conn.execute("SELECT results, fetched_at, requested_at FROM service_center_cache WHERE query_key=?",
+                           (query_key,)).fetchone()
+        # The refresh job keeps areas people ask about fresh; noting each request to the hour is enough for it
+        if row and time.time() - (row[2] or 0.0) > SERVICE_CENTER_REFRESH_SECONDS:
+            conn.execute("UPDATE service_center_cache SET requested_at=? WHERE query_key=?", (time.time(), query_key))
+    age = time.time() - row[1] if row else None
+
+    if place is not None:
+        nearby = directory.nearest(brand, place.latitude, place.longitude, limit)
+        if nearby or (row and age <= SERVICE_CENTER_TTL_SECONDS):
+            if row is None or age > SERVICE_CENTER_TTL_SECONDS:
+                refresh_in_background(query_key, brand, area, api_key)
+            service_centers = json.loads(row[0]) if row else []
+        else:
+            service_centers = fetch_service_centers(brand, area, api_key)
+            _store(query_key, brand, area, service_centers)
+            nearby = directory.nearest(brand, place.latitude, place.longitude, limit)
+        return _rank(nearby, service_centers, limit)
+
+    if row and age <= SERVICE_CENTER_TTL_SECONDS + SERVICE_CENTER_STALE_SECONDS:
+        if age > SERVICE_CENTER_TTL_SECONDS:
+            refresh_in_background(query_key, brand, area, api_key)
+        service_centers = json.loads(row[0])
+    else:
+        service_centers = fetch_service_centers(brand, area, api_key)
+        _store(query_key, brand, area, service_centers)
+    # The search was made for this place, so it stands where most of the centers it found are
+    located = [center for center in service_centers if center['latitude'] is not None]
+    nearby = []
+    if located:
+        nearby = directory.nearest(brand, statistics.median(center['latitude'] for center in located),
+                                   statistics.median(center['longitude'] for center in located), limit)
+    return _rank(nearby, service_centers, limit)
+
+
+def refresh_stale_areas(api_key, limit=SERVICE_CENTER_REFRESH_BATCH):
+    """Search again for the areas whose results are past SERVICE_CENTER_TTL_SECONDS, oldest first
+
+    Only areas asked about within the stale window are refreshed, so ones
+    nobody looks up any more stop costing searches. Returns how many areas
+    were refreshed.
+    """
+    now = time.time()
+    with database.connection() as conn:
+        rows = conn.execute('''SELECT query_key, brand, location FROM service_center_cache
+                               WHERE fetched_at < ? AND requested_at >= ? ORDER BY fetched_at LIMIT ?''',
+                            (now - SERVICE_CENTER_TTL_SECONDS,
+                             now - SERVICE_CENTER_TTL_SECONDS - SERVICE_CENTER_STALE_SECONDS, limit)).fetchall()
+    refreshed = 0
+    for query_key, brand, location in rows:
+        try:
+            _store(query_key, brand, location, fetch_service_centers(brand, location, api_key))
+            refreshed += 1
+        except Exception:
+            logging.getLogger(__name__).exception("Could not refresh stale service centers for %s in %s",
+                                                  brand, location)
+    return refreshed
+
+
+def prune_expired_centers():
+    """Delete the centers no search has returned for SERVICE_CENTER_EXPIRY_SECONDS; returns how many"""
+    with database.connection() as conn:
+        deleted = conn.execute("DELETE FROM service_centers WHERE last_seen < ?",
+                               (time.time() - SERVICE_CENTER_EXPIRY_SECONDS,)).rowcount
+    if deleted:
+        directory.invalidate(reload=True)
+    return deleted
+
+
+def get_directory_stats():
+    """Return the directory's size, how its centers were geocoded and how many searched areas are stale"""
+    with database.connection() as conn:
+        areas, stale = conn.execute("SELECT COUNT(*), SUM(fetched_at < ?) FROM service_center_cache",
+                                    (time.time() - SERVICE_CENTER_TTL_SECONDS,)).fetchone()
+    return dict(directory.stats(), areas=areas, stale_areas=stale or 0)
+
+
+class DirectoryRefresh(threading.Thread):
+    """Daemon thread that refreshes stale areas and prunes closed centers every SERVICE_CENTER_REFRESH_SECONDS"""
+
+    def __init__(self, api_key):
+        super().__init__(name="service-center-refresh", daemon=True)
+        self.api_key = api_key
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(SERVICE_CENTER_REFRESH_SECONDS):
+            try:
+                refresh_stale_areas(self.api_key)
+                prune_expired_centers()
+            except Exception:
+                logging.getLogger(__name__).exception("Service center directory refresh failed")
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_refresh_job(api_key):
+    """Start the periodic directory refresh; later calls are no-ops"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = DirectoryRefresh(api_key)
+            _refresher.start()
+    return _refresher
@@ -0,0 +1,21 @@
+class InvalidServiceTagError(ValueError):
+    """Raised when a customer or appointment is written without a service tag"""
+
+
+def normalize_service_tag(service_tag):
+    """Normalize a service tag to the upper-case form stored with customers, appointments and reports
+
+    Returns None for an empty tag, so a blank search means no filter.
+    """
+    return (service_tag or "").strip().upper() or None
+
+
+def require_service_tag(service_tag):
+    """Normalize a service tag that is about to be stored; raises InvalidServiceTagError if it is empty
+
+    Admin tables sort and page on service_tag, which assumes it is never NULL.
+    """
+    service_tag = normalize_service_tag(service_tag)
+    if service_tag is None:
+        raise InvalidServiceTagError("A service tag is required.")
+    return service_tag
@@ -0,0 +1,134 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# Runs against a scratch database; set before database is imported so the real one is never touched
+os.environ["HARDWARE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="slot-search-bench-"), "bench.db")
+
+import database  # noqa: E402
+import scheduling  # noqa: E402
+
+BRANDS = ["Dell", "HP", "Lenovo"]
+LOCATIONS = ["Downtown", "Midtown", "Uptown", "Suburb", "City Center"]
+
+
+def synthetic_calendars(technicians, bookings_per_day, rng):
+    """Technicians spread over brands and areas, with bookings on the working-day grid across the window"""
+    database.migrate()
+    day_start, day_end = scheduling.to_minutes(scheduling.WORKDAY_START), scheduling.to_minutes(scheduling.WORKDAY_END)
+    starts = list(range(day_start, day_end - scheduling.SLOT_MINUTES + 1, scheduling.SLOT_MINUTES))
+    with database.connection() as conn:
+        conn.executemany('''INSERT INTO technicians (name, specialization, location, rating, available)
+                            VALUES (?, ?, ?, ?, 1)''',
+                         [(f"Technician {number}", rng.choice(BRANDS), rng.choice(LOCATIONS),
+                           round(rng.uniform(3, 5), 1)) for number in range(technicians)])
+        for offset in range(scheduling.SCHEDULING_WINDOW_DAYS + 1):
+            day = (date.today() + timedelta(days=offset)).isoformat()
+            booked = rng.sample([(technician, start) for technician in range(1, technicians + 1) for start in starts],
+                                min(bookings_per_day, technicians * len(starts)))
+            conn.executemany('''INSERT INTO appointments (customer_id, technician_id, service_tag, appointment_date,
+                                                          appointment_time, status)
+                                VALUES (1, ?, 'BENCH', ?, ?, 'Scheduled')''',
+                             [(technician, day, scheduling.to_hhmm(start)) for technician, start in booked])
+
+
+def brute_force(brand, customer_address, earliest, limit=5, per_technician=2):
+    """Score every technician's first free slots, checking each slot with a database query"""
+    now = datetime.now()
+    earliest = max(earliest, now)
+    last_day = now.date() + timedelta(days=scheduling.SCHEDULING_WINDOW_DAYS)
+    window = (now.date().isoformat(), (now.date() + timedelta(days=scheduling.SCHEDULING_WINDOW_DAYS + 1)).isoformat())
+    capacity = ((scheduling.to_minutes(scheduling.WORKDAY_END) - scheduling.to_minutes(scheduling.WORKDAY_START))
+                // scheduling.SLOT_MINUTES * scheduling.SCHEDULING_WINDOW_DAYS)
+    scores = []
+    with database.connection() as conn:
+        for technician in scheduling.available_technicians(brand):
+            load = conn.execute('''SELECT COUNT(*) FROM appointments WHERE technician_id = ? AND status != 'Cancelled'
+                                   AND appointment_date >= ? AND appointment_date < ?''',
+                                (technician['id'], *window)).fetchone()[0]
+            score = (scheduling.RATING_WEIGHT * (technician['rating'] or 0) / 5
+                     + scheduling.PROXIMITY_WEIGHT * scheduling.proximity(technician['location'], customer_address)
+                     - scheduling.LOAD_WEIGHT * min(load / capacity, 1.0))
+            found, day = 0, earliest.date()
+            minute = scheduling.to_minutes(scheduling.WORKDAY_START)
+            while found < per_technician and day <= last_day:
+                start = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+                if start >= earliest and not scheduling.has_conflict(conn, technician['id'], day.isoformat(),
+                                                                      scheduling.to_hhmm(minute)):
+                    scores.append(round(score - scheduling.DELAY_WEIGHT * (start - earliest).total_seconds() / 86400,
+                                        4))
+                    found += 1
+                minute += scheduling.SLOT_MINUTES
+                if minute + scheduling.SLOT_MINUTES > scheduling.to_minutes(scheduling.WORKDAY_END):
+                    day, minute = day + timedelta(days=1), scheduling.to_minutes(scheduling.WORKDAY_START)
+    return sorted(scores, reverse=True)[:limit]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {"p50": statistics.median(samples), "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark find_open_slots on synthetic technician calendars "
+                                                 "against a per-slot database scan.")
+    parser.add_argument("--technicians", type=int, default=3000)
+    parser.add_argument("--bookings-per-day", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--baseline-queries", type=int, default=20, help="queries also answered by the scan")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    synthetic_calendars(args.technicians, args.bookings_per_day, rng)
+    print(f"{args.technicians} technicians, {args.bookings_per_day} bookings a day over "
+          f"{scheduling.SCHEDULING_WINDOW_DAYS + 1} days, seeded in {time.perf_counter() - started:.1f} s")
+
+    calendar = scheduling.get_calendar()
+    started = time.perf_counter()
+    calendar.sync()
+    print(f"calendar load: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = [(rng.choice(BRANDS), f"12 Main St, {rng.choice(LOCATIONS)}",
+                datetime.now() + timedelta(days=rng.randint(0, 14), hours=rng.randint(0, 8)))
+               for _ in range(args.queries)]
+    timings, answers = [], []
+    for brand, address, earliest in queries:
+        started = time.perf_counter()
+        answers.append(scheduling.find_open_slots(brand, address, earliest))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    scan_timings, mismatches = [], 0
+    for (brand, address, earliest), answer in list(zip(queries, answers))[:args.baseline_queries]:
+        started = time.perf_counter()
+        expected = brute_force(brand, address, earliest)
+        scan_timings.append((time.perf_counter() - started) * 1000)
+        mismatches += [slot["score"] for slot in answer] != expected
+
+    # One booking, then a search that must pick it up incrementally
+    slot = answers[0][0]
+    scheduling.book_appointment(1, slot["technician"]["id"], "BENCH", "Benchmark", slot["start"])
+    started = time.perf_counter()
+    after = scheduling.find_open_slots(*queries[0])
+    catch_up_ms = (time.perf_counter() - started) * 1000
+    stale = any(other["technician"]["id"] == slot["technician"]["id"] and other["start"] == slot["start"]
+                for other in after)
+
+    for label, samples in (("find_open_slots", timings), ("per-slot database scan", scan_timings)):
+        stats = percentiles(samples)
+        print(f"  {label:<24} p50 {stats['p50']:8.2f} ms   p95 {stats['p95']:8.2f} ms   p99 {stats['p99']:8.2f} ms")
+    print(f"  search after a booking   {catch_up_ms:8.2f} ms")
+    print(f"scan and index disagree on {mismatches} of {len(scan_timings)} queries; "
+          f"booked slot offered again: {stale}")
+    return 1 if mismatches or stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Budgets for a cold start of hardware.py; raise them deliberately, not to make a regression pass
+MAX_IMPORT_MS = float(os.getenv("MAX_IMPORT_MS", 600))
+MAX_FIRST_RENDER_MS = float(os.getenv("MAX_FIRST_RENDER_MS", 1000))
+# Heavy modules that only some pages need; loading the Home page must not import them.
+# PIL is not listed because Streamlit loads it for the sidebar's st.image.
+DEFERRED_MODULES = ("pandas", "groq", "requests")
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter with streamlit already imported, as it is in a running server
+RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("hardware.py", default_timeout=60)
+started = time.perf_counter()
+app.run()
+first_render = time.perf_counter() - started
+loaded = [name for name in %r if name in sys.modules]
+started = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - started
+print(json.dumps({"first_render_ms": first_render * 1000, "rerun_ms": rerun * 1000, "loaded": loaded,
+                  "exceptions": [e.value for e in app.exception]}))
+"""
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable, *args], cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def measure_import(env):
+    """Import hardware.py in a fresh interpreter; return its cumulative time and its slowest direct imports"""
+    output = run_python(["-X", "importtime", "-c", "import hardware"], env).stderr
+    total_us, children = 0, []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line[12:]:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == "hardware" and depth == 0:
+            total_us = int(cumulative)
+        elif depth == 1:
+            children.append((int(cumulative), name.strip()))
+    return total_us / 1000, sorted(children, reverse=True)
+
+
+def measure_render(env):
+    """Render the Home page in a fresh interpreter and then rerun it"""
+    return json.loads(run_python(["-c", RENDER_SCRIPT % (DEFERRED_MODULES,)], env).stdout.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold-start import and first-render time of hardware.py.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start per measurement")
+    parser.add_argument("--db", help="database to start against (default: a scratch database initialized once)")
+    parser.add_argument("--max-import-ms", type=float, default=MAX_IMPORT_MS)
+    parser.add_argument("--max-render-ms", type=float, default=MAX_FIRST_RENDER_MS)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, HARDWARE_DB_PATH=args.db or os.path.join(scratch, "startup.db"))
+        # Migrate and seed up front so every timed run starts against an existing database
+        run_python(["-c", "import service; service.init_db()"], env)
+
+        imports = [measure_import(env) for _ in range(args.runs)]
+        renders = [measure_render(env) for _ in range(args.runs)]
+
+    import_ms = statistics.median(total for total, _ in imports)
+    render_ms = statistics.median(render["first_render_ms"] for render in renders)
+    rerun_ms = statistics.median(render["rerun_ms"] for render in renders)
+    loaded = sorted({name for render in renders for name in render["loaded"]})
+    exceptions = [e for render in renders for e in render["exceptions"]]
+
+    print(f"import hardware:   {import_ms:8.1f} ms median of {args.runs} (budget {args.max_import_ms:.0f} ms)")
+    for cumulative, name in imports[0][1][:8]:
+        print(f"  {name:<20}{cumulative / 1000:8.1f} ms")
+    print(f"first render:      {render_ms:8.1f} ms median of {args.runs} (budget {args.max_render_ms:.0f} ms)")
+    print(f"warm rerun:        {rerun_ms:8.1f} ms")
+    print(f"deferred modules loaded on Home: {', '.join(loaded) or 'none'}")
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append("import time is over budget")
+    if render_ms > args.max_render_ms:
+        failures.append("first render is over budget")
+    if loaded:
+        failures.append(f"the Home page imported {', '.join(loaded)}")
+    if exceptions:
+        failures.append(f"the app raised: {exceptions[0]}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import database
+
+# Changes stamped this long before the newest one already seen are fetched again, in case the clock stepped back
+SCHEDULE_SYNC_OVERLAP_SECONDS = float(os.getenv("SCHEDULE_SYNC_OVERLAP_SECONDS", 2))
+# Changes are picked up on every read; a full reload also drops appointments deleted or reassigned elsewhere
+SCHEDULE_RELOAD_SECONDS = float(os.getenv("SCHEDULE_RELOAD_SECONDS", 300))
+WINDOWS = ("Today", "This week", "Upcoming")
+
+SCHEDULE_COLUMNS = ['id', 'customer_id', 'customer_name', 'customer_email', 'customer_phone', 'customer_address',
+                    'service_tag', 'issue_description', 'appointment_date', 'appointment_time', 'status',
+                    'updated_at']
+_SELECT = '''SELECT a.id, a.customer_id, c.customer_name, c.customer_email, c.customer_phone, c.customer_address,
+                    a.service_tag, a.issue_description, a.appointment_date, a.appointment_time, a.status,
+                    a.updated_at
+             FROM appointments a
+             JOIN customers c ON a.customer_id = c.id'''
+
+
+def window_bounds(window, offset=0, today=None):
+    """Return the ``[start, end)`` dates of a Today, This week or Upcoming window
+
+    ``offset`` pages forward by days or weeks; Upcoming has no end.
+    """
+    today = today or date.today()
+    if window == "Today":
+        start = today + timedelta(days=offset)
+        return start, start + timedelta(days=1)
+    if window == "This week":
+        monday = today - timedelta(days=today.weekday()) + timedelta(weeks=offset)
+        return max(monday, today), monday + timedelta(weeks=1)
+    if window == "Upcoming":
+        return today, None
+    raise ValueError(f"Unknown schedule window {window!r}")
+
+
+class TechnicianSchedule:
+    """One technician's appointments from today on, kept current by fetching only the rows changed since last time
+
+    Every write to appointments stamps updated_at (see migration 13), so a
+    refresh is one probe of idx_appointments_technician_updated that usually
+    returns nothing.
+    """
+
+    def __init__(self, technician_id):
+        self.technician_id = technician_id
+        self._rows = {}
+        self._synced_to = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = self.refreshes = self.rows_fetched = 0
+
+    def _reload(self, conn):
+        rows = conn.execute(f"{_SELECT} WHERE a.technician_id = ? AND a.appointment_date >= ?",
+                            (self.technician_id, date.today().isoformat())).fetchall()
+        # The watermark covers the technician's past appointments too, so their later edits are not refetched.
+        # It never runs ahead of this clock, or changes stamped after a bad future timestamp would be skipped.
+        newest = conn.execute("SELECT MAX(updated_at) FROM appointments WHERE technician_id = ?",
+                              (self.technician_id,)).fetchone()[0]
+        self._synced_to = min(newest or 0.0, time.time())
+        self._rows = {row[0]: row for row in rows}
+        self.reloads += 1
+        self.rows_fetched += len(rows)
+
+    def _refresh(self, conn):
+        rows = conn.execute(f"{_SELECT} WHERE a.technician_id = ? AND a.updated_at > ?",
+                            (self.technician_id, self._synced_to - SCHEDULE_SYNC_OVERLAP_SECONDS)).fetchall()
+        for row in rows:
+            self._rows[row[0]] = row
+            self._synced_to = max(self._synced_to, min(row[-1], time.time()))
+        self.refreshes += 1
+        self.rows_fetched += len(rows)
+
+    def appointments(self, start=None, end=None):
+        """Return the appointments dated in ``[start, end)``, earliest first, after fetching any changes"""
+        start = max(start or date.today(), date.today()).isoformat()
+        end = end.isoformat() if end else None
+        now = time.monotonic()
+        with self._lock:
+            with database.connection() as conn:
+                if self._synced_to is None or now - self._loaded_at > SCHEDULE_RELOAD_SECONDS:
+                    self._reload(conn)
+                    self._loaded_at = now
+                else:
+                    self._refresh(conn)
+            rows = [row for row in self._rows.values() if row[8] >= start and (end is None or row[8] < end)]
+        rows.sort(key=lambda row: (row[8], row[9]))
+        return [dict(zip(SCHEDULE_COLUMNS, row)) for row in rows]
+
+    def stats(self):
+        return {"technician_id": self.technician_id, "appointments": len(self._rows), "reloads": self.reloads,
+                "refreshes": self.refreshes, "rows_fetched": self.rows_fetched}
+
+
+_schedules = {}
+_schedules_lock = threading.Lock()
+
+
+def get_schedule(technician_id):
+    """Return this process's shared schedule for a technician, creating it on first use"""
+    technician_id = int(technician_id)
+    schedule = _schedules.get(technician_id)
+    if schedule is None:
+        with _schedules_lock:
+            schedule = _schedules.setdefault(technician_id, TechnicianSchedule(technician_id))
+    return schedule
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+import pytest
+
+# Point the default pool at a scratch file before any app module is imported
+os.environ["HARDWARE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="hardware-tests-"), "import.db")
+
+import admin_tables  # noqa: E402
+import database  # noqa: E402
+import readcache  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated, empty database of its own for one test, with every cache emptied"""
+    pool = database.ConnectionPool(str(tmp_path / "hardware_support.db"))
+    monkeypatch.setattr(database, "_pool", pool)
+    database.migrate()
+    for cache in readcache._caches.values():
+        cache.invalidate()
+    admin_tables.invalidate_counts()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def seeded(db):
+    """The sample customers, technicians and brand catalog the app seeds on first start"""
+    import service
+
+    service.init_db()
+    return db
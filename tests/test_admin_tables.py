@@ -0,0 +1,75 @@
+import pytest
+
+import admin_tables
+import database
+import service
+import service_tags
+
+
+def _add_technicians(ratings):
+    with database.connection() as conn:
+        conn.executemany('''INSERT INTO technicians (name, specialization, location, rating, available)
+                            VALUES (?, 'Dell', 'Pune', ?, 1)''',
+                         [(f"Technician {number}", rating) for number, rating in enumerate(ratings)])
+
+
+def _all_ids(sort, descending, page_size):
+    ids = []
+    for columns, rows in admin_tables.iter_pages("technicians", sort=sort, descending=descending,
+                                                 page_size=page_size):
+        ids += [row[columns.index("id")] for row in rows]
+    return ids
+
+
+def test_rating_pages_cover_technicians_without_a_rating(db):
+    _add_technicians([4.5, None, 3.0, None, 4.5, 5.0, None])
+    for descending in (False, True):
+        ids = _all_ids("rating", descending, page_size=2)
+        assert sorted(ids) == list(range(1, 8))
+        assert len(set(ids)) == 7
+
+
+def test_unrated_technicians_sort_below_rated_ones(db):
+    _add_technicians([4.0, None, 2.0])
+    columns, rows, _ = admin_tables.fetch_page("technicians", sort="rating")
+    assert [row[columns.index("rating")] for row in rows] == [None, 2.0, 4.0]
+
+
+def test_cursor_resumes_after_the_last_row(db):
+    _add_technicians([float(number % 3) for number in range(10)])
+    _, first, cursor = admin_tables.fetch_page("technicians", sort="rating", limit=4)
+    _, rest, _ = admin_tables.fetch_page("technicians", sort="rating", cursor=cursor, limit=10)
+    assert len(first) == 4 and len(rest) == 6
+    assert not {row[0] for row in first} & {row[0] for row in rest}
+
+
+def test_service_tag_search_ignores_case_and_spacing(seeded):
+    with database.connection() as conn:
+        conn.execute('''INSERT INTO appointments (customer_id, technician_id, service_tag, appointment_date,
+                                                  appointment_time, status)
+                        VALUES (1, 1, 'ABC123', '2030-01-01', '10:00', 'Scheduled')''')
+    for search in ("abc", " Abc1 ", "ABC123"):
+        columns, rows, _ = admin_tables.fetch_page("customers", {"search": search})
+        assert [row[columns.index("service_tag")] for row in rows] == ["ABC123"]
+        assert [label for _, label in admin_tables.search_appointments(search)] == [
+            "#1 · John Doe · ABC123 · 2030-01-01 (Scheduled)"]
+    assert admin_tables.fetch_page("customers", {"search": "jane"})[1][0][2] == "Jane Smith"
+    assert admin_tables.count_rows("customers", {"search": "   "}) == 3
+
+
+def test_a_customer_without_a_service_tag_is_refused(seeded):
+    with pytest.raises(service_tags.InvalidServiceTagError):
+        service.add_customer("  ", "Ana Silva", None, None, None, None, None, "2030-01-01")
+    assert admin_tables.count_rows("customers") == 3
+
+
+def test_customer_pages_cover_customers_without_a_name_or_end_date(seeded):
+    with database.connection() as conn:
+        conn.executemany("INSERT INTO customers (service_tag, customer_name, warranty_end_date) VALUES (?, ?, ?)",
+                         [("NULL1", None, "2030-01-01"), ("NULL2", "Zoe", None), ("NULL3", None, None)])
+    for sort in ("customer_name", "warranty_end_date"):
+        for descending in (False, True):
+            ids = []
+            for columns, rows in admin_tables.iter_pages("customers", sort=sort, descending=descending, page_size=1):
+                ids += [row[columns.index("id")] for row in rows]
+            assert sorted(ids) == list(range(1, 7))
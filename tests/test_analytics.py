@@ -0,0 +1,61 @@
+import io
+from datetime import datetime
+
+import analytics
+import database
+import scheduling
+import service
+
+# Each rollup table and the number of key columns before its counts
+ROLLUPS = {"rollup_technician_daily": 2, "rollup_technician_monthly": 2, "rollup_status_by_area": 3,
+           "rollup_defects_daily": 3, "rollup_warranty_monthly": 1}
+
+
+def _rollups():
+    """Every rollup row holding a count, so rows a trigger brought back to zero compare equal to missing ones"""
+    with database.connection() as conn:
+        return {table: sorted(row for row in conn.execute(f"SELECT * FROM {table}") if any(row[keys:]))
+                for table, keys in ROLLUPS.items()}
+
+
+def _book(technician_id, day, time="10:00", defect=None):
+    return scheduling.book_appointment(1, technician_id, "ABC123", "Screen flickers",
+                                       datetime.fromisoformat(f"{day} {time}"), defect=defect)
+
+
+def _move_technician(technician_id, specialization, location):
+    with database.connection() as conn:
+        conn.execute("UPDATE technicians SET specialization=?, location=? WHERE id=?",
+                     (specialization, location, technician_id))
+
+
+def test_moving_a_technician_moves_their_open_appointments(seeded):
+    appointment = _book(1, "2030-01-07")
+    _move_technician(1, "Dell", "Midtown")
+    service.update_appointment_statuses([appointment], "Completed")
+    _book(1, "2030-01-08")
+
+    backlog = analytics.backlog_by_area()
+    assert list(backlog.columns) == ["Midtown"] and backlog.loc["Dell", "Midtown"] == 1
+
+
+def test_triggers_keep_the_rollups_equal_to_a_rebuild_after_mixed_edits(seeded):
+    first = _book(1, "2030-01-07", defect={"defect_type": "Screen", "severity": "High"})
+    second = _book(2, "2030-01-31", "11:00")
+    third = _book(3, "2030-02-03")
+    service.update_appointment_statuses([first], "In Progress")
+    _move_technician(1, "HP", "Uptown")
+    service.update_appointment_statuses([first, second], "Completed")
+    service.import_records("technicians", io.BytesIO(b"id,name,specialization,location\n"
+                                                     b"2,Sarah Williams,Lenovo,Suburb\n"), "csv")
+    service.update_appointment_statuses([third], "Cancelled")
+    with database.connection() as conn:
+        conn.execute("UPDATE appointments SET technician_id = 2, appointment_date = '2030-03-01' WHERE id = ?",
+                     (third,))
+        conn.execute("DELETE FROM appointments WHERE id = ?", (second,))
+        conn.execute("DELETE FROM technicians WHERE id = 3")
+    service.add_customer("LT-9", "Ana Silva", None, None, None, None, None, "2031-05-01")
+
+    kept = _rollups()
+    analytics.rebuild_rollups()
+    assert kept == _rollups()
@@ -0,0 +1,59 @@
+import pytest
+from starlette.testclient import TestClient
+
+import api
+import database
+import service
+
+
+@pytest.fixture
+def client(seeded, monkeypatch):
+    monkeypatch.setattr(api, "API_KEY", None)
+    # Without the context manager the lifespan, which starts the background workers, does not run
+    return TestClient(api.app)
+
+
+def _chunks(size, chunk_size=1024):
+    """A request body without a Content-Length header, sent in chunks"""
+    def body():
+        for start in range(0, size, chunk_size):
+            yield b"x" * min(chunk_size, size - start)
+    return body()
+
+
+def _count_customers():
+    with database.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
+
+
+def test_a_photo_over_the_limit_is_refused_by_its_declared_length(client, monkeypatch):
+    monkeypatch.setattr(api, "API_MAX_UPLOAD_BYTES", 4096)
+    monkeypatch.setattr(service, "analyze_photo", lambda image_bytes: pytest.fail("analyzed an oversized photo"))
+    response = client.post("/analyze", content=b"x" * 5000)
+    assert response.status_code == 413 and response.json() == {"error": "Photo is too large."}
+
+
+def test_a_chunked_photo_is_refused_once_it_passes_the_limit(client, monkeypatch):
+    monkeypatch.setattr(api, "API_MAX_UPLOAD_BYTES", 4096)
+    monkeypatch.setattr(service, "analyze_photo", lambda image_bytes: pytest.fail("analyzed an oversized photo"))
+    response = client.post("/analyze", content=_chunks(5000))
+    assert response.status_code == 413
+
+
+def test_a_chunked_photo_within_the_limit_is_analyzed_whole(client, monkeypatch):
+    monkeypatch.setattr(api, "API_MAX_UPLOAD_BYTES", 4096)
+    monkeypatch.setattr(service, "analyze_photo", lambda image_bytes: {"bytes": len(image_bytes)})
+    assert client.post("/analyze", content=_chunks(4096)).json() == {"bytes": 4096}
+    assert client.post("/analyze", content=b"").status_code == 400
+
+
+def test_an_import_over_the_limit_is_refused_before_any_row_is_written(client, monkeypatch):
+    monkeypatch.setattr(api, "API_MAX_IMPORT_BYTES", 200)
+    rows = b"service_tag,customer_name,warranty_end_date\n" + b"".join(
+        b"TAG%03d,Customer,2030-01-01\n" % number for number in range(20))
+    response = client.post("/import/customers", content=iter([rows[:100], rows[100:]]))
+    assert response.status_code == 413 and response.json() == {"error": "Import file is too large."}
+    assert _count_customers() == 3
+
+    response = client.post("/import/customers", content=rows[:150].rsplit(b"\n", 1)[0] + b"\n")
+    assert response.status_code == 200 and response.json()["imported"] == 3
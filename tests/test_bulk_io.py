@@ -0,0 +1,79 @@
+import io
+
+import bulk_io
+import database
+import service
+
+CUSTOMER_HEADER = "service_tag,customer_name,customer_email,warranty_end_date\n"
+
+
+def _import(table, text):
+    return service.import_records(table, io.BytesIO(text.encode()), "csv")
+
+
+def _count(table):
+    with database.connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_reimport_in_another_case_updates_the_same_customer(seeded):
+    service.add_customer("lt-42 ", "Ana Silva", None, None, None, "Dell XPS 13", None, "2030-01-01")
+    summary = _import("customers", CUSTOMER_HEADER + "Lt-42,Ana Silva,ana@example.com,2031-01-01\n")
+
+    assert summary["imported"] == 1
+    assert _count("customers") == 4
+    customer = service.get_customer_by_service_tag(" lt-42")
+    assert customer["service_tag"] == "LT-42"
+    assert customer["customer_email"] == "ana@example.com"
+
+
+def test_invalid_rows_are_rejected_and_the_rest_imported(seeded):
+    rejects = io.StringIO()
+    summary = bulk_io.import_file("customers", io.BytesIO((CUSTOMER_HEADER + "N1,A,,2030-01-01\n"
+                                                          ",B,,2030-01-01\nN3,C,not-an-email,2030-01-01\n").encode()),
+                                  rejects=rejects)
+    assert (summary["imported"], summary["rejected"]) == (1, 2)
+    assert rejects.getvalue().splitlines()[0] == "row,reason"
+
+
+def test_import_replaces_cached_customers_and_technicians(seeded):
+    assert service.get_customer_by_service_tag("NEW1") is None
+    assert service.get_customer_by_service_tag("ABC123")["customer_name"] == "John Doe"
+    dell = [technician["name"] for technician in service.list_technicians("Dell")]
+
+    _import("customers", CUSTOMER_HEADER + "new1,Nina Rao,,2030-01-01\nABC123,John Q. Doe,,2030-01-01\n")
+    _import("technicians", "name,specialization,rating,password\nMeera Iyer,dell,,secret\n")
+
+    assert service.get_customer_by_service_tag("NEW1")["customer_name"] == "Nina Rao"
+    assert service.get_customer_by_service_tag("ABC123")["customer_name"] == "John Q. Doe"
+    assert [technician["name"] for technician in service.list_technicians("Dell")] == dell + ["Meera Iyer"]
+
+
+def test_each_committed_chunk_is_announced(seeded):
+    commits = []
+    text = CUSTOMER_HEADER + "".join(f"T{number},Customer {number},,2030-01-01\n" for number in range(5))
+    bulk_io.import_file("customers", io.BytesIO(text.encode()), chunk_rows=2, on_commit=lambda: commits.append(1))
+    assert len(commits) == 3
+
+
+def test_a_technician_row_that_inserts_needs_a_password(seeded):
+    summary = _import("technicians", "id,name,specialization,password\n999,Ravi Kumar,Dell,\n1,Alex Kim,Dell,\n")
+
+    assert (summary["imported"], summary["rejected"]) == (1, 1)
+    assert summary["sample_rejects"] == [{"row": 1, "reason": "password is required for a new technician"}]
+    with database.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM technicians WHERE id = 999").fetchone()[0] == 0
+
+
+def test_parquet_export_keeps_a_numeric_column_that_starts_with_nulls(seeded):
+    import pyarrow.parquet as pq
+
+    service.add_technician("Meera Iyer", None, None, "Dell", None, None, True, "secret")
+    sink = io.BytesIO()
+    # Unrated technicians sort first, so the first page holds only NULL ratings
+    bulk_io.write_parquet("technicians", sink, sort="rating", page_rows=1)
+
+    exported = pq.read_table(io.BytesIO(sink.getvalue()))
+    assert str(exported.schema.field("rating").type) == "double"
+    ratings = exported.column("rating").to_pylist()
+    assert ratings[0] is None and all(isinstance(rating, float) for rating in ratings[1:])
@@ -0,0 +1,12 @@
+import catalog
+
+
+def test_an_added_alias_is_used_by_the_next_lookup_soon_after_boot(seeded, monkeypatch):
+    # time.monotonic() counts from boot, so it can be well under the check interval
+    monkeypatch.setattr(catalog.time, "monotonic", lambda: 5.0)
+    monkeypatch.setattr(catalog, "_catalog", None)
+    assert catalog.detect_brand("Zenith Pro 14") is None
+
+    catalog.add_alias("zenith", "Dell")
+    assert catalog.detect_brand("Zenith Pro 14") == "Dell"
+
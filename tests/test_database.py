@@ -0,0 +1,22 @@
+import database
+
+
+def test_service_tags_differing_in_case_merge_into_one_customer(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "_pool", database.ConnectionPool(str(tmp_path / "old.db")))
+    migrations = database.MIGRATIONS
+    monkeypatch.setattr(database, "MIGRATIONS", [step for step in migrations if step[0] < 17])
+    database.migrate()
+    with database.connection() as conn:
+        conn.executemany("INSERT INTO customers (id, service_tag, customer_name) VALUES (?, ?, ?)",
+                         [(1, "abc1", "Typed"), (2, "ABC1", "Imported"), (3, "xyz2 ", "Alone"), (4, "OK3", "Fine")])
+        conn.executemany('''INSERT INTO appointments (customer_id, service_tag, appointment_date, status)
+                            VALUES (?, ?, '2030-01-01', 'Scheduled')''',
+                         [(1, "abc1"), (2, "ABC1"), (3, "xyz2 ")])
+    monkeypatch.setattr(database, "MIGRATIONS", migrations)
+
+    assert database.migrate() >= 17
+    with database.connection() as conn:
+        customers = conn.execute("SELECT id, service_tag, customer_name FROM customers ORDER BY id").fetchall()
+        appointments = conn.execute("SELECT customer_id, service_tag FROM appointments ORDER BY id").fetchall()
+    assert customers == [(2, "ABC1", "Imported"), (3, "XYZ2", "Alone"), (4, "OK3", "Fine")]
+    assert appointments == [(2, "ABC1"), (2, "ABC1"), (3, "XYZ2")]
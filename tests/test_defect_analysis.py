@@ -0,0 +1,112 @@
+import itertools
+import json
+
+import pytest
+
+import defect_analysis
+import inference
+
+RESULT = {"defect_detected": True, "defect_type": "Cracked hinge", "severity": "Medium",
+          "affected_components": ["hinge"]}
+
+
+class ScriptedBackend:
+    """Answers each request with the next of ``answers`` and keeps what it was asked"""
+
+    name = model = "scripted"
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = []
+
+    def complete(self, messages, temperature, max_tokens, timeout):
+        self.requests.append((messages, max_tokens))
+        return self.answers.pop(0), None, None
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Route analyses to a ScriptedBackend with the given answers"""
+    def script(*answers):
+        scripted = ScriptedBackend(*answers)
+        monkeypatch.setattr(defect_analysis, "_router", inference.InferenceRouter([scripted], hedge_after_ms=0))
+        return scripted
+    return script
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Make every cache read and write one second later than the previous one"""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(defect_analysis.time, "time", lambda: float(next(ticks)))
+    return ticks
+
+
+def test_a_stored_analysis_is_a_hit(db):
+    key = defect_analysis.image_cache_key(b"photo")
+    assert defect_analysis.get_cached_analysis(key) is None
+    defect_analysis.store_cached_analysis(key, RESULT)
+
+    assert defect_analysis.get_cached_analysis(key) == RESULT
+    stats = defect_analysis.get_analysis_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_a_new_model_version_misses_and_purges_the_old_entries(db, monkeypatch):
+    old_key = defect_analysis.image_cache_key(b"photo")
+    defect_analysis.store_cached_analysis(old_key, RESULT)
+
+    monkeypatch.setattr(defect_analysis, "ANALYSIS_MODEL_VERSION", "another-prompt")
+    assert defect_analysis.image_cache_key(b"photo") != old_key
+    # Even a key built before the change is not answered from the old version's row
+    assert defect_analysis.get_cached_analysis(old_key) is None
+
+    defect_analysis.purge_stale_cache()
+    assert defect_analysis.get_analysis_cache_stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(db, clock, monkeypatch):
+    monkeypatch.setattr(defect_analysis, "ANALYSIS_CACHE_MAX_ENTRIES", 2)
+    defect_analysis.store_cached_analysis("first", RESULT)
+    defect_analysis.store_cached_analysis("second", RESULT)
+    assert defect_analysis.get_cached_analysis("first") == RESULT
+
+    defect_analysis.store_cached_analysis("third", RESULT)
+    assert defect_analysis.get_cached_analysis("second") is None
+    assert defect_analysis.get_cached_analysis("first") == RESULT
+    assert defect_analysis.get_cached_analysis("third") == RESULT
+    assert defect_analysis.get_analysis_cache_stats()["evictions"] == 1
+
+
+def test_expired_entries_are_evicted(db, clock, monkeypatch):
+    monkeypatch.setattr(defect_analysis, "ANALYSIS_CACHE_TTL_SECONDS", 2)
+    defect_analysis.store_cached_analysis("old", RESULT)
+    next(clock), next(clock)
+
+    assert defect_analysis.get_cached_analysis("old") is None
+    stats = defect_analysis.get_analysis_cache_stats()
+    assert (stats["evictions"], stats["entries"]) == (1, 0)
+
+
+def test_missing_fields_are_asked_for_once(db, backend):
+    scripted = backend('```json\n{"defect_detected": "yes", "defect_type": "Liquid damage",}\n```',
+                       '{"severity": "HIGH", "affected_components": ["Keyboard"], "defect_type": "ignored"}')
+    timings = {}
+    result = defect_analysis.analyze_image(b"photo", timings=timings)
+
+    assert result == defect_analysis.DefectResult(True, "Liquid damage", "High", ("keyboard",))
+    assert timings["recovery"] == "reasked"
+    (first, _), (followup, max_tokens) = scripted.requests
+    assert followup[:len(first)] == first
+    assert json.loads(followup[-2]["content"]) == {"defect_detected": "yes", "defect_type": "Liquid damage"}
+    reask = defect_analysis.defect_result.reask_prompt(["severity", "affected_components"])
+    assert followup[-1] == {"role": "user", "content": reask}
+    assert max_tokens == defect_analysis.REASK_MAX_TOKENS
+
+
+def test_a_reask_that_is_still_incomplete_fails_without_asking_again(db, backend):
+    scripted = backend('{"defect_detected": "Yes"}', '{"severity": "High"}')
+    with pytest.raises(defect_analysis.AnalysisError, match="defect_type, affected_components even after"):
+        defect_analysis.analyze_image(b"photo")
+    assert len(scripted.requests) == 2
+    assert defect_analysis.get_analysis_cache_stats()["entries"] == 0
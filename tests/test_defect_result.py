@@ -0,0 +1,49 @@
+import pytest
+
+import defect_result
+
+
+def test_plain_json_takes_the_fast_path():
+    assert defect_result.decode('{"defect_detected": "No"}') == ({"defect_detected": "No"}, False)
+
+
+def test_fenced_json_with_trailing_commas_is_repaired():
+    answer = 'Here is the report:\n```json\n{"defect_detected": "Yes", "affected_components": ["hinge",],}\n```'
+    assert defect_result.decode(answer) == ({"defect_detected": "Yes", "affected_components": ["hinge"]}, True)
+
+
+def test_a_truncated_answer_drops_its_partial_field():
+    data, repaired = defect_result.decode('{"defect_detected": "Yes", "defect_type": "Cracked scr')
+    assert (data, repaired) == ({"defect_detected": "Yes"}, True)
+
+
+@pytest.mark.parametrize("answer", ["[1, 2]", '"yes"', "no object here", ""])
+def test_an_answer_without_an_object_raises(answer):
+    with pytest.raises(ValueError):
+        defect_result.decode(answer)
+
+
+def test_yes_and_upper_case_severity_are_normalized():
+    values, missing = defect_result.check({"Defect Detected": "yes", "Type": " Burnt  port ", "severity": "HIGH",
+                                           "affected_components": "USB-C Port, usb-c port,"})
+    assert missing == []
+    assert values == {"defect_detected": True, "defect_type": "Burnt port", "severity": "High",
+                      "affected_components": ("usb-c port",)}
+
+
+def test_no_defect_needs_no_other_fields():
+    assert defect_result.check({"defect_detected": "No"}) == (
+        {"defect_detected": False, "defect_type": "None", "severity": "None", "affected_components": ()}, [])
+
+
+def test_invalid_fields_are_reported_missing():
+    values, missing = defect_result.check({"defect_detected": "maybe", "severity": "bad", "defect_type": "n/a"})
+    assert values == {}
+    assert missing == ["defect_detected", "defect_type", "severity", "affected_components"]
+
+
+def test_reask_prompt_names_only_the_missing_fields():
+    prompt = defect_result.reask_prompt(["severity", "affected_components"])
+    assert prompt.endswith("only these keys: severity, affected_components")
+    assert '"Low" or "Medium" or "High"' in prompt
+    assert "defect_type" not in prompt
@@ -0,0 +1,109 @@
+import base64
+import io
+import time
+from contextlib import ExitStack
+
+import pytest
+
+import inference
+from prompt_eval import StubVisionServer
+
+
+def _photo():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 40, 40)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+MESSAGES = [{"role": "user", "content": [{"type": "text", "text": "Describe the defect as JSON."},
+                                         {"type": "image_url", "image_url": {"url": _photo()}}]}]
+
+
+@pytest.fixture
+def stubs():
+    """Start named stub vision servers with a given latency and failure rate; returns them and a router over them"""
+    with ExitStack() as stack:
+        def start(*specs, hedge_after_ms=0, threshold=2, reset_seconds=0.2):
+            servers = {name: stack.enter_context(StubVisionServer(latency_ms=latency_ms, ms_per_kb=0,
+                                                                  ms_per_token=0, failure_rate=failure_rate))
+                       for name, latency_ms, failure_rate in specs}
+            router = inference.InferenceRouter([inference.OpenAIBackend(name, "stub", server.url)
+                                                for name, server in servers.items()], hedge_after_ms)
+            router.health = {name: inference.BackendHealth(threshold, reset_seconds) for name in servers}
+            return servers, router
+        yield start
+
+
+def ask(router, timeout=5):
+    return router.complete(MESSAGES, 0.0, 512, timeout)
+
+
+def test_failures_fall_back_in_order_of_preference(stubs):
+    servers, router = stubs(("primary", 5, 1.0), ("secondary", 5, 0.0), ("tertiary", 5, 0.0))
+    result, info = ask(router)
+    assert info["backend"] == "secondary" and not info["hedged"]
+    assert "defect_detected" in result
+    assert [server.requests for server in servers.values()] == [1, 1, 0]
+
+
+def test_every_backend_failing_raises(stubs):
+    servers, router = stubs(("primary", 5, 1.0), ("secondary", 5, 1.0))
+    with pytest.raises(inference.InferenceError, match="(?s)primary: .*secondary: "):
+        ask(router)
+
+
+def test_breaker_opens_then_lets_one_trial_call_through(stubs):
+    servers, router = stubs(("primary", 5, 1.0), ("secondary", 5, 0.0))
+    ask(router)
+    ask(router)
+    assert router.health["primary"].state() == "open"
+
+    # While open the primary is skipped without a request
+    assert ask(router)[1]["backend"] == "secondary"
+    assert servers["primary"].requests == 2
+
+    time.sleep(0.25)
+    assert router.health["primary"].state() == "half-open"
+    # A failed trial keeps it open for another period
+    assert ask(router)[1]["backend"] == "secondary"
+    assert servers["primary"].requests == 3
+    assert router.health["primary"].state() == "open"
+
+    time.sleep(0.25)
+    servers["primary"].failure_rate = 0.0
+    assert ask(router)[1]["backend"] == "primary"
+    assert router.health["primary"].state() == "closed"
+
+
+def test_a_slow_backend_is_hedged_and_the_faster_answer_wins(stubs):
+    servers, router = stubs(("primary", 600, 0.0), ("secondary", 5, 0.0), hedge_after_ms=50)
+    started = time.perf_counter()
+    _, info = ask(router)
+    assert time.perf_counter() - started < 0.4
+    assert info["backend"] == "secondary" and info["hedged"]
+    assert router.health["secondary"].hedges == 1
+
+
+def test_the_first_backend_still_wins_when_it_answers_before_the_hedge(stubs):
+    servers, router = stubs(("primary", 150, 0.0), ("secondary", 1000, 0.0), hedge_after_ms=50)
+    started = time.perf_counter()
+    _, info = ask(router)
+    # The hedge was sent but is not waited for once the primary answers
+    assert time.perf_counter() - started < 0.6
+    assert info["backend"] == "primary" and info["hedged"]
+    assert servers["secondary"].requests == 1
+
+
+def test_no_hedge_is_sent_when_the_first_answer_is_quick(stubs):
+    servers, router = stubs(("primary", 5, 0.0), ("secondary", 5, 0.0), hedge_after_ms=200)
+    _, info = ask(router)
+    assert info["backend"] == "primary" and not info["hedged"]
+    assert servers["secondary"].requests == 0
+
+
+def test_a_request_past_its_deadline_raises(stubs):
+    servers, router = stubs(("primary", 800, 0.0))
+    with pytest.raises(inference.InferenceError, match="within"):
+        ask(router, timeout=0.2)
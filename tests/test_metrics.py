@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def series(monkeypatch):
+    """Start every test with no recorded spans"""
+    monkeypatch.setattr(metrics, "_series", {})
+
+
+def _samples(text, name):
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line.startswith(name)}
+
+
+def test_latency_buckets_are_cumulative_with_sum_and_count():
+    for seconds in (0.0004, 0.003, 0.003, 0.2, 60):
+        metrics.record("db", "lookup", seconds)
+    text = metrics.render_prometheus()
+
+    buckets = _samples(text, "hardware_span_duration_seconds_bucket")
+    labels = '{span="db",operation="lookup",le="%s"}'
+    assert buckets["hardware_span_duration_seconds_bucket" + labels % "0.0005"] == 1
+    assert buckets["hardware_span_duration_seconds_bucket" + labels % "0.005"] == 3
+    assert buckets["hardware_span_duration_seconds_bucket" + labels % "0.25"] == 4
+    assert buckets["hardware_span_duration_seconds_bucket" + labels % "+Inf"] == 5
+    counts = list(buckets.values())
+    assert counts == sorted(counts)
+    assert _samples(text, "hardware_span_duration_seconds_sum")[
+        'hardware_span_duration_seconds_sum{span="db",operation="lookup"}'] == pytest.approx(60.2064)
+    assert _samples(text, "hardware_span_duration_seconds_count")[
+        'hardware_span_duration_seconds_count{span="db",operation="lookup"}'] == 5
+
+
+def test_payload_sizes_are_only_rendered_for_spans_that_set_one():
+    with metrics.span("smtp", "send_message") as span:
+        span.size = 2000
+    with metrics.span("db", "lookup"):
+        pass
+    text = metrics.render_prometheus()
+
+    assert 'hardware_span_payload_bytes_bucket{span="smtp",operation="send_message",le="4096"} 1' in text
+    assert 'hardware_span_payload_bytes_count{span="db"' not in text
+
+
+def test_label_values_are_escaped():
+    metrics.record("http", 'say "hi"\\now\nplease', 0.01)
+    text = metrics.render_prometheus()
+
+    assert 'operation="say \\"hi\\"\\\\now\\nplease"' in text
+    # Every sample stays on one line of the form name{labels} value
+    samples = [line for line in text.splitlines() if line and not line.startswith("#")]
+    assert all(re.fullmatch(r'[a-z_]+(\{.*\})? \S+', line) for line in samples)
+
+
+def test_a_block_that_raises_is_timed_and_counted_as_an_error():
+    with pytest.raises(ValueError):
+        with metrics.span("inference", "analyze"):
+            raise ValueError("bad image")
+    with metrics.span("inference", "analyze"):
+        pass
+    text = metrics.render_prometheus()
+
+    assert 'hardware_span_errors_total{span="inference",operation="analyze"} 1' in text
+    assert 'hardware_span_duration_seconds_count{span="inference",operation="analyze"} 2' in text
@@ -0,0 +1,203 @@
+import email
+import socketserver
+import threading
+import time
+
+import pytest
+
+import database
+import outbox
+
+
+class StubSMTP(socketserver.ThreadingTCPServer):
+    """A local SMTP relay that keeps the messages it accepts
+
+    ``reject`` holds replies given to MAIL FROM in turn, e.g. "451 Try again
+    later", before messages are accepted again; ``hang_up_after`` closes each
+    session once it has accepted that many messages. It offers AUTH PLAIN but
+    never STARTTLS, and keeps the credentials it is sent in ``logins``.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.messages = []
+        self.reject = []
+        self.hang_up_after = None
+        self.sessions = 0
+        self.logins = []
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.sessions += 1
+        accepted = 0
+        self.reply("220 stub ESMTP")
+        while line := self.rfile.readline():
+            command = line.decode().strip().split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250-stub")
+                self.reply("250 AUTH PLAIN")
+            elif command == "AUTH":
+                server.logins.append(line.decode().split()[2])
+                self.reply("235 Authenticated")
+            elif command == "MAIL":
+                self.reply(server.reject.pop(0) if server.reject else "250 OK")
+            elif command in ("RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    data.append(line[1:] if line.startswith(b"..") else line)
+                server.messages.append(email.message_from_bytes(b"".join(data)))
+                self.reply("250 Queued")
+                accepted += 1
+                if server.hang_up_after is not None and accepted >= server.hang_up_after:
+                    return
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+@pytest.fixture
+def smtp(db, monkeypatch):
+    server = StubSMTP()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(server.port))
+    monkeypatch.setenv("SMTP_USER", "support@example.com")
+    monkeypatch.delenv("SMTP_PASSWORD", raising=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _outbox():
+    with database.connection() as conn:
+        return conn.execute('''SELECT status, attempts, next_attempt_at, last_error FROM email_outbox
+                               ORDER BY id''').fetchall()
+
+
+def _make_due():
+    with database.connection() as conn:
+        conn.execute("UPDATE email_outbox SET next_attempt_at = 0 WHERE status = 'pending'")
+
+
+def test_due_messages_are_delivered_over_one_session(smtp):
+    for number in range(3):
+        outbox.enqueue_email(f"customer{number}@example.com", f"Appointment {number}", f"<p>Visit {number}</p>")
+    worker = outbox.OutboxWorker()
+    assert worker.deliver_pending() == 3
+    worker._close()
+
+    assert [status for status, *_ in _outbox()] == ["sent"] * 3
+    assert [message["To"] for message in smtp.messages] == [f"customer{n}@example.com" for n in range(3)]
+    assert smtp.messages[0]["Subject"] == "Appointment 0"
+    assert "Visit 0" in smtp.messages[0].get_payload()[0].get_payload()
+    assert smtp.sessions == 1
+
+
+def test_a_refused_message_is_retried_with_growing_backoff(smtp, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_RETRY_BASE_SECONDS", 30)
+    smtp.reject = ["451 Try again later", "451 Try again later"]
+    outbox.enqueue_email("customer@example.com", "Reminder", "<p>Tomorrow</p>")
+    worker = outbox.OutboxWorker()
+
+    started = time.time()
+    assert worker.deliver_pending() == 0
+    status, attempts, next_attempt_at, last_error = _outbox()[0]
+    assert (status, attempts) == ("pending", 1) and "Try again later" in last_error
+    assert 30 <= next_attempt_at - started < 32
+    # Not due yet, so nothing is sent
+    assert worker.deliver_pending() == 0 and _outbox()[0][1] == 1
+
+    _make_due()
+    started = time.time()
+    assert worker.deliver_pending() == 0
+    assert 60 <= _outbox()[0][2] - started < 62
+
+    _make_due()
+    assert worker.deliver_pending() == 1
+    assert _outbox()[0][0] == "sent" and _outbox()[0][3] is None
+    worker._close()
+
+
+def test_a_message_failing_every_attempt_is_dead_lettered(smtp, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    smtp.reject = ["550 Mailbox unavailable"] * 3
+    outbox.enqueue_email("nobody@example.com", "Reminder", "<p>Tomorrow</p>")
+    worker = outbox.OutboxWorker()
+    for _ in range(3):
+        worker.deliver_pending()
+        _make_due()
+    worker._close()
+
+    status, attempts, _, last_error = _outbox()[0]
+    assert (status, attempts) == ("dead", 3) and "Mailbox unavailable" in last_error
+    assert worker.deliver_pending() == 0 and smtp.messages == []
+    assert outbox.get_outbox_stats() == {"dead": 1}
+
+
+def test_a_dropped_session_is_reopened_for_the_next_attempt(smtp, monkeypatch):
+    monkeypatch.setattr(outbox, "SMTP_PROBE_AFTER_SECONDS", 3600)
+    smtp.hang_up_after = 1
+    for number in range(2):
+        outbox.enqueue_email(f"customer{number}@example.com", "Reminder", "<p>Tomorrow</p>")
+    worker = outbox.OutboxWorker()
+    assert worker.deliver_pending() == 1
+    assert [status for status, *_ in _outbox()] == ["sent", "pending"]
+
+    _make_due()
+    assert worker.deliver_pending() == 1
+    worker._close()
+    assert len(smtp.messages) == 2 and smtp.sessions == 2
+
+
+def test_the_worker_thread_delivers_as_soon_as_it_is_woken(smtp, monkeypatch):
+    worker = outbox.OutboxWorker()
+    monkeypatch.setattr(outbox, "_worker", worker)
+    worker.start()
+    try:
+        outbox.enqueue_email("customer@example.com", "Confirmation", "<p>Booked</p>")
+        deadline = time.monotonic() + 2
+        while _outbox()[0][0] != "sent" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+        worker.join(2)
+    assert _outbox()[0][0] == "sent" and len(smtp.messages) == 1
+
+
+def test_the_password_is_not_sent_to_a_server_without_starttls(smtp, monkeypatch):
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    outbox.enqueue_email("customer@example.com", "Reminder", "<p>Tomorrow</p>")
+    worker = outbox.OutboxWorker()
+    assert worker.deliver_pending() == 0
+
+    status, attempts, _, last_error = _outbox()[0]
+    assert (status, attempts) == ("pending", 1) and "STARTTLS" in last_error
+    assert smtp.logins == [] and smtp.messages == []
+
+
+def test_a_plaintext_login_can_be_allowed_explicitly(smtp, monkeypatch):
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    monkeypatch.setattr(outbox, "SMTP_ALLOW_PLAINTEXT_LOGIN", True)
+    outbox.enqueue_email("customer@example.com", "Reminder", "<p>Tomorrow</p>")
+    worker = outbox.OutboxWorker()
+    assert worker.deliver_pending() == 1
+    worker._close()
+    assert len(smtp.logins) == 1 and len(smtp.messages) == 1
@@ -0,0 +1,106 @@
+import re
+from datetime import date, timedelta
+
+import pytest
+
+import admin_tables
+import database
+import defect_reports
+import outbox
+import scheduling
+import service
+import technician_schedule
+import warranty
+
+
+@pytest.fixture
+def plans(seeded):
+    """Run a call and return the EXPLAIN QUERY PLAN details of every SELECT it sent to SQLite"""
+    def explain(call, *args):
+        statements = []
+        connect = seeded._connect
+
+        def traced():
+            conn = connect()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        # Idle connections were opened untraced; start again so the call gets a traced one
+        seeded.close()
+        seeded._connect = traced
+        try:
+            call(*args)
+        finally:
+            seeded.close()
+            seeded._connect = connect
+        with database.connection() as conn:
+            return [(statement, [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")])
+                    for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+    return explain
+
+
+def table_scan(detail):
+    # Scans of subquery results and index scans are fine; a bare "SCAN customers" reads every row
+    return re.fullmatch(r"SCAN \w+", detail) is not None
+
+
+def uses(plans, index):
+    """True when one of the statements is answered by a search of ``index`` and none scans a whole table"""
+    details = [detail for _, statement_details in plans for detail in statement_details]
+    return (any(detail.startswith("SEARCH") and index in detail for detail in details)
+            and not any(table_scan(detail) for detail in details))
+
+
+def test_customer_lookup_by_service_tag(plans):
+    assert uses(plans(service.get_customer_by_service_tag, "ABC123"), "sqlite_autoindex_customers_1")
+
+
+def test_available_technicians_for_a_brand(plans):
+    assert uses(plans(scheduling.available_technicians, "Dell"), "idx_technicians_specialization_available")
+
+
+def test_booking_conflict_check(plans):
+    def check():
+        with database.connection() as conn:
+            scheduling.has_conflict(conn, 1, "2030-01-01", "10:00")
+    assert uses(plans(check), "idx_appointments_technician_date")
+
+
+def test_technician_schedule_reload_and_refresh(plans):
+    schedule = technician_schedule.TechnicianSchedule(1)
+    assert uses(plans(schedule.appointments), "idx_appointments_technician_date")
+    assert uses(plans(schedule.appointments), "idx_appointments_technician_updated")
+
+
+def test_expiring_warranties(plans):
+    assert uses(plans(warranty.get_expiring_warranties, 30), "idx_customers_warranty_end")
+
+
+def test_outbox_claims_due_messages(plans):
+    assert uses(plans(outbox.OutboxWorker()._claim_batch), "idx_email_outbox_status_next")
+
+
+def test_admin_customer_search_uses_both_search_indexes(plans):
+    found = plans(admin_tables.fetch_page, "customers", {"search": "abc"})
+    assert uses(found, "sqlite_autoindex_customers_1")
+    assert uses(found, "idx_customers_name")
+
+
+def test_later_customer_pages_seek_the_sort_index(plans):
+    for sort, index in (("customer_name", "idx_customers_name_sort"),
+                        ("warranty_end_date", "idx_customers_warranty_end_sort")):
+        for descending in (False, True):
+            assert uses(plans(admin_tables.fetch_page, "customers", None, sort, descending, ("M", 2)), index)
+
+
+def test_admin_appointment_filters(plans):
+    week = (date.today(), date.today() + timedelta(days=7))
+    assert uses(plans(admin_tables.fetch_page, "appointments", {"search": "ABC"}), "idx_appointments_service_tag")
+    assert uses(plans(admin_tables.fetch_page, "appointments", {"status": "Scheduled", "date_from": week[0],
+                                                                "date_to": week[1]}),
+                "idx_appointments_status_date")
+
+
+def test_defect_report_search_by_severity_and_device(plans):
+    assert uses(plans(defect_reports.search_reports, "High"), "idx_defect_reports_severity")
+    assert uses(plans(defect_reports.reports_for_devices, ["ABC123"]), "idx_defect_reports_service_tag")
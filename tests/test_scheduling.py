@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+import database
+import scheduling
+
+SLOT = datetime(2030, 3, 4, 10, 0)
+
+
+def _book_together(count, book):
+    """Run ``book(number)`` on ``count`` threads released at the same moment; returns results or exceptions"""
+    barrier = threading.Barrier(count)
+
+    def run(number):
+        barrier.wait()
+        try:
+            return book(number)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(count) as pool:
+        return list(pool.map(run, range(count)))
+
+
+def _appointments():
+    with database.connection() as conn:
+        return conn.execute("SELECT technician_id, appointment_date, appointment_time FROM appointments").fetchall()
+
+
+def test_concurrent_bookings_of_one_slot_admit_exactly_one(seeded):
+    outcomes = _book_together(2, lambda number: scheduling.book_appointment(
+        1, 1, "ABC123", f"Booking {number}", SLOT))
+    booked = [outcome for outcome in outcomes if isinstance(outcome, int)]
+    refused = [outcome for outcome in outcomes if isinstance(outcome, scheduling.SlotUnavailableError)]
+    assert len(booked) == 1 and len(refused) == 1
+    assert _appointments() == [(1, "2030-03-04", "10:00")]
+
+
+def test_overlapping_slots_conflict_but_other_technicians_are_free(seeded):
+    scheduling.book_appointment(1, 1, "ABC123", "First", SLOT)
+    with pytest.raises(scheduling.SlotUnavailableError):
+        scheduling.book_appointment(2, 1, "XYZ789", "Overlaps", SLOT.replace(minute=30))
+    scheduling.book_appointment(2, 2, "XYZ789", "Another technician", SLOT)
+    assert len(_appointments()) == 2
+
+
+def test_retries_with_one_idempotency_key_return_the_same_appointment(seeded):
+    outcomes = _book_together(4, lambda number: scheduling.book_appointment(
+        1, 1, "ABC123", "Retried", SLOT, idempotency_key="request-1"))
+    assert len(set(outcomes)) == 1 and isinstance(outcomes[0], int)
+    assert scheduling.book_appointment(1, 1, "ABC123", "Retried", SLOT, idempotency_key="request-1") == outcomes[0]
+    assert len(_appointments()) == 1
+
+
+def test_a_confirmation_is_queued_once_per_booking(seeded):
+    confirmation = ("john@example.com", "Appointment Confirmation", "<p>Booked</p>")
+    for _ in range(3):
+        scheduling.book_appointment(1, 1, "ABC123", "Retried", SLOT, idempotency_key="request-2",
+                                    confirmation=confirmation)
+    with database.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM email_outbox").fetchone()[0] == 1
+
+
+def test_a_cancellation_frees_the_slot_on_the_next_sync_soon_after_boot(seeded, monkeypatch):
+    # time.monotonic() counts from boot, so it can be well under the reload interval
+    monkeypatch.setattr(scheduling.time, "monotonic", lambda: 5.0)
+    calendar = scheduling.TechnicianCalendar()
+    appointment_id = scheduling.book_appointment(1, 1, "ABC123", "Screen flickers", SLOT)
+    calendar.sync(SLOT.date())
+    assert not calendar.is_free(1, "2030-03-04", 600)
+
+    with database.connection() as conn:
+        conn.execute("UPDATE appointments SET status = 'Cancelled' WHERE id = ?", (appointment_id,))
+    calendar.invalidate()
+    calendar.sync(SLOT.date())
+    assert calendar.is_free(1, "2030-03-04", 600)
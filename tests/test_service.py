@@ -0,0 +1,35 @@
+import io
+
+import service
+
+
+def _address(service_tag):
+    return service.get_customer_by_service_tag(service_tag)["customer_address"]
+
+
+def test_an_address_change_is_read_back_at_once(seeded):
+    customer = service.get_customer_by_service_tag("ABC123")
+    assert _address("ABC123") == customer["customer_address"]
+    assert service.customer_cache.hits >= 1
+
+    service.update_customer_address(customer["id"], "12 New Road, Pune")
+    assert _address("ABC123") == "12 New Road, Pune"
+
+
+def test_a_customer_added_after_a_failed_lookup_is_found(seeded):
+    assert service.get_customer_by_service_tag("new-1") is None
+    service.add_customer("NEW-1", "Ana Silva", None, None, "Camp, Pune", None, None, "2030-01-10")
+    assert _address("NEW-1") == "Camp, Pune"
+
+
+def test_an_imported_change_is_read_back_at_once(seeded):
+    _address("ABC123")
+    feed = "service_tag,customer_name,customer_address,warranty_end_date\nABC123,John Doe,Baner,2030-01-10\n"
+    service.import_records("customers", io.BytesIO(feed.encode()))
+    assert _address("ABC123") == "Baner"
+
+
+def test_a_deleted_customer_is_no_longer_found(seeded):
+    customer = service.get_customer_by_service_tag("ABC123")
+    service.delete_customer(customer["id"])
+    assert service.get_customer_by_service_tag("ABC123") is None
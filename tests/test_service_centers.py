@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import database
+import service_centers
+from ratelimit import TokenBucket
+
+KEY = "test-key"
+PUNE_RESULTS = {
+    "places": [
+        {"title": "Dell Care Baner", "address": "Baner Road, Pune 411045", "phoneNumber": "020 2729 1234",
+         "latitude": 18.56, "longitude": 73.78},
+        {"title": "Dell Care Camp", "address": "MG Road, Camp, Pune 411001", "phoneNumber": "+91 98220 12345",
+         "latitude": 18.515, "longitude": 73.875},
+    ],
+    "organic": [
+        {"title": "Dell Exclusive Store Kothrud", "link": "https://example.com/kothrud",
+         "snippet": "Address: Shop 4, Paud Road, Kothrud, 411038. Call 98220 55555"},
+        {"title": "Dell laptop repair experts", "link": "https://example.com/repair",
+         "snippet": "Doorstep laptop repair for every model. Call 98220 66666"},
+    ],
+}
+
+
+class StubSerper(ThreadingHTTPServer):
+    """A local stand-in for the Serper search API that records every query it answers"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        self.results = {}
+        self.status = 200
+        self.queries = []
+        self.answered = threading.Condition()
+        super().__init__(("127.0.0.1", 0), _SerperHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/search"
+
+    def wait_for(self, count, timeout=5):
+        with self.answered:
+            return self.answered.wait_for(lambda: len(self.queries) >= count, timeout)
+
+
+class _SerperHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["q"]
+        body = json.dumps(self.server.results.get(query, {})).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.answered:
+            self.server.queries.append(query)
+            self.server.answered.notify_all()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serper(db, monkeypatch):
+    server = StubSerper()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(service_centers, "SERPER_URL", server.url)
+    monkeypatch.setattr(service_centers, "_rate_limiter", TokenBucket(100, 100))
+    monkeypatch.setattr(service_centers, "directory", service_centers.ServiceCenterDirectory())
+    server.results["Dell authorized service centers in Pune, India"] = PUNE_RESULTS
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _age_searches(seconds):
+    with database.connection() as conn:
+        conn.execute("UPDATE service_center_cache SET fetched_at = fetched_at - ?", (seconds,))
+
+
+def _wait_for_refreshes():
+    deadline = time.monotonic() + 5
+    while service_centers._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not service_centers._refreshing
+
+
+def test_mapped_centers_come_nearest_first_then_city_level_then_unplaced_hits(serper):
+    found = service_centers.lookup_service_centers("Dell", "Camp, Pune", KEY, limit=5)
+    assert [center["name"] for center in found] == [
+        "Dell Care Camp", "Dell Care Baner", "Dell Exclusive Store Kothrud", "Dell laptop repair experts"]
+    assert found[-1]["city"] is None and found[-1]["distance_km"] is None
+
+
+def test_distance_is_only_given_for_centers_with_their_own_coordinates(serper):
+    found = {center["name"]: center for center in service_centers.lookup_service_centers("Dell", "411001", KEY, 5)}
+    assert found["Dell Care Baner"]["distance_km"] > 5
+    # Geocoded from its PIN code, so it stands at Pune's centre rather than at a known distance
+    assert found["Dell Exclusive Store Kothrud"]["city"] == "Pune"
+    assert found["Dell Exclusive Store Kothrud"]["distance_km"] is None
+
+
+def test_a_fresh_search_is_reused_for_the_same_city_however_written(serper):
+    first = service_centers.lookup_service_centers("Dell", "Pune", KEY)
+    again = [service_centers.lookup_service_centers("Dell", text, KEY) for text in ("pune", "Poona", "411001")]
+    assert again == [first] * 3
+    assert serper.queries == ["Dell authorized service centers in Pune, India"]
+
+
+def test_a_stale_search_is_answered_at_once_and_refreshed_in_the_background(serper):
+    first = service_centers.lookup_service_centers("Dell", "Pune", KEY)
+    _age_searches(service_centers.SERVICE_CENTER_TTL_SECONDS + 60)
+    serper.results["Dell authorized service centers in Pune, India"] = {"places": [
+        {"title": "Dell Care Hinjewadi", "address": "Phase 1, Hinjewadi, Pune 411057",
+         "latitude": 18.59, "longitude": 73.74}]}
+
+    assert service_centers.lookup_service_centers("Dell", "Pune", KEY) == first
+    assert serper.wait_for(2)
+    _wait_for_refreshes()
+    names = [center["name"] for center in service_centers.lookup_service_centers("Dell", "Pune", KEY, limit=5)]
+    assert "Dell Care Hinjewadi" in names
+    assert len(serper.queries) == 2
+
+
+def test_a_stale_search_of_an_unknown_place_is_placed_by_its_results_and_refreshed(serper):
+    serper.results["Dell authorized service centers in MG Road, India"] = PUNE_RESULTS
+    first = service_centers.lookup_service_centers("Dell", "MG Road", KEY, limit=5)
+    # Not matched by text: every center the search located is near the place, and the unplaced hit comes last
+    assert [center["name"] for center in first] == [
+        "Dell Care Camp", "Dell Care Baner", "Dell Exclusive Store Kothrud", "Dell laptop repair experts"]
+    _age_searches(service_centers.SERVICE_CENTER_TTL_SECONDS + 60)
+    assert service_centers.lookup_service_centers("Dell", "MG Road", KEY, limit=5) == first
+    assert serper.wait_for(2)
+    _wait_for_refreshes()
+
+
+def test_an_unknown_place_whose_search_located_nothing_gets_only_its_hits(serper):
+    serper.results["Dell authorized service centers in Nowhere Lane, India"] = {"organic": [
+        PUNE_RESULTS["organic"][1]]}
+    service_centers.lookup_service_centers("Dell", "Pune", KEY)
+    found = service_centers.lookup_service_centers("Dell", "Nowhere Lane", KEY, limit=5)
+    assert [center["name"] for center in found] == ["Dell laptop repair experts"]
+
+
+def test_searches_past_the_stale_window_wait_for_serper(serper):
+    service_centers.lookup_service_centers("Dell", "MG Road", KEY)
+    _age_searches(service_centers.SERVICE_CENTER_TTL_SECONDS + service_centers.SERVICE_CENTER_STALE_SECONDS + 60)
+    service_centers.lookup_service_centers("Dell", "MG Road", KEY)
+    assert len(serper.queries) == 2 and not service_centers._refreshing
+
+
+def test_lookups_beyond_the_rate_limit_fail_without_calling_serper(serper, monkeypatch):
+    monkeypatch.setattr(service_centers, "_rate_limiter", TokenBucket(0.01, 2))
+    monkeypatch.setattr(service_centers, "SERPER_TIMEOUT_SECONDS", 0.1)
+    service_centers.lookup_service_centers("Dell", "Pune", KEY)
+    service_centers.lookup_service_centers("Dell", "Mumbai", KEY)
+    with pytest.raises(service_centers.ServiceCenterLookupError, match="Too many"):
+        service_centers.lookup_service_centers("Dell", "Nagpur", KEY)
+    # Areas already searched are still answered while the limit holds
+    assert service_centers.lookup_service_centers("Dell", "Pune", KEY)
+    assert len(serper.queries) == 2
+
+
+def test_an_error_from_serper_is_reported(serper):
+    serper.status = 500
+    with pytest.raises(service_centers.ServiceCenterLookupError, match="500"):
+        service_centers.lookup_service_centers("Dell", "Pune", KEY)
+
+
+@pytest.mark.parametrize("snippet, phone", [
+    # The landline's digits run on from the PIN code
+    ("Address: Shop 4, MG Road, Camp, Pune 411001 020 2729 1234", "+91 20 2729 1234"),
+    ("Shop 4, MG Road, Camp, Pune 411001 +91 98220 12345. Open 10am-8pm", "+91 98220 12345"),
+    ("Phone: 1800 425 4026, Shop 4, MG Road, Camp, Pune 411001", "1800 425 4026"),
+])
+def test_a_phone_number_next_to_the_address_is_not_kept_in_it(snippet, phone):
+    assert service_centers.extract_phone(snippet) == phone
+    assert service_centers.extract_address(snippet) == "Shop 4, MG Road, Camp, Pune 411001"
+
+
+def test_a_stored_center_is_found_by_the_next_query_soon_after_boot(db, monkeypatch):
+    # time.monotonic() counts from boot, so it can be well under the check interval
+    monkeypatch.setattr(service_centers.time, "monotonic", lambda: 5.0)
+    directory = service_centers.ServiceCenterDirectory()
+    assert directory.nearest("Dell", 18.52, 73.86) == []
+
+    with database.connection() as conn:
+        conn.execute('''INSERT INTO service_centers (brand, name, address, latitude, longitude, geocoded_by, last_seen)
+                        VALUES ('Dell', 'Dell Care Camp', 'MG Road, Camp, Pune 411001', 18.515, 73.875, 'places', ?)''',
+                     (time.time(),))
+    directory.invalidate()
+    assert [center["name"] for center in directory.nearest("Dell", 18.52, 73.86)] == ["Dell Care Camp"]
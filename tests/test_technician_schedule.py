@@ -0,0 +1,24 @@
+from datetime import date, datetime, time, timedelta
+
+import scheduling
+import service
+import technician_schedule
+
+SLOT = datetime.combine(date.today() + timedelta(days=3), time(10))
+
+
+def _statuses(schedule):
+    return {row["id"]: row["status"] for row in schedule.appointments()}
+
+
+def test_changes_after_the_watermark_are_fetched_without_a_reload(seeded):
+    first = scheduling.book_appointment(1, 1, "ABC123", "Screen flickers", SLOT)
+    schedule = technician_schedule.TechnicianSchedule(1)
+    assert _statuses(schedule) == {first: "Scheduled"}
+
+    second = scheduling.book_appointment(1, 1, "ABC123", "Fan noise", SLOT + timedelta(hours=2))
+    scheduling.book_appointment(2, 2, "XYZ789", "Another technician", SLOT)
+    service.update_appointment_status(first, "In Progress")
+    assert _statuses(schedule) == {first: "In Progress", second: "Scheduled"}
+    assert (schedule.reloads, schedule.refreshes, schedule.rows_fetched) == (1, 1, 3)
+
@@ -0,0 +1,47 @@
+import io
+from datetime import date
+
+import database
+import service
+import warranty
+
+
+def _valid(service_tag):
+    with database.connection() as conn:
+        return conn.execute("SELECT warranty_valid FROM customers WHERE service_tag = ?", (service_tag,)).fetchone()[0]
+
+
+def _set_end_date(service_tag, warranty_end_date):
+    # Through the importer, which stamps the change; it derives the flag from the real date, not the test's
+    feed = f"service_tag,customer_name,warranty_end_date\n{service_tag},Ana Silva,{warranty_end_date}\n"
+    assert service.import_records("customers", io.BytesIO(feed.encode()), "csv")["imported"] == 1
+
+
+def test_a_lapsed_warranty_is_flagged_on_the_next_run(seeded):
+    service.add_customer("LT-1", "Ana Silva", None, None, None, None, None, "2030-01-10")
+    warranty.refresh_warranty_status(date(2030, 1, 5))
+
+    assert warranty.refresh_warranty_status(date(2030, 1, 12)) == 1
+    assert _valid("LT-1") == 0
+
+
+def test_an_extended_warranty_is_valid_again_without_a_full_rebuild(seeded):
+    service.add_customer("LT-1", "Ana Silva", None, None, None, None, None, "2030-01-10")
+    warranty.refresh_warranty_status(date(2030, 1, 5))
+    warranty.refresh_warranty_status(date(2030, 1, 12))
+    # Insert stamps fall within the refresh overlap; move them back so only the edits below count as changes
+    with database.connection() as conn:
+        conn.execute("UPDATE customers SET warranty_changed_at = warranty_changed_at - 60")
+
+    _set_end_date("LT-1", "2031-01-10")
+    warranty.refresh_warranty_status(date(2030, 1, 12))
+    assert _valid("LT-1") == 1
+
+    _set_end_date("LT-1", "2030-01-11")
+    assert warranty.refresh_warranty_status(date(2030, 1, 13)) == 1
+    assert _valid("LT-1") == 0
+
+
+def test_unchanged_customers_are_left_alone(seeded):
+    warranty.refresh_warranty_status(date(2030, 1, 5))
+    assert warranty.refresh_warranty_status(date(2030, 1, 5)) == 0
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import database
+
+WARRANTY_JOB = "warranty_refresh"
+# Time of the previous refresh; end dates changed at or after it are re-derived
+WARRANTY_CHANGES_JOB = "warranty_refresh_changes"
+# SQLite stamps changes to the millisecond, so those stamped this long before the previous refresh are re-derived too
+WARRANTY_CHANGES_OVERLAP_SECONDS = 1.0
+
+
+def refresh_warranty_status(today=None):
+    """Bring the stored warranty_valid flags in line with warranty_end_date
+
+    The first run reconciles every customer. Later runs touch warranties whose
+    end date fell between the previous run and today, and re-derive the flag
+    of every customer whose end date changed since the previous run, so an
+    extended warranty becomes valid again. Both are index range scans over a
+    day or so of rows. Returns the number of rows changed.
+
+    Changes are stamped by the app's customer writes (service.add_customer and
+    the bulk import); an end date edited outside them is only re-derived once
+    the warranty_refresh row is deleted from job_state, forcing a full run.
+    """
+    today = (today or date.today()).isoformat()
+    with database.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Taken under the write lock, so every end date changed before it is stamped no later
+        started = time.time()
+        state = dict(conn.execute("SELECT name, value FROM job_state WHERE name IN (?, ?)",
+                                  (WARRANTY_JOB, WARRANTY_CHANGES_JOB)))
+        last_run = state.get(WARRANTY_JOB)
+        changed_since = float(state.get(WARRANTY_CHANGES_JOB, 0)) - WARRANTY_CHANGES_OVERLAP_SECONDS
+
+        if last_run is None:
+            changed = conn.execute('''UPDATE customers SET warranty_valid=0
+                                      WHERE warranty_end_date < ? AND warranty_valid != 0''', (today,)).rowcount
+            changed += conn.execute('''UPDATE customers SET warranty_valid=1
+                                       WHERE warranty_end_date >= ? AND warranty_valid != 1''', (today,)).rowcount
+        else:
+            changed = 0
+            if last_run < today:
+                changed += conn.execute('''UPDATE customers SET warranty_valid=0
+                                           WHERE warranty_end_date >= ? AND warranty_end_date < ?
+                                             AND warranty_valid != 0''', (last_run, today)).rowcount
+            changed += conn.execute('''UPDATE customers SET warranty_valid = COALESCE(warranty_end_date >= ?, 0)
+                                       WHERE warranty_changed_at >= ?
+                                         AND warranty_valid IS NOT COALESCE(warranty_end_date >= ?, 0)''',
+                                    (today, changed_since, today)).rowcount
+
+        conn.executemany("INSERT OR REPLACE INTO job_state (name, value) VALUES (?, ?)",
+                         [(WARRANTY_JOB, today), (WARRANTY_CHANGES_JOB, started)])
+    return changed
+
+
+def is_warranty_valid(warranty_end_date, today=None):
+    """Derive warranty status from an end date stored as YYYY-MM-DD"""
+    return bool(warranty_end_date) and warranty_end_date >= (today or date.today()).isoformat()
+
+
+def get_expiring_warranties(days, today=None):
+    """Return customers whose warranty ends within the next ``days`` days, soonest first"""
+    start = today or date.today()
+    end = start + timedelta(days=days)
+    with database.connection() as conn:
+        rows = conn.execute('''SELECT id, service_tag, customer_name, customer_email, customer_phone,
+                                      laptop_model, warranty_end_date
+                               FROM customers
+                               WHERE warranty_end_date >= ? AND warranty_end_date <= ?
+                               ORDER BY warranty_end_date''',
+                            (start.isoformat(), end.isoformat())).fetchall()
+
+    columns = ['id', 'service_tag', 'customer_name', 'customer_email', 'customer_phone',
+               'laptop_model', 'warranty_end_date']
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class NightlyWarrantyRefresh(threading.Thread):
+    """Daemon thread that re-runs the warranty refresh shortly after each midnight"""
+
+    def __init__(self):
+        super().__init__(name="warranty-refresh", daemon=True)
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            now = datetime.now()
+            next_run = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) + timedelta(minutes=1)
+            if self.stopping.wait((next_run - now).total_seconds()):
+                break
+            try:
+                refresh_warranty_status()
+            except Exception:
+                logging.getLogger(__name__).exception("Nightly warranty refresh failed")
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_nightly_refresh():
+    """Run the refresh now and schedule it nightly; later calls are no-ops"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            refresh_warranty_status()
+            _refresher = NightlyWarrantyRefresh()
+            _refresher.start()
+    return _refresher